@@ -0,0 +1,143 @@
+import socketserver
+import threading
+import argparse
+import socket
+import json
+import sys
+
+ADMIN_HOST = '127.0.0.1'
+ADMIN_PORT = 9001
+
+def parse_backend_address(address):
+    """'HOST:PORT' -> (host, port)"""
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"expected HOST:PORT, got {address!r}")
+    return host, int(port)
+
+def read_config(path):
+    """
+    Read a load balancer config file (JSON):
+
+        {"algorithm": "least_connections",
+         "health_check_interval": 5,
+         "backends": [{"address": "127.0.0.1:8001", "weight": 2}, "127.0.0.1:8002"]}
+
+    Every key is optional. Returns {"backends": {(host, port): weight} or None,
+    "algorithm": upper-case name or None, "health_check_interval": seconds or None};
+    raises ValueError describing the first problem found.
+    """
+    try:
+        with open(path) as config_file:
+            raw = json.load(config_file)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"cannot read {path}: {e}")
+    if not isinstance(raw, dict):
+        raise ValueError(f"{path}: expected a JSON object")
+
+    try:
+        config = {"backends": None, "algorithm": None, "health_check_interval": None}
+        if "backends" in raw:
+            backends = {}
+            for entry in raw["backends"]:
+                if isinstance(entry, str):
+                    entry = {"address": entry}
+                if not isinstance(entry, dict):
+                    raise ValueError(f"{path}: a backend is \"HOST:PORT\" or {{\"address\": ..., \"weight\": ...}}")
+                server = parse_backend_address(str(entry.get("address", "")))
+                weight = float(entry.get("weight", 1))
+                if weight <= 0:
+                    raise ValueError(f"{path}: weight of {entry['address']} must be > 0")
+                backends[server] = weight
+            if not backends:
+                raise ValueError(f"{path}: at least one backend is needed")
+            config["backends"] = backends
+        if raw.get("algorithm"):
+            config["algorithm"] = str(raw["algorithm"]).upper()
+        if raw.get("health_check_interval") is not None:
+            interval = float(raw["health_check_interval"])
+            if interval <= 0:
+                raise ValueError(f"{path}: health_check_interval must be > 0")
+            config["health_check_interval"] = interval
+    except (TypeError, AttributeError) as e:
+        # Values of the wrong JSON type, e.g. "backends": 5
+        raise ValueError(f"{path}: {e}")
+    return config
+
+class AdminTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class AdminServer:
+    """
+    Line-based control channel served from a background thread. Every line a client
+    sends is passed to handle(words) and the returned text is written back, ending
+    with an "OK" line, or "ERR <message>" if handle raised ValueError (any other
+    exception is reported as an internal error). Only bind it to a loopback address:
+    there is no authentication.
+    """
+
+    def __init__(self, host, port, handle):
+        self.host = host
+        self.port = port
+        self.handle = handle
+        self._server = None
+
+    def start(self):
+        handle = self.handle
+
+        class AdminHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    words = line.decode(errors="replace").split()
+                    if not words:
+                        continue
+                    try:
+                        reply = handle(words)
+                        reply = f"{reply}\nOK\n" if reply else "OK\n"
+                    except ValueError as e:
+                        reply = f"ERR {e}\n"
+                    except Exception as e:
+                        # Keep the channel answering; the balancer's own state is left as it was
+                        reply = f"ERR internal error: {e!r}\n"
+                    self.wfile.write(reply.encode())
+
+        self._server = AdminTCPServer((self.host, self.port), AdminHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+def send_command(command, host=ADMIN_HOST, port=ADMIN_PORT, timeout=10.0):
+    """Send one command line and return (ok, reply text without the status line)"""
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(command.encode() + b"\n")
+        lines = []
+        for line in sock.makefile(encoding="utf-8"):
+            line = line.rstrip("\n")
+            if line == "OK" or line.startswith("ERR "):
+                return line == "OK", "\n".join(lines + ([] if line == "OK" else [line]))
+            lines.append(line)
+    return False, "\n".join(lines + ["ERR connection closed"])
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Send a command to the load balancer's admin channel, e.g. "
+                    "'backends', 'add 127.0.0.1:8003 2', 'drain 127.0.0.1:8002', 'algorithm least_connections'")
+    parser.add_argument("--host", default=ADMIN_HOST)
+    parser.add_argument("--port", type=int, default=ADMIN_PORT)
+    parser.add_argument("command", nargs="+")
+    args = parser.parse_args()
+    try:
+        ok, reply = send_command(" ".join(args.command), args.host, args.port)
+    except OSError as e:
+        sys.exit(f"Cannot reach the admin channel at {args.host}:{args.port}: {e}")
+    if reply:
+        print(reply)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
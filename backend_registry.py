@@ -0,0 +1,727 @@
+import threading
+import multiprocessing
+import itertools
+import bisect
+import random
+import math
+import time
+import hashlib
+
+PEAK_EWMA_DECAY = 10.0   # seconds for an idle backend's latency estimate to decay by 1/e
+WEIGHT_REFRESH_INTERVAL = 0.5  # seconds effective weights are reused before being recomputed
+ERROR_RATE_DECAY = 10.0        # seconds for a backend's error rate to decay by 1/e without new outcomes
+ERROR_RATE_ALPHA = 0.2         # weight of the newest connect outcome in the error rate
+MIN_WEIGHT_FACTOR = 0.05       # dynamic adjustments and slow start never cut a weight below this fraction
+HASH_RING_VNODES = 160         # points per unit of weight each backend gets on the consistent hash ring
+HASH_LOAD_FACTOR = 1.25        # a backend takes at most this multiple of its fair share of connections
+LIMIT_INITIAL = 4              # concurrency a backend is allowed before any latency has been observed
+LIMIT_MIN = 1
+LIMIT_MAX = 1000
+LIMIT_TOLERANCE = 1.5          # latency may rise to this multiple of the baseline before the limit shrinks
+LIMIT_SMOOTHING = 0.2          # fraction of each newly computed limit folded into the current one
+LIMIT_BACKOFF = 0.9            # multiplicative decrease on a failed connect or timed-out request
+LIMIT_SHORT_ALPHA = 0.1        # EWMA weight of a sample in the short-term latency (about 10 samples)
+LIMIT_BASELINE_ALPHA = 0.001   # how fast the baseline creeps up towards a backend that became slower for good
+
+class BackendRegistry:
+    """
+    Per-backend load metrics kept in indexed structures so that selecting a backend
+    does not scan the whole pool:
+      - active connection counts live in buckets (count -> backends with that count)
+        with a running minimum, so least-connections is O(1)
+      - response times live in a sorted list, so least-response reads its head and
+        an update is a binary search
+      - round robin is a lock-free atomic counter
+    It also keeps a peak-EWMA latency estimate per backend for the
+    power-of-two-choices algorithms.
+
+    Backends marked unavailable (failed health checks, ejected outliers) keep their
+    metrics but are taken out of the indexes, so no algorithm selects them. When no
+    backend is available at all, round robin falls back to the full pool.
+    """
+
+    def __init__(self, servers):
+        self._lock = threading.Lock()
+        self._servers = ()
+        self._all_servers = ()
+        self._available = set()
+        self._health_failing = set()
+        self._order = {}
+        self._next_order = 0
+        self._rr_counter = itertools.count()
+
+        self._counts = {}
+        self._buckets = {}
+        self._min_count = 0
+
+        self._times = {}
+        self._by_time = []
+
+        self._ewma = {}
+
+        for server in servers:
+            self.add_backend(server)
+
+    @property
+    def servers(self):
+        """Backends currently in rotation"""
+        return self._servers
+
+    @property
+    def all_servers(self):
+        return self._all_servers
+
+    def add_backend(self, server):
+        """Register a backend with zero connections and an unknown response time"""
+        with self._lock:
+            if server in self._order:
+                return
+            self._order[server] = self._next_order
+            self._next_order += 1
+            self._servers = self._servers + (server,)
+            self._all_servers = self._all_servers + (server,)
+            self._available.add(server)
+
+            self._counts[server] = 0
+            self._buckets.setdefault(0, {})[server] = None
+            self._min_count = 0
+
+            entry = (float('inf'), self._order[server], server)
+            self._times[server] = entry
+            bisect.insort(self._by_time, entry)
+
+            self._ewma[server] = (0.0, time.monotonic())
+
+    def remove_backend(self, server):
+        """Forget a backend and all of its metrics"""
+        with self._lock:
+            if server not in self._order:
+                return
+            if server in self._available:
+                self._take_out_of_rotation(server)
+            self._all_servers = tuple(s for s in self._all_servers if s != server)
+            self._health_failing.discard(server)
+            del self._counts[server]
+            del self._times[server]
+            del self._order[server]
+            del self._ewma[server]
+
+    # --- availability ------------------------------------------------------
+
+    def _take_out_of_rotation(self, server):
+        self._available.discard(server)
+        self._servers = tuple(s for s in self._servers if s != server)
+
+        count = self._counts[server]
+        bucket = self._buckets[count]
+        del bucket[server]
+        if not bucket:
+            del self._buckets[count]
+            if count == self._min_count:
+                self._min_count = min(self._buckets) if self._buckets else 0
+
+        del self._by_time[bisect.bisect_left(self._by_time, self._times[server])]
+
+    def _put_into_rotation(self, server):
+        self._available.add(server)
+        self._servers = tuple(s for s in self._all_servers if s in self._available)
+
+        count = self._counts[server]
+        self._buckets.setdefault(count, {})[server] = None
+        if count < self._min_count or len(self._available) == 1:
+            self._min_count = count
+
+        bisect.insort(self._by_time, self._times[server])
+
+    def set_available(self, server, available):
+        """Put a backend into or take it out of rotation; returns True if that changed anything"""
+        with self._lock:
+            if server not in self._order or (server in self._available) == available:
+                return False
+            if available:
+                self._put_into_rotation(server)
+            else:
+                self._take_out_of_rotation(server)
+            return True
+
+    def is_available(self, server):
+        return server in self._available
+
+    def set_health_failing(self, server, failing):
+        """Record whether the rise/fall health checks hold a backend down"""
+        with self._lock:
+            if failing and server in self._order:
+                self._health_failing.add(server)
+            else:
+                self._health_failing.discard(server)
+
+    def health_failing(self, server):
+        return server in self._health_failing
+
+    # --- round robin -----------------------------------------------------
+
+    def next_round_robin(self):
+        # next() on itertools.count is atomic, and the server tuples are replaced, never mutated
+        servers = self._servers or self._all_servers
+        return servers[next(self._rr_counter) % len(servers)]
+
+    # --- active connections ----------------------------------------------
+
+    def _move_count(self, server, old, new):
+        self._counts[server] = new
+        if server not in self._available:
+            return
+        bucket = self._buckets[old]
+        del bucket[server]
+        if not bucket:
+            del self._buckets[old]
+        self._buckets.setdefault(new, {})[server] = None
+
+        if new < self._min_count:
+            self._min_count = new
+        elif old == self._min_count and old not in self._buckets:
+            self._min_count = new
+
+    def add_connection(self, server):
+        """Count a new connection to server and return its updated count"""
+        with self._lock:
+            if server not in self._counts:
+                return 0
+            count = self._counts[server]
+            self._move_count(server, count, count + 1)
+            return count + 1
+
+    def remove_connection(self, server):
+        """Count a closed connection to server; returns the new count, or None if nothing changed"""
+        with self._lock:
+            count = self._counts.get(server, 0)
+            if count <= 0:
+                return None
+            self._move_count(server, count, count - 1)
+            return count - 1
+
+    def connection_count(self, server):
+        return self._counts.get(server, 0)
+
+    def reset_connections(self):
+        with self._lock:
+            self._counts = {server: 0 for server in self._all_servers}
+            self._buckets = {0: dict.fromkeys(self._servers)} if self._servers else {}
+            self._min_count = 0
+
+    def least_connections(self):
+        """Return (server, count) for an available backend with the fewest active connections"""
+        with self._lock:
+            if not self._buckets:
+                return None, 0
+            return next(iter(self._buckets[self._min_count])), self._min_count
+
+    # --- response times ----------------------------------------------------
+
+    def get_response_time(self, server):
+        entry = self._times.get(server)
+        return entry[0] if entry else float('inf')
+
+    def set_response_time(self, server, response_time):
+        with self._lock:
+            old_entry = self._times.get(server)
+            if old_entry is None:
+                return
+            self._replace_time_entry(server, old_entry, (response_time, old_entry[1], server))
+
+    def _replace_time_entry(self, server, old_entry, entry):
+        if server in self._available:
+            del self._by_time[bisect.bisect_left(self._by_time, old_entry)]
+            bisect.insort(self._by_time, entry)
+        self._times[server] = entry
+
+    def record_response_time(self, server, sample, alpha=0.3):
+        """Fold a latency sample into the server's moving average and return the new average"""
+        with self._lock:
+            old_entry = self._times.get(server)
+            if old_entry is None:
+                return sample
+            old_time = old_entry[0]
+            average = sample if old_time == float('inf') else alpha * sample + (1 - alpha) * old_time
+
+            self._replace_time_entry(server, old_entry, (average, old_entry[1], server))
+            return average
+
+    def reset_response_times(self):
+        for server in self._all_servers:
+            self.set_response_time(server, float('inf'))
+
+    def fastest(self):
+        """Return (server, response_time) for the available backend with the lowest response time"""
+        with self._lock:
+            if not self._by_time:
+                return None, float('inf')
+            response_time, _, server = self._by_time[0]
+            return server, response_time
+
+    # --- peak EWMA / power of two choices ---------------------------------
+
+    @staticmethod
+    def _decayed(estimate, stamp, now):
+        return estimate * math.exp(-(now - stamp) / PEAK_EWMA_DECAY)
+
+    def record_latency_sample(self, server, sample):
+        """
+        Fold a latency sample into the server's peak-EWMA estimate: a sample above the
+        current estimate replaces it at once, lower samples pull it down gradually.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if server not in self._ewma:
+                return
+            estimate, stamp = self._ewma[server]
+            if sample > estimate:
+                estimate = sample
+            else:
+                weight = math.exp(-(now - stamp) / PEAK_EWMA_DECAY)
+                estimate = estimate * weight + sample * (1 - weight)
+            self._ewma[server] = (estimate, now)
+
+    def latency_estimate(self, server):
+        """Current peak-EWMA latency, decayed toward zero while no samples arrive"""
+        estimate, stamp = self._ewma.get(server, (0.0, 0.0))
+        return self._decayed(estimate, stamp, time.monotonic())
+
+    def peak_ewma_cost(self, server):
+        """Expected wait on server: its latency estimate scaled by the load already sent to it"""
+        return self.latency_estimate(server) * (self.connection_count(server) + 1)
+
+    def power_of_two_choices(self, cost):
+        """Sample two distinct available backends at random and return the one with the lower cost"""
+        servers = self._servers
+        return self._pick_two(servers, cost)
+
+    @staticmethod
+    def _pick_two(servers, cost):
+        if len(servers) < 2:
+            return servers[0] if servers else None
+        first = random.randrange(len(servers))
+        second = random.randrange(len(servers) - 1)
+        if second >= first:
+            second += 1
+        a, b = servers[first], servers[second]
+        return a if cost(a) <= cost(b) else b
+
+class SharedBackendRegistry(BackendRegistry):
+    """
+    Registry variant for pre-forked workers: connection counts and response times
+    sit in shared-memory arrays indexed by backend, guarded by a process-shared lock.
+    Other processes change the values underneath us, so selections scan the arrays
+    instead of keeping local indexes; round robin stays per process.
+    """
+
+    def __init__(self, servers):
+        self._all_servers = tuple(servers)
+        self._index = {server: i for i, server in enumerate(self._all_servers)}
+        self._rr_counter = itertools.count()
+        self._lock = multiprocessing.Lock()
+        count = len(self._all_servers)
+        self._shared_counts = multiprocessing.RawArray('l', count)
+        self._shared_times = multiprocessing.RawArray('d', [float('inf')] * count)
+        self._shared_ewma = multiprocessing.RawArray('d', count)
+        self._shared_ewma_stamp = multiprocessing.RawArray('d', [time.monotonic()] * count)
+        self._shared_available = multiprocessing.RawArray('b', [1] * count)
+        # Written by the parent's health checker, read by workers' circuit breakers
+        self._shared_health_failing = multiprocessing.RawArray('b', count)
+
+    @property
+    def servers(self):
+        return tuple(s for i, s in enumerate(self._all_servers) if self._shared_available[i])
+
+    def set_available(self, server, available):
+        i = self._index.get(server)
+        if i is None:
+            return False
+        with self._lock:
+            if bool(self._shared_available[i]) == available:
+                return False
+            self._shared_available[i] = 1 if available else 0
+            return True
+
+    def is_available(self, server):
+        i = self._index.get(server)
+        return i is not None and bool(self._shared_available[i])
+
+    def set_health_failing(self, server, failing):
+        i = self._index.get(server)
+        if i is not None:
+            self._shared_health_failing[i] = 1 if failing else 0
+
+    def health_failing(self, server):
+        i = self._index.get(server)
+        return i is not None and bool(self._shared_health_failing[i])
+
+    def next_round_robin(self):
+        servers = self.servers or self._all_servers
+        return servers[next(self._rr_counter) % len(servers)]
+
+    def power_of_two_choices(self, cost):
+        return self._pick_two(self.servers, cost)
+
+    def _scan_min(self, values):
+        available = [i for i in range(len(self._all_servers)) if self._shared_available[i]]
+        if not available:
+            return None
+        return min(available, key=values.__getitem__)
+
+    def add_backend(self, server):
+        raise ValueError("backends cannot be added to shared worker state at runtime")
+
+    def remove_backend(self, server):
+        raise ValueError("backends cannot be removed from shared worker state at runtime")
+
+    def add_connection(self, server):
+        i = self._index.get(server)
+        if i is None:
+            return 0
+        with self._lock:
+            self._shared_counts[i] += 1
+            return self._shared_counts[i]
+
+    def remove_connection(self, server):
+        i = self._index.get(server)
+        if i is None:
+            return None
+        with self._lock:
+            if self._shared_counts[i] <= 0:
+                return None
+            self._shared_counts[i] -= 1
+            return self._shared_counts[i]
+
+    def connection_count(self, server):
+        i = self._index.get(server)
+        return self._shared_counts[i] if i is not None else 0
+
+    def reset_connections(self):
+        with self._lock:
+            for i in range(len(self._all_servers)):
+                self._shared_counts[i] = 0
+
+    def least_connections(self):
+        with self._lock:
+            i = self._scan_min(self._shared_counts)
+            if i is None:
+                return None, 0
+            return self._all_servers[i], self._shared_counts[i]
+
+    def get_response_time(self, server):
+        i = self._index.get(server)
+        return self._shared_times[i] if i is not None else float('inf')
+
+    def set_response_time(self, server, response_time):
+        i = self._index.get(server)
+        if i is not None:
+            with self._lock:
+                self._shared_times[i] = response_time
+
+    def record_response_time(self, server, sample, alpha=0.3):
+        i = self._index.get(server)
+        if i is None:
+            return sample
+        with self._lock:
+            old_time = self._shared_times[i]
+            average = sample if old_time == float('inf') else alpha * sample + (1 - alpha) * old_time
+            self._shared_times[i] = average
+            return average
+
+    def fastest(self):
+        with self._lock:
+            i = self._scan_min(self._shared_times)
+            if i is None:
+                return None, float('inf')
+            return self._all_servers[i], self._shared_times[i]
+
+    def record_latency_sample(self, server, sample):
+        i = self._index.get(server)
+        if i is None:
+            return
+        # CLOCK_MONOTONIC is system-wide on Linux, so forked workers share one timeline
+        now = time.monotonic()
+        with self._lock:
+            estimate, stamp = self._shared_ewma[i], self._shared_ewma_stamp[i]
+            if sample > estimate:
+                estimate = sample
+            else:
+                weight = math.exp(-(now - stamp) / PEAK_EWMA_DECAY)
+                estimate = estimate * weight + sample * (1 - weight)
+            self._shared_ewma[i] = estimate
+            self._shared_ewma_stamp[i] = now
+
+    def latency_estimate(self, server):
+        i = self._index.get(server)
+        if i is None:
+            return 0.0
+        return self._decayed(self._shared_ewma[i], self._shared_ewma_stamp[i], time.monotonic())
+
+class BackendWeights:
+    """
+    Configured weight per backend, scaled into the effective weight the weighted
+    algorithms balance by:
+      - dynamically, by latency relative to the fastest backend in rotation and by the
+        recent connect error rate, so a backend that slows down or fails sheds traffic
+      - by slow start: a backend that joins or rejoins rotation ramps up linearly over
+        `slow_start` seconds instead of getting its full share at once
+
+    Effective weights are recomputed at most every WEIGHT_REFRESH_INTERVAL. The state is
+    per process, like round robin; forked workers each notice rotation changes in the
+    shared registry on their own. The registry is passed in on every call because the
+    load balancer swaps it for a shared one before forking.
+    """
+
+    def __init__(self, servers, weights=None, dynamic=True, slow_start=30.0):
+        self.weights = dict(weights or {})
+        self.dynamic = dynamic
+        self.slow_start = slow_start
+        self._lock = threading.Lock()
+        self._errors = {}                                  # server -> (error rate, stamp)
+        self._in_rotation = dict.fromkeys(servers, True)   # servers present at startup skip slow start
+        self._joined = {}                                  # server -> time it (re)joined rotation
+        self._effective = {}
+        self._refreshed = 0.0
+        self._current = {}                                 # smooth weighted round robin state
+
+    def set_weight(self, server, weight):
+        with self._lock:
+            self.weights[server] = weight
+            self._refreshed = 0.0
+
+    def remove(self, server):
+        """Forget a removed backend, so if it is added again it starts over with slow start"""
+        with self._lock:
+            for state in (self.weights, self._errors, self._in_rotation, self._joined, self._current):
+                state.pop(server, None)
+            self._refreshed = 0.0
+
+    def weight(self, server):
+        return self.weights.get(server, 1)
+
+    def record_outcome(self, server, ok):
+        """Fold one connect result into the backend's error rate"""
+        now = time.monotonic()
+        with self._lock:
+            rate = self._error_rate(server, now)
+            self._errors[server] = (rate * (1 - ERROR_RATE_ALPHA) + (0.0 if ok else ERROR_RATE_ALPHA), now)
+
+    def _error_rate(self, server, now):
+        rate, stamp = self._errors.get(server, (0.0, now))
+        return rate * math.exp(-(now - stamp) / ERROR_RATE_DECAY)
+
+    def _refresh(self, registry, now):
+        latencies = {server: registry.latency_estimate(server) for server in registry.servers}
+        fastest = min((latency for latency in latencies.values() if latency > 0), default=0.0)
+        effective = {}
+        for server in registry.all_servers:
+            available = registry.is_available(server)
+            if available and not self._in_rotation.get(server, False) and self.slow_start > 0:
+                self._joined[server] = now
+            self._in_rotation[server] = available
+
+            factor = 1.0
+            if self.dynamic:
+                latency = latencies.get(server, 0.0)
+                if latency > 0 and fastest > 0:
+                    factor *= fastest / latency
+                factor *= 1.0 - self._error_rate(server, now)
+            if not available:
+                # Used until the next refresh notices it rejoined
+                factor = MIN_WEIGHT_FACTOR
+            elif server in self._joined:
+                ramp = (now - self._joined[server]) / self.slow_start
+                if ramp >= 1:
+                    del self._joined[server]
+                else:
+                    factor *= ramp
+            effective[server] = self.weight(server) * max(MIN_WEIGHT_FACTOR, min(1.0, factor))
+        self._effective = effective
+        self._refreshed = now
+
+    def effective_weights(self, registry):
+        """Return {server: effective weight} for the backends in rotation, in registry order"""
+        now = time.monotonic()
+        if now - self._refreshed >= WEIGHT_REFRESH_INTERVAL:
+            with self._lock:
+                if now - self._refreshed >= WEIGHT_REFRESH_INTERVAL:
+                    self._refresh(registry, now)
+        effective = self._effective
+        return {server: effective.get(server, self.weight(server) * MIN_WEIGHT_FACTOR)
+                for server in registry.servers}
+
+    def smooth_weighted_round_robin(self, registry):
+        """
+        Nginx's smooth weighted round robin: every pick adds each backend's weight to its
+        running score, takes the highest score and subtracts the total weight from it.
+        Backends get picks in proportion to their weights, interleaved rather than in bursts.
+        """
+        weights = self.effective_weights(registry)
+        if not weights:
+            return None
+        with self._lock:
+            total = 0.0
+            best = None
+            for server, weight in weights.items():
+                score = self._current.get(server, 0.0) + weight
+                self._current[server] = score
+                total += weight
+                if best is None or score > self._current[best]:
+                    best = server
+            self._current[best] -= total
+        return best
+
+    def weighted_least_connections(self, registry):
+        """Return (server, cost) for the backend with the fewest connections per unit of weight"""
+        weights = self.effective_weights(registry)
+        if not weights:
+            return None, 0.0
+        server = min(weights, key=lambda s: (registry.connection_count(s) + 1) / weights[s])
+        return server, (registry.connection_count(server) + 1) / weights[server]
+
+class ConcurrencyLimits:
+    """
+    Adaptive limit on the connections (L4) or requests (L7) in flight to each backend,
+    using the gradient algorithm of Netflix's concurrency-limits (TCP Vegas applied to
+    requests). Every latency sample updates a short-term EWMA of the backend's latency
+    and a baseline, the lowest that EWMA has been: the latency without queueing. Their
+    ratio, times LIMIT_TOLERANCE and capped to [0.5, 1], is the gradient:
+
+        new limit = limit * gradient + sqrt(limit)
+
+    Near the baseline the gradient is 1 and the sqrt(limit) headroom lets the limit
+    grow; once queueing pushes latency past the tolerance, the limit shrinks until it
+    is back in range. Failed connects and timeouts cut it by LIMIT_BACKOFF outright.
+    The baseline is a minimum of the smoothed latency rather than of single samples, so
+    a mix of fast and slow commands is compared with itself, and it creeps up by
+    LIMIT_BASELINE_ALPHA per sample so a backend that became slower for good is
+    re-learned. Samples taken while less than half of the limit is in use do not move
+    the limit. The limit stays within [min_limit, max_limit]: with no floor the
+    gradient's smallest step settles near 4, too few for long-lived L4 connections.
+
+    Like BackendWeights this is per process; in-flight counts come from the registry.
+    """
+
+    def __init__(self, initial=LIMIT_INITIAL, min_limit=LIMIT_MIN, max_limit=LIMIT_MAX, tolerance=LIMIT_TOLERANCE):
+        self.initial = max(min_limit, min(max_limit, initial))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self._lock = threading.Lock()
+        self._limits = {}              # server -> current limit (float)
+        self._latency = {}             # server -> (short-term EWMA, baseline)
+
+    def limit(self, server):
+        return int(self._limits.get(server, self.initial))
+
+    def has_capacity(self, server, in_flight):
+        return in_flight < self.limit(server)
+
+    def record_sample(self, server, latency, in_flight):
+        """Fold one latency sample, observed with `in_flight` in flight to the backend, into its limit"""
+        with self._lock:
+            short, baseline = self._latency.get(server, (latency, latency))
+            short += (latency - short) * LIMIT_SHORT_ALPHA
+            if short < baseline:
+                baseline = short
+            else:
+                baseline += (short - baseline) * LIMIT_BASELINE_ALPHA
+            self._latency[server] = (short, baseline)
+
+            limit = self._limits.get(server, self.initial)
+            if in_flight < limit / 2 or short <= 0:
+                return
+            gradient = max(0.5, min(1.0, self.tolerance * baseline / short))
+            new_limit = limit * gradient + math.sqrt(limit)
+            limit = limit * (1 - LIMIT_SMOOTHING) + new_limit * LIMIT_SMOOTHING
+            self._limits[server] = max(self.min_limit, min(self.max_limit, limit))
+
+    def record_drop(self, server):
+        """A connect failed or a request timed out: back off multiplicatively"""
+        with self._lock:
+            limit = self._limits.get(server, self.initial) * LIMIT_BACKOFF
+            self._limits[server] = max(self.min_limit, limit)
+
+    def remove(self, server):
+        with self._lock:
+            self._limits.pop(server, None)
+            self._latency.pop(server, None)
+
+def hash_key(key):
+    """Stable 64-bit hash; the builtin hash() is salted per process, so workers would disagree"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes, so a key keeps going to the same backend
+    and adding or removing one of N backends only moves about 1/N of the keys. Each
+    backend gets `vnodes` points per unit of weight.
+
+    Lookups use bounded loads (consistent hashing with bounded loads, Mirrokni et al.):
+    a backend whose active connections already exceed `load_factor` times its
+    weighted share of the total is passed over for the next one clockwise, so a hot
+    key spills onto its ring neighbours instead of overloading one backend. Backends
+    out of rotation keep their points and are skipped, so their keys come back to them.
+    """
+
+    def __init__(self, servers=(), weights=None, vnodes=HASH_RING_VNODES, load_factor=HASH_LOAD_FACTOR):
+        self.vnodes = vnodes
+        self.load_factor = load_factor
+        self._lock = threading.Lock()
+        self._members = {}                 # server -> weight
+        self._ring = ((), ())              # (sorted point hashes, server at each point), replaced whole
+        weights = weights or {}
+        for server in servers:
+            self.add(server, weights.get(server, 1))
+
+    def _rebuild(self):
+        points = sorted(
+            (hash_key(f"{host}:{port}#{i}"), (host, port))
+            for (host, port), weight in self._members.items()
+            for i in range(max(1, round(self.vnodes * weight)))
+        )
+        self._ring = (tuple(point for point, _ in points), tuple(server for _, server in points))
+
+    def add(self, server, weight=1):
+        with self._lock:
+            self._members[server] = weight
+            self._rebuild()
+
+    def remove(self, server):
+        with self._lock:
+            if self._members.pop(server, None) is not None:
+                self._rebuild()
+
+    def lookup(self, key, registry, skip=()):
+        """
+        Return (server, overflowed) for `key`: the first backend clockwise from the key
+        that is in rotation, not in `skip` and under its load bound. `overflowed` is True
+        when the key's own backend was passed over for load. (None, False) if none is left.
+        """
+        hashes, owners = self._ring
+        if not hashes:
+            return None, False
+        members = self._members
+        in_rotation = registry.servers
+        total_load = sum(registry.connection_count(server) for server in in_rotation)
+        total_weight = sum(members.get(server, 1) for server in in_rotation) or 1
+
+        start = bisect.bisect(hashes, hash_key(key))
+        seen = set()
+        first = None
+        for offset in range(len(hashes)):
+            server = owners[(start + offset) % len(hashes)]
+            if server in seen:
+                continue
+            seen.add(server)
+            if server in skip or not registry.is_available(server):
+                continue
+            if first is None:
+                first = server
+            capacity = math.ceil(self.load_factor * (total_load + 1) * members.get(server, 1) / total_weight)
+            if registry.connection_count(server) < capacity:
+                return server, server is not first
+            if len(seen) == len(members):
+                break
+        return first, False
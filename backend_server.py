@@ -0,0 +1,443 @@
+import socket
+import threading
+import asyncio
+import argparse
+import time
+import random
+import json
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from framing import PREFACE, FrameBuffer, encode_frame, recv_frame
+from search_cache import SearchCacheClient
+from search_client import SearchClient, SEARCH_POOL_SIZE
+
+SEARCH_API_KEY = "Your Gemini API key"
+
+BACKEND_HOST = '127.0.0.1'
+BACKEND_PORT = 8001
+BACKEND_ENGINE = "ASYNCIO"  # ASYNCIO serves every connection from one event loop; THREADED uses a thread each
+BACKEND_BACKLOG = 128
+
+active_connections = 0
+connections_lock = threading.Lock()
+
+request_count = 0
+total_latency = 0.0
+metrics_lock = threading.Lock()
+
+# Shared with every other backend through the search_cache.py daemon
+search_cache = SearchCacheClient()
+# Keep-alive connections to the search API, shared by all connection threads
+search_client = SearchClient(SEARCH_API_KEY)
+
+DELAY_FACTOR = 0.1  # seconds of artificial delay per active connection
+PIPELINE_WORKERS = 16  # pipelined requests from one framed connection processed at the same time (threaded engine)
+PIPELINE_DEPTH_LIMIT = 256  # requests read ahead before the backend stops reading from the client
+SEARCH_WORKERS = 32  # threads the asyncio engine falls back to for search API calls without aiohttp
+search_executor = None
+
+def perform_search(query):
+    results, hit = search_cache.get_or_compute(query, lambda: search_client.fetch(query))
+    if hit:
+        print(f"Cache hit for search: {query}")
+    return results
+
+async def perform_search_async(query):
+    """perform_search for the event loop: cache lookups and API calls are awaited rather than run on threads"""
+    results, hit = await search_cache.get_or_compute_async(query, lambda: search_client.fetch_async(query))
+    if hit:
+        print(f"Cache hit for search: {query}")
+    return results
+
+def is_search(message):
+    return message.lower().startswith("search ")
+
+def search_response(port, query, search_results):
+    return f"[From Backend {port}] Search results for '{query}':\n{search_results}"
+
+def answer_command(message, port, current_connections):
+    """
+    Work out the reply to any command except search, without blocking.
+    Returns (response, delay): the synthetic delay to apply before replying, or None
+    for replies that go out at once and are left out of the latency metrics.
+    """
+    if message.upper() == "STATUS":
+        with metrics_lock:
+            avg_latency = total_latency / request_count if request_count > 0 else 0
+            status_response = (
+                f"[Backend {port} Status] "
+                f"Active Connections: {current_connections}, "
+                f"Total Requests: {request_count}, "
+                f"Average Latency: {avg_latency:.4f}s"
+            )
+        print(f"Backend {port} sent status: {status_response}")
+        return status_response, None
+
+    elif message.upper() == "GET TIME":
+        current_time = time.strftime("%Y-%m-%d %H:%M:%S")
+        response = f"[From Backend {port}] The current time is: {current_time}"
+
+    elif message.upper().startswith("UPPERCASE "):
+        text_to_upper = message[len("UPPERCASE "):]
+        response = f"[From Backend {port}] {text_to_upper.upper()}"
+
+    elif message.lower().startswith("take me to "):
+        website_name = message[len("take me to "):].strip()
+        if website_name:
+            redirect_url = f"https://www.{website_name}.com"
+            print(f"Backend {port} sent redirect to: {redirect_url}")
+            return f"HTTP/1.1 302 Found\r\nLocation: {redirect_url}\r\n\r\nYou will be redirected to {website_name}.", None
+        else:
+            response = f"[From Backend {port}] Please specify a website after 'take me to'."
+
+    elif message.lower().startswith("open "):
+        url_to_open = message[len("open "):].strip()
+        if url_to_open.startswith("http://") or url_to_open.startswith("https://"):
+            print(f"Backend {port} sent redirect to: {url_to_open}")
+            return f"HTTP/1.1 302 Found\r\nLocation: {url_to_open}\r\n\r\nRedirecting to {url_to_open}", None
+        else:
+            response = f"[From Backend {port}] Invalid URL. Please include http:// or https://."
+
+    else:
+        response = f"[From Backend {port}] You sent: {message}"
+
+    return response, DELAY_FACTOR * current_connections + random.uniform(0, 0.05)
+
+def record_request(port, start_time):
+    global request_count, total_latency
+
+    latency = time.time() - start_time
+    with metrics_lock:
+        request_count += 1
+        total_latency += latency
+
+    print(f"Backend {port} sent response (latency: {latency:.4f}s)")
+
+def execute_command(message, port, current_connections):
+    """Run one client command and return the response text"""
+    start_time = time.time()
+
+    if is_search(message):
+        query = message[len("search "):].strip()
+        response = search_response(port, query, perform_search(query))
+    else:
+        response, delay = answer_command(message, port, current_connections)
+        if delay is None:
+            return response
+        time.sleep(delay)
+        print(f"Added delay: {delay:.3f}s")
+
+    record_request(port, start_time)
+    return response
+
+async def execute_command_async(message, port, current_connections):
+    """execute_command for the event loop: the delay is a non-blocking sleep and searches are awaited"""
+    start_time = time.time()
+
+    if is_search(message):
+        query = message[len("search "):].strip()
+        response = search_response(port, query, await perform_search_async(query))
+    else:
+        response, delay = answer_command(message, port, current_connections)
+        if delay is None:
+            return response
+        await asyncio.sleep(delay)
+        print(f"Added delay: {delay:.3f}s")
+
+    record_request(port, start_time)
+    return response
+
+def serve_framed(client_socket, port, current_connections, buffered):
+    """
+    Serve a client that opened with the framing preface. Requests are parsed from a
+    buffered stream, so a client can pipeline many of them without waiting for replies.
+    Up to PIPELINE_WORKERS run at once and every response is tagged with the id of its
+    request, so replies go out as soon as they are ready rather than strictly in order.
+    """
+    frames = FrameBuffer()
+    frames.feed(buffered)
+    send_lock = threading.Lock()
+    read_ahead = threading.BoundedSemaphore(PIPELINE_DEPTH_LIMIT)
+
+    def respond(request_id, message):
+        try:
+            response = execute_command(message, port, current_connections)
+            with send_lock:
+                client_socket.sendall(encode_frame(request_id, response.encode()))
+        except Exception as e:
+            print(f"Backend {port} error answering request {request_id}: {e}")
+        finally:
+            read_ahead.release()
+
+    with ThreadPoolExecutor(max_workers=PIPELINE_WORKERS) as workers:
+        while True:
+            # Stop reading while too many requests are queued, so TCP pushes back on the client
+            read_ahead.acquire()
+            try:
+                request_id, payload = recv_frame(client_socket, frames)
+            except ConnectionError:
+                read_ahead.release()
+                return
+            message = payload.decode().strip()
+            print(f"Backend {port} received request {request_id}: {message}")
+            workers.submit(respond, request_id, message)
+
+async def serve_framed_async(reader, writer, port, current_connections, buffered):
+    """
+    serve_framed for the event loop. Every request read runs as its own task, so all
+    of the up to PIPELINE_DEPTH_LIMIT requests read ahead are served concurrently.
+    """
+    frames = FrameBuffer()
+    read_ahead = asyncio.Semaphore(PIPELINE_DEPTH_LIMIT)
+    in_flight = set()
+
+    async def respond(request_id, message):
+        try:
+            response = await execute_command_async(message, port, current_connections)
+            if not writer.is_closing():
+                writer.write(encode_frame(request_id, response.encode()))
+                await writer.drain()
+        except Exception as e:
+            print(f"Backend {port} error answering request {request_id}: {e}")
+        finally:
+            read_ahead.release()
+
+    data = buffered
+    while True:
+        frames.feed(data)
+        while (frame := frames.pop()) is not None:
+            # Stop reading while too many requests are queued, so TCP pushes back on the client
+            await read_ahead.acquire()
+            request_id, payload = frame
+            message = payload.decode().strip()
+            print(f"Backend {port} received request {request_id}: {message}")
+            task = asyncio.ensure_future(respond(request_id, message))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        data = await reader.read(65536)
+        if not data:
+            break
+    # Let replies to requests already read reach a client that only half-closed
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+def handle_client(client_socket, address, port):
+    """Handle a single client connection with added search functionality"""
+    global active_connections
+
+    # Health checks are answered before the connection counts as active or sees the workload delay
+    try:
+        is_ping = client_socket.recv(1024, socket.MSG_PEEK) == b"PING"
+    except OSError:
+        client_socket.close()
+        return
+    if is_ping:
+        handle_ping(client_socket, address, port)
+        return
+
+    with connections_lock:
+        active_connections += 1
+        current_connections = active_connections
+
+    try:
+        print(f"Backend {port}: Handling connection from {address}")
+        print(f"Backend {port}: Active connections: {current_connections}")
+
+        first_message = True
+        while True:
+            try:
+                data = client_socket.recv(1024)
+                if not data:
+                    break
+
+                if first_message and data.startswith(PREFACE):
+                    print(f"Backend {port}: {address} speaks the framed protocol")
+                    serve_framed(client_socket, port, current_connections, data[len(PREFACE):])
+                    break
+                first_message = False
+
+                message = data.decode().strip()
+                print(f"Backend {port} received: {message}")
+
+                response = execute_command(message, port, current_connections)
+                client_socket.send(response.encode())
+
+            except Exception as e:
+                print(f"Backend {port} error: {e}")
+                break
+    finally:
+        with connections_lock:
+            active_connections -= 1
+            print(f"Backend {port}: Connection closed. Active connections: {active_connections}")
+
+        client_socket.close()
+        print(f"Backend {port}: Connection from {address} closed")
+
+async def handle_client_async(reader, writer, port):
+    """handle_client for the event loop"""
+    global active_connections
+
+    address = writer.get_extra_info('peername')
+    # Health checks are answered before the connection counts as active or sees the workload delay
+    try:
+        data = await reader.read(1024)
+    except OSError:
+        data = b""
+    if data == b"PING":
+        await handle_ping_async(writer)
+        return
+
+    with connections_lock:
+        active_connections += 1
+        current_connections = active_connections
+
+    try:
+        print(f"Backend {port}: Handling connection from {address}")
+        print(f"Backend {port}: Active connections: {current_connections}")
+
+        first_message = True
+        while data:
+            try:
+                if first_message and data.startswith(PREFACE):
+                    print(f"Backend {port}: {address} speaks the framed protocol")
+                    await serve_framed_async(reader, writer, port, current_connections, data[len(PREFACE):])
+                    break
+                first_message = False
+
+                message = data.decode().strip()
+                print(f"Backend {port} received: {message}")
+
+                response = await execute_command_async(message, port, current_connections)
+                writer.write(response.encode())
+                await writer.drain()
+                data = await reader.read(1024)
+
+            except Exception as e:
+                print(f"Backend {port} error: {e}")
+                break
+    finally:
+        with connections_lock:
+            active_connections -= 1
+            print(f"Backend {port}: Connection closed. Active connections: {active_connections}")
+
+        writer.close()
+        print(f"Backend {port}: Connection from {address} closed")
+
+def handle_ping(client_socket, address, port):
+    """Handle a health check ping"""
+    try:
+        data = client_socket.recv(4)
+        if data == b"PING":
+            with connections_lock:
+                delay = 0.001 * active_connections
+            time.sleep(delay)
+            client_socket.send(b"PONG")
+    finally:
+        client_socket.close()
+
+async def handle_ping_async(writer):
+    """handle_ping for the event loop, once the PING has been read"""
+    try:
+        with connections_lock:
+            delay = 0.001 * active_connections
+        await asyncio.sleep(delay)
+        writer.write(b"PONG")
+        await writer.drain()
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+def print_banner(port):
+    print(f"Enhanced backend server {port} listening on port {port} "
+          f"({BACKEND_ENGINE.lower()} engine, delay factor {DELAY_FACTOR})")
+    print(f"Available commands:")
+    print(f"  - search [query]: Search the web")
+    print(f"  - STATUS: Get server status")
+    print(f"  - GET TIME: Get current time")
+    print(f"  - UPPERCASE [text]: Convert text to uppercase")
+    print(f"  - take me to [site]: Redirect to website")
+
+def start_backend_server(port):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((BACKEND_HOST, port))
+    server.listen(BACKEND_BACKLOG)
+    print_banner(port)
+
+    try:
+        while True:
+            client_socket, address = server.accept()
+            print(f"Backend {port}: New connection from {address}")
+
+            client_thread = threading.Thread(
+                target=handle_client,
+                args=(client_socket, address, port)
+            )
+            client_thread.daemon = True
+            client_thread.start()
+    except KeyboardInterrupt:
+        print(f"Backend {port}: Shutting down")
+    finally:
+        server.close()
+
+async def run_backend_server_async(port):
+    global search_executor
+    # Only used by search_client.fetch_async when aiohttp is not installed
+    search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+    asyncio.get_running_loop().set_default_executor(search_executor)
+
+    async def on_connection(reader, writer):
+        print(f"Backend {port}: New connection from {writer.get_extra_info('peername')}")
+        await handle_client_async(reader, writer, port)
+
+    server = await asyncio.start_server(on_connection, BACKEND_HOST, port,
+                                        backlog=BACKEND_BACKLOG, reuse_address=True)
+    print_banner(port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        search_cache.close_async()
+        await search_client.close_async()
+
+def start_backend_server_async(port):
+    """Serve every client connection of this backend from one event loop until interrupted"""
+    try:
+        asyncio.run(run_backend_server_async(port))
+    except KeyboardInterrupt:
+        print(f"Backend {port}: Shutting down")
+    finally:
+        if search_executor:
+            search_executor.shutdown(wait=False)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backend server for the load balancer")
+    parser.add_argument("--port", type=int, default=BACKEND_PORT)
+    parser.add_argument("--delay-factor", type=float, default=DELAY_FACTOR,
+                        help="seconds of artificial delay per active connection")
+    parser.add_argument("--engine", choices=["asyncio", "threaded"], default=BACKEND_ENGINE.lower(),
+                        help="asyncio serves all connections from one event loop; threaded uses a thread per connection")
+    parser.add_argument("--search-workers", type=int, default=SEARCH_WORKERS,
+                        help="threads the asyncio engine runs search API calls on when aiohttp is not installed")
+    parser.add_argument("--search-pool", type=int, default=SEARCH_POOL_SIZE,
+                        help="keep-alive connections kept to the search API")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global DELAY_FACTOR, BACKEND_ENGINE, SEARCH_WORKERS, search_client
+
+    args = parse_args(argv)
+    DELAY_FACTOR = args.delay_factor
+    BACKEND_ENGINE = args.engine.upper()
+    SEARCH_WORKERS = args.search_workers
+    if args.search_pool != search_client.pool_size:
+        search_client = SearchClient(SEARCH_API_KEY, pool_size=args.search_pool)
+
+    if BACKEND_ENGINE == "ASYNCIO":
+        start_backend_server_async(args.port)
+    else:
+        start_backend_server(args.port)
+
+if __name__ == "__main__":
+    main()
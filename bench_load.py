@@ -0,0 +1,369 @@
+import asyncio
+import argparse
+import bisect
+import collections
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+import client
+from framing import PREFACE, FrameError, encode_frame, read_frame_async
+from metrics import LatencyHistogram
+
+STACK_HOST = '127.0.0.1'
+STUB_PORT = 8600
+CACHE_PORT = 8500
+BACKENDS = [(8001, 0.1), (8002, 0.2)]  # the load balancer's default BACKEND_SERVERS and their delay factors
+DEFAULT_MIX = "search=30,uppercase=30,time=20,take=10,echo=5,status=5"
+
+COMMANDS = {
+    "search": lambda key: f"search topic {key}",
+    "uppercase": lambda key: f"UPPERCASE payload {key}",
+    "time": lambda key: "GET TIME",
+    "take": lambda key: f"take me to site{key}",
+    "echo": lambda key: f"hello {key}",
+    "status": lambda key: "STATUS",
+}
+
+def load_workload(path):
+    """
+    Read commands to replay, one per line: JSON objects with a "command" (or "message")
+    field, JSON strings, or plain text. Objects with only a "title", such as the entries
+    of requests.jsonl, are replayed as searches for that title.
+    """
+    commands = []
+    with open(path) as workload:
+        for line in workload:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                commands.append(line)
+                continue
+            if isinstance(record, str):
+                commands.append(record)
+            elif isinstance(record, dict):
+                command = record.get("command") or record.get("message")
+                if not command and record.get("title"):
+                    command = f"search {record['title']}"
+                if command:
+                    commands.append(command)
+    if not commands:
+        sys.exit(f"No commands found in {path}")
+    return commands
+
+def synthetic_commands(mix, keys, skew, seed):
+    """Endless commands drawn from `mix` (name=weight,...), with keys Zipf-distributed over `keys`"""
+    names, weights = [], []
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in COMMANDS:
+            sys.exit(f"Unknown command {name!r} in --mix; choose from {', '.join(COMMANDS)}")
+        names.append(name)
+        weights.append(float(weight or 1))
+    key_weights = list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, keys + 1)))
+    rng = random.Random(seed)
+    while True:
+        name = rng.choices(names, weights)[0]
+        key = bisect.bisect(key_weights, rng.random() * key_weights[-1])
+        yield COMMANDS[name](key)
+
+class Results:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.ok = 0
+        self.errors = collections.Counter()
+        self.last_response = None  # perf_counter() of the latest answer, so timeouts do not stretch the run
+
+    def success(self, latency):
+        self.ok += 1
+        self.latency.record(latency)
+
+    def error(self, kind):
+        self.errors[kind] += 1
+
+class FramedConnection:
+    """One framed client connection; responses are matched to requests by id, so many can be in flight"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = {}
+        self.request_ids = itertools.count(1)
+        self.reader_task = asyncio.ensure_future(self._read_responses())
+
+    async def _read_responses(self):
+        try:
+            while True:
+                request_id, payload = await read_frame_async(self.reader)
+                future = self.pending.pop(request_id, None)
+                if future and not future.done():
+                    future.set_result(payload)
+        except (asyncio.IncompleteReadError, OSError, FrameError):
+            pass
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("connection lost"))
+            self.pending.clear()
+
+    async def request(self, message, timeout):
+        if self.reader_task.done():
+            raise ConnectionError("connection lost")
+        request_id = next(self.request_ids) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            self.writer.write(encode_frame(request_id, message.encode()))
+            await self.writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+    def close(self):
+        self.reader_task.cancel()
+        self.writer.close()
+
+class RawConnection:
+    """The legacy unframed protocol: one request at a time, and whatever one read returns is the reply"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, message, timeout):
+        self.writer.write(message.encode())
+        await self.writer.drain()
+        data = await asyncio.wait_for(self.reader.read(65536), timeout)
+        if not data:
+            raise ConnectionError("connection lost")
+        return data
+
+    def close(self):
+        self.writer.close()
+
+async def open_connections(count, host, port, ssl_context, framed, results, connect_concurrency=256):
+    """Open `count` client connections, at most `connect_concurrency` handshakes at a time"""
+    gate = asyncio.Semaphore(connect_concurrency)
+
+    async def open_one():
+        async with gate:
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, port, ssl=ssl_context,
+                                            server_hostname=host if ssl_context else None), 10)
+            except (OSError, asyncio.TimeoutError):
+                results.error("connect")
+                return None
+        if framed:
+            writer.write(PREFACE)
+            return FramedConnection(reader, writer)
+        return RawConnection(reader, writer)
+
+    connections = await asyncio.gather(*(open_one() for _ in range(count)))
+    return [connection for connection in connections if connection]
+
+async def send(connection, message, timeout, started, results):
+    """Send one request and record it; latency is measured from `started`"""
+    try:
+        response = await connection.request(message, timeout)
+    except asyncio.TimeoutError:
+        results.error("timeout")
+        return
+    except (ConnectionError, OSError):
+        results.error("connection")
+        return
+    results.last_response = time.perf_counter()
+    if response.startswith(b"[Load Balancer]"):
+        results.error("load_balancer")
+    else:
+        results.success(time.perf_counter() - started)
+
+async def run_closed_loop(connections, commands, duration, timeout, results):
+    """Every connection sends its next request as soon as the previous one is answered"""
+    deadline = time.perf_counter() + duration
+
+    async def drive(connection):
+        while time.perf_counter() < deadline:
+            await send(connection, next(commands), timeout, time.perf_counter(), results)
+            if isinstance(connection, FramedConnection) and connection.reader_task.done():
+                return
+
+    await asyncio.gather(*(drive(connection) for connection in connections))
+
+async def run_open_loop(connections, commands, duration, timeout, rate, max_outstanding, results):
+    """
+    Send requests at Poisson arrivals of `rate` per second, spread over the connections,
+    whether or not earlier ones were answered. Latency counts from the scheduled arrival,
+    so a stalled server shows up in the percentiles instead of slowing the load down.
+    """
+    rng = random.Random(1)
+    in_flight = set()
+    next_arrival = time.perf_counter()
+    deadline = next_arrival + duration
+    for connection in itertools.cycle(connections):
+        next_arrival += rng.expovariate(rate)
+        if next_arrival >= deadline:
+            break
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_outstanding:
+            results.error("dropped")
+            continue
+        task = asyncio.ensure_future(send(connection, next(commands), timeout, next_arrival, results))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+async def run_load(args, commands, results):
+    ssl_context = None
+    if client.USE_SSL and not args.no_tls:
+        # client.py reports what it set up; the benchmark only wants its table
+        with contextlib.redirect_stdout(io.StringIO()):
+            ssl_context = client.create_client_ssl_context()
+    connections = await open_connections(args.connections, args.host, args.port, ssl_context,
+                                         not args.raw, results)
+    if not connections:
+        return 0.0
+    start = time.perf_counter()
+    try:
+        if args.rate:
+            await run_open_loop(connections, commands, args.duration, args.timeout, args.rate,
+                                args.max_outstanding, results)
+        else:
+            await run_closed_loop(connections, commands, args.duration, args.timeout, results)
+    finally:
+        for connection in connections:
+            connection.close()
+    # Throughput is measured up to the last answer, not the end of the timeout tail
+    return (results.last_response or time.perf_counter()) - start
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((STACK_HOST, port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def start_stack(algorithm, lb_args, lb_port):
+    """Start the stub search API, the search cache, both backends and the load balancer as child processes"""
+    env = dict(os.environ, SEARCH_API_URL=f"http://{STACK_HOST}:{STUB_PORT}/customsearch/v1")
+    quiet = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL, "env": env}
+    python = sys.executable
+    processes = [
+        subprocess.Popen([python, "stub_search_api.py", "--port", str(STUB_PORT), "--latency", "0.05"], **quiet),
+        subprocess.Popen([python, "search_cache.py", "--port", str(CACHE_PORT), "--metrics-port", "0"], **quiet),
+    ]
+    for port, delay_factor in BACKENDS:
+        processes.append(subprocess.Popen(
+            [python, "backend_server.py", "--port", str(port), "--delay-factor", str(delay_factor)], **quiet))
+    for port in [STUB_PORT, CACHE_PORT] + [port for port, _ in BACKENDS]:
+        if not wait_for_port(port):
+            stop_stack(processes)
+            sys.exit(f"Stand-in on port {port} did not start")
+
+    processes.append(subprocess.Popen(
+        [python, "loadbalancer.py", "--algorithm", algorithm, "--metrics-port", "0",
+         "--log-level", "warning", *lb_args], stdin=subprocess.DEVNULL, **quiet))
+    if not wait_for_port(lb_port):
+        stop_stack(processes)
+        sys.exit(f"Load balancer with {algorithm} did not start")
+    return processes
+
+def stop_stack(processes):
+    for process in reversed(processes):
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def raise_file_limit():
+    """Thousands of connections need thousands of descriptors"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def report(label, elapsed, results):
+    total = results.ok + sum(results.errors.values())
+    p50, p90, p99, p999 = (value * 1000 for value in results.latency.percentiles([0.5, 0.9, 0.99, 0.999]))
+    rate = results.ok / elapsed if elapsed else 0.0
+    print(f"{label:<28}{rate:>10,.1f}{results.ok:>9}{total - results.ok:>8}"
+          f"{p50:>9.1f}{p90:>9.1f}{p99:>9.1f}{p999:>9.1f}", flush=True)
+    if results.errors:
+        print(f"{'':<28}errors: " + ", ".join(f"{kind}={count}" for kind, count in sorted(results.errors.items())))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load generator: replays a workload or a synthetic command mix against the load balancer "
+                    "and reports throughput, errors and latency percentiles per algorithm")
+    parser.add_argument("--algorithms", default="round_robin,least_connections,peak_ewma,consistent_hash",
+                        help="comma-separated algorithms; the local stack is restarted for each")
+    parser.add_argument("--external", action="store_true",
+                        help="load an already running load balancer instead of starting the local stack")
+    parser.add_argument("--lb-args", default="", help="extra load balancer flags, e.g. '--engine asyncio --mode l7'")
+    parser.add_argument("--host", help=f"with --external: load balancer host (default {client.SERVER_HOST})")
+    parser.add_argument("--port", type=int, help=f"with --external: load balancer port (default {client.SERVER_PORT})")
+    parser.add_argument("--no-tls", action="store_true", help="plain TCP, for a load balancer with USE_SSL off")
+    parser.add_argument("--raw", action="store_true", help="legacy unframed protocol (closed loop only)")
+    parser.add_argument("--connections", type=int, default=200, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per algorithm")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="open loop: requests per second in total; 0 runs closed loop")
+    parser.add_argument("--max-outstanding", type=int, default=10000,
+                        help="open loop: requests in flight before new arrivals are dropped")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for each response")
+    parser.add_argument("--workload", help="file of commands to replay in order, e.g. requests.jsonl")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"synthetic command weights, from {', '.join(COMMANDS)} (default {DEFAULT_MIX})")
+    parser.add_argument("--keys", type=int, default=1000, help="distinct search/uppercase/take keys in the mix")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of key popularity; 0 is uniform")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if args.raw and args.rate:
+        sys.exit("--raw cannot pipeline requests, so it only runs closed loop")
+    if not args.external and (args.host or args.port):
+        sys.exit(f"--host and --port need --external; the local stack's load balancer listens on "
+                 f"{client.SERVER_HOST}:{client.SERVER_PORT}")
+    args.host = args.host or client.SERVER_HOST
+    args.port = args.port or client.SERVER_PORT
+
+    raise_file_limit()
+    labels = ["external"] if args.external else [name.strip() for name in args.algorithms.split(",")]
+    source = f"replaying {args.workload}" if args.workload else f"mix {args.mix}, {args.keys} keys, skew {args.skew}"
+    loop = f"open loop at {args.rate:,.0f} req/s" if args.rate else "closed loop"
+    print(f"{args.connections} connections, {loop}, {args.duration:.0f}s per run, {source}")
+    print(f"{'algorithm':<28}{'req/s':>10}{'ok':>9}{'errors':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'p99.9 ms':>9}",
+          flush=True)
+
+    for label in labels:
+        if args.workload:
+            commands = itertools.cycle(load_workload(args.workload))
+        else:
+            commands = synthetic_commands(args.mix, args.keys, args.skew, args.seed)
+        processes = [] if args.external else start_stack(label, args.lb_args.split(), args.port)
+        results = Results()
+        try:
+            elapsed = asyncio.run(run_load(args, commands, results))
+        finally:
+            stop_stack(processes)
+        report(label, elapsed, results)
+
+if __name__ == "__main__":
+    sys.exit(main())
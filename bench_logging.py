@@ -0,0 +1,135 @@
+import socket
+import threading
+import tempfile
+import time
+import sys
+import os
+import argparse
+
+import loadbalancer
+from log_setup import start_logging, stop_logging
+
+BENCH_HOST = '127.0.0.1'
+BENCH_LB_PORT = 9200
+BENCH_BACKEND_PORT = 8201
+MESSAGE = b"x" * 512
+SETTLE_TIMEOUT = 10.0  # seconds to wait for the proxy's relay threads to finish after the clients
+
+# (label, level, log every chunk, sample every N hot-path records, background writer)
+CONFIGURATIONS = [
+    ("debug+chunks, synchronous", "DEBUG", True, 1, False),
+    ("debug+chunks, queued", "DEBUG", True, 1, True),
+    ("debug+chunks, 1/100 sampled", "DEBUG", True, 100, True),
+    ("debug, queued", "DEBUG", False, 1, True),
+    ("info, queued", "INFO", False, 1, True),
+    ("warning, queued", "WARNING", False, 1, True),
+]
+
+def handle_echo(client_socket):
+    try:
+        while True:
+            data = client_socket.recv(65536)
+            if not data:
+                return
+            client_socket.sendall(data)
+    except OSError:
+        pass
+    finally:
+        client_socket.close()
+
+def start_echo_backend():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((BENCH_HOST, BENCH_BACKEND_PORT))
+    server.listen(128)
+
+    def accept_loop():
+        while True:
+            client_socket, _ = server.accept()
+            threading.Thread(target=handle_echo, args=(client_socket,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+
+def run_client(connections, exchanges):
+    """Open `connections` connections one after another, each doing `exchanges` echo round trips"""
+    for _ in range(connections):
+        sock = socket.create_connection((BENCH_HOST, BENCH_LB_PORT))
+        try:
+            for _ in range(exchanges):
+                sock.sendall(MESSAGE)
+                received = 0
+                while received < len(MESSAGE):
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        raise RuntimeError("connection closed mid-exchange")
+                    received += len(chunk)
+        finally:
+            sock.close()
+
+def wait_for_threads(count, timeout=SETTLE_TIMEOUT):
+    """Wait until no more than `count` threads are alive: the proxy's relay threads log until they exit"""
+    deadline = time.monotonic() + timeout
+    while threading.active_count() > count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def run_configuration(level, chunks, sample_every, background, args):
+    """Run the fixed workload with one logging setup; returns (exchanges/s, log lines written)"""
+    with tempfile.TemporaryFile("w+") as log_file:
+        start_logging(loadbalancer.logger, level, stream=log_file, background=background)
+        loadbalancer.LOG_CHUNKS = chunks
+        for event in loadbalancer.LOG_SAMPLE_EVERY:
+            loadbalancer.LOG_SAMPLE_EVERY[event] = sample_every
+
+        idle_threads = threading.active_count()
+        start = time.perf_counter()
+        clients = [
+            threading.Thread(target=run_client, args=(args.connections, args.exchanges))
+            for _ in range(args.clients)
+        ]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        # Connections are torn down, and logged, after the clients hang up
+        wait_for_threads(idle_threads)
+        # The queued records still have to be written; count that against the run
+        stop_logging()
+        elapsed = time.perf_counter() - start
+        # Detach the handler before the file is counted and closed
+        start_logging(loadbalancer.logger, "WARNING", stream=open(os.devnull, "w"))
+
+        log_file.flush()
+        log_file.seek(0)
+        lines = sum(1 for _ in log_file)
+    total_exchanges = args.clients * args.connections * args.exchanges
+    return total_exchanges / elapsed, lines
+
+def main():
+    parser = argparse.ArgumentParser(description="Proxy throughput at each logging level")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client threads")
+    parser.add_argument("--connections", type=int, default=25, help="connections opened per client")
+    parser.add_argument("--exchanges", type=int, default=20, help="echo round trips per connection")
+    args = parser.parse_args()
+
+    loadbalancer.USE_SSL = False
+    loadbalancer.LB_PORT = BENCH_LB_PORT
+    loadbalancer.METRICS_PORT = 0
+    loadbalancer.BACKEND_SERVERS = [(BENCH_HOST, BENCH_BACKEND_PORT)]
+    loadbalancer.backend_registry = loadbalancer.BackendRegistry(loadbalancer.BACKEND_SERVERS)
+    loadbalancer.LOAD_BALANCING_ALGORITHM = "LEAST_CONNECTIONS"
+    loadbalancer.RELAY_MODE = "BUFFERED"
+
+    start_echo_backend()
+    start_logging(loadbalancer.logger, "WARNING", stream=open(os.devnull, "w"))
+    threading.Thread(target=loadbalancer.start_load_balancer, daemon=True).start()
+    time.sleep(0.3)
+
+    print(f"{args.clients} clients x {args.connections} connections x {args.exchanges} "
+          f"round trips of {len(MESSAGE)} bytes, log written to a file")
+    print(f"{'logging':<30}{'exchanges/s':>14}{'log lines':>12}")
+    for label, level, chunks, sample_every, background in CONFIGURATIONS:
+        rate, lines = run_configuration(level, chunks, sample_every, background, args)
+        print(f"{label:<30}{rate:>14,.0f}{lines:>12,}")
+
+if __name__ == "__main__":
+    sys.exit(main())
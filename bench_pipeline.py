@@ -0,0 +1,93 @@
+import socket
+import threading
+import itertools
+import time
+import sys
+import os
+import argparse
+
+import backend_server
+import loadbalancer
+from framing import PREFACE, FrameBuffer, encode_frame, recv_frame
+
+BENCH_HOST = '127.0.0.1'
+BENCH_BACKEND_PORT = 8301
+BENCH_LB_PORT = 9300
+REQUEST = b"UPPERCASE pipelined request"
+
+def start_proxy(mode):
+    """Run the load balancer in this process in front of the bench backend"""
+    loadbalancer.USE_SSL = False
+    loadbalancer.LB_PORT = BENCH_LB_PORT
+    loadbalancer.METRICS_PORT = 0
+    loadbalancer.BACKEND_SERVERS = [(BENCH_HOST, BENCH_BACKEND_PORT)]
+    loadbalancer.backend_registry = loadbalancer.BackendRegistry(loadbalancer.BACKEND_SERVERS)
+    loadbalancer.LOG_LEVEL = "WARNING"
+    loadbalancer.setup_logging()
+    if mode == "l7":
+        loadbalancer.PROXY_MODE = "L7"
+        target = loadbalancer.start_load_balancer_async
+    else:
+        target = loadbalancer.start_load_balancer
+    threading.Thread(target=target, daemon=True).start()
+
+def run_depth(port, depth, duration):
+    """Keep `depth` framed requests in flight on one connection; returns completed requests per second"""
+    sock = socket.create_connection((BENCH_HOST, port))
+    sock.settimeout(30)
+    sock.sendall(PREFACE)
+    frames = FrameBuffer()
+    request_ids = itertools.count(1)
+    try:
+        sock.sendall(b"".join(encode_frame(next(request_ids), REQUEST) for _ in range(depth)))
+        completed = 0
+        start = time.perf_counter()
+        deadline = start + duration
+        while time.perf_counter() < deadline:
+            recv_frame(sock, frames)
+            completed += 1
+            sock.sendall(encode_frame(next(request_ids), REQUEST))
+        return completed / (time.perf_counter() - start)
+    finally:
+        sock.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Framed requests per second against pipeline depth")
+    parser.add_argument("--target", choices=["backend", "l4", "l7"], default="backend",
+                        help="talk to the backend directly or through the load balancer in L4 or L7 mode")
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per depth")
+    parser.add_argument("--delay-factor", type=float, default=0.0,
+                        help="backend delay per active connection; its random 0-50ms per request always applies")
+    parser.add_argument("--backend-engine", choices=["asyncio", "threaded"], default="asyncio")
+    args = parser.parse_args()
+
+    backend_server.DELAY_FACTOR = args.delay_factor
+    backend_server.BACKEND_ENGINE = args.backend_engine.upper()
+    if backend_server.BACKEND_ENGINE == "ASYNCIO":
+        start_backend = backend_server.start_backend_server_async
+        concurrency = f"up to {backend_server.PIPELINE_DEPTH_LIMIT} requests at once per connection"
+    else:
+        start_backend = backend_server.start_backend_server
+        concurrency = f"{backend_server.PIPELINE_WORKERS} backend workers per connection"
+    # The backend prints every request, and keeps answering abandoned requests after
+    # each run; send all of that to /dev/null for the life of the process
+    results_out = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+
+    threading.Thread(target=start_backend, args=(BENCH_BACKEND_PORT,), daemon=True).start()
+    port = BENCH_BACKEND_PORT
+    if args.target != "backend":
+        start_proxy(args.target)
+        port = BENCH_LB_PORT
+    time.sleep(0.5)
+
+    print(f"Pipelined '{REQUEST.decode()}' via {args.target}, {args.backend_engine} backend, {concurrency}",
+          file=results_out)
+    print(f"{'depth':>6}{'requests/s':>14}", file=results_out)
+    for depth in args.depths:
+        rate = run_depth(port, depth, args.duration)
+        print(f"{depth:>6}{rate:>14,.1f}", file=results_out, flush=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import socket
+import threading
+import struct
+import time
+import sys
+import argparse
+
+import loadbalancer
+
+BENCH_HOST = '127.0.0.1'
+BENCH_LB_PORT = 9100
+BENCH_BACKEND_PORT = 8101
+CHUNK = b"x" * 65536
+
+def handle_sink(client_socket):
+    """Read an 8-byte size header, then either swallow or stream back that many bytes"""
+    try:
+        header = client_socket.recv(9, socket.MSG_WAITALL)
+        mode, size = header[:1], struct.unpack("!Q", header[1:])[0]
+        if mode == b"U":
+            remaining = size
+            buffer = bytearray(1 << 20)
+            while remaining:
+                received = client_socket.recv_into(buffer, min(len(buffer), remaining))
+                if not received:
+                    return
+                remaining -= received
+            client_socket.sendall(b"OK")
+        else:
+            remaining = size
+            while remaining:
+                sent = client_socket.send(CHUNK[:min(len(CHUNK), remaining)])
+                remaining -= sent
+    finally:
+        client_socket.close()
+
+def start_sink_backend():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((BENCH_HOST, BENCH_BACKEND_PORT))
+    server.listen(128)
+
+    def accept_loop():
+        while True:
+            client_socket, _ = server.accept()
+            threading.Thread(target=handle_sink, args=(client_socket,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+
+def run_transfer(direction, size):
+    """Push or pull `size` bytes through the load balancer and return MB/s"""
+    sock = socket.create_connection((BENCH_HOST, BENCH_LB_PORT))
+    start = time.perf_counter()
+    try:
+        if direction == "upload":
+            sock.sendall(b"U" + struct.pack("!Q", size))
+            remaining = size
+            while remaining:
+                remaining -= sock.send(CHUNK[:min(len(CHUNK), remaining)])
+            if sock.recv(2, socket.MSG_WAITALL) != b"OK":
+                raise RuntimeError("upload was not acknowledged")
+        else:
+            sock.sendall(b"D" + struct.pack("!Q", size))
+            remaining = size
+            buffer = bytearray(1 << 20)
+            while remaining:
+                received = sock.recv_into(buffer, min(len(buffer), remaining))
+                if not received:
+                    raise RuntimeError("download ended early")
+                remaining -= received
+    finally:
+        sock.close()
+    elapsed = time.perf_counter() - start
+    return size / elapsed / (1024 * 1024)
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay throughput benchmark for the threaded engine")
+    parser.add_argument("--size-mb", type=int, default=256, help="bytes moved per transfer, in MB")
+    parser.add_argument("--buffer-size", type=int, default=loadbalancer.RELAY_BUFFER_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    loadbalancer.USE_SSL = False
+    loadbalancer.LB_PORT = BENCH_LB_PORT
+    loadbalancer.METRICS_PORT = 0
+    loadbalancer.BACKEND_SERVERS = [(BENCH_HOST, BENCH_BACKEND_PORT)]
+    loadbalancer.backend_registry = loadbalancer.BackendRegistry(loadbalancer.BACKEND_SERVERS)
+    loadbalancer.RELAY_BUFFER_SIZE = args.buffer_size
+
+    start_sink_backend()
+    size = args.size_mb * 1024 * 1024
+
+    results = []
+    loadbalancer.LOG_LEVEL = "WARNING"
+    loadbalancer.setup_logging()
+    threading.Thread(target=loadbalancer.start_load_balancer, daemon=True).start()
+    time.sleep(0.3)
+
+    for mode in ("COPY", "BUFFERED", "SPLICE"):
+        loadbalancer.RELAY_MODE = mode
+        for direction in ("upload", "download"):
+            best = max(run_transfer(direction, size) for _ in range(args.repeat))
+            results.append((mode, direction, best))
+
+    print(f"Relay throughput, {args.size_mb} MB per transfer, buffer {args.buffer_size} bytes (best of {args.repeat})")
+    for mode, direction, rate in results:
+        print(f"  {mode:<9} {direction:<9} {rate:10.1f} MB/s")
+
+if __name__ == "__main__":
+    sys.exit(main())
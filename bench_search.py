@@ -0,0 +1,97 @@
+import threading
+import itertools
+import asyncio
+import time
+import sys
+import argparse
+
+import requests
+import urllib3
+
+from metrics import LatencyHistogram
+from search_client import SearchClient
+from stub_search_api import StubSearchAPI
+
+BENCH_STUB_PORT = 8601
+
+def run_threads(search, total, concurrency):
+    """Run `total` searches from `concurrency` threads; returns (elapsed seconds, latency histogram)"""
+    histogram = LatencyHistogram()
+    queries = itertools.count()
+
+    def worker():
+        while (n := next(queries)) < total:
+            start = time.perf_counter()
+            search(f"bench query {n}")
+            histogram.record(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, histogram
+
+def run_async(client, total, concurrency):
+    """Run `total` searches as `concurrency` tasks on one event loop and thread"""
+    histogram = LatencyHistogram()
+    queries = iter(range(total))
+
+    async def worker():
+        for n in queries:
+            start = time.perf_counter()
+            await client.fetch_async(f"bench query {n}")
+            histogram.record(time.perf_counter() - start)
+
+    async def main():
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        finally:
+            await client.close_async()
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return time.perf_counter() - start, histogram
+
+def main():
+    parser = argparse.ArgumentParser(description="Search API throughput with and without connection reuse")
+    parser.add_argument("--requests", type=int, default=500, help="searches per variant")
+    parser.add_argument("--concurrency", type=int, default=16, help="threads, or tasks for the async variant")
+    parser.add_argument("--pool-size", type=int, default=16, help="keep-alive connections in the pooled client")
+    parser.add_argument("--latency", type=float, default=0.005, help="stub API time per search in seconds")
+    parser.add_argument("--plain", action="store_true", help="talk HTTP instead of HTTPS to the stub")
+    args = parser.parse_args()
+
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    api = StubSearchAPI(port=BENCH_STUB_PORT, latency=args.latency, tls=not args.plain)
+    api.start()
+    client = SearchClient("bench", url=api.url, pool_size=args.pool_size, verify=False)
+    unpooled_params = client.params
+
+    def unpooled(query):
+        # What perform_search used to do: a fresh connection and handshake per search
+        requests.get(api.url, params=unpooled_params(query), verify=False)
+
+    variants = [
+        ("unpooled", lambda: run_threads(unpooled, args.requests, args.concurrency)),
+        ("pooled", lambda: run_threads(client.fetch, args.requests, args.concurrency)),
+        ("async", lambda: run_async(client, args.requests, args.concurrency)),
+    ]
+    print(f"{args.requests} searches against {api.url}, concurrency {args.concurrency}, "
+          f"{args.latency * 1000:.0f}ms per search upstream")
+    print(f"{'variant':<10}{'searches/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'connections':>13}")
+    try:
+        for name, run in variants:
+            connections_before = api.stats()["connections"]
+            elapsed, histogram = run()
+            p50, p99 = histogram.percentiles([0.5, 0.99])
+            connections = api.stats()["connections"] - connections_before
+            print(f"{name:<10}{args.requests / elapsed:>12,.1f}{p50 * 1000:>10.1f}{p99 * 1000:>10.1f}{connections:>13}",
+                  flush=True)
+    finally:
+        client.close()
+        api.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import random
+import time
+import argparse
+
+from backend_registry import BackendRegistry
+
+def linear_least_connections(servers, counts):
+    """The original selection: rebuild the counts and scan every backend"""
+    snapshot = {server: counts.get(server, 0) for server in servers}
+    min_connections = float('inf')
+    selected_server = None
+    for server, count in snapshot.items():
+        if count < min_connections:
+            min_connections = count
+            selected_server = server
+    return selected_server
+
+def linear_least_response(servers, response_times):
+    min_response_time = float('inf')
+    selected_server = None
+    for server in servers:
+        if server in response_times:
+            response_time = response_times[server]
+            if response_time < min_response_time:
+                min_response_time = response_time
+                selected_server = server
+    return selected_server
+
+def measure(operation, duration):
+    """Run operation repeatedly for `duration` seconds and return calls per second"""
+    calls = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        for _ in range(1000):
+            operation()
+        calls += 1000
+    return calls / duration
+
+def bench_pool(backend_count, duration):
+    servers = [('10.0.0.1', 8000 + i) for i in range(backend_count)]
+    registry = BackendRegistry(servers)
+    counts = {}
+    response_times = {}
+    for server in servers:
+        for _ in range(random.randint(0, 50)):
+            registry.add_connection(server)
+        counts[server] = registry.connection_count(server)
+        response_times[server] = random.uniform(0.001, 0.5)
+        registry.set_response_time(server, response_times[server])
+
+    def registry_least_connections():
+        # A selection is followed by the connection it opens, like handle_client
+        server, _ = registry.least_connections()
+        registry.add_connection(server)
+        registry.remove_connection(server)
+
+    def registry_least_response():
+        server, response_time = registry.fastest()
+        registry.set_response_time(server, response_time)
+
+    def legacy_least_connections():
+        server = linear_least_connections(servers, counts)
+        counts[server] += 1
+        counts[server] -= 1
+
+    def legacy_least_response():
+        server = linear_least_response(servers, response_times)
+        response_times[server] = response_times[server]
+
+    return {
+        "round_robin": measure(registry.next_round_robin, duration),
+        "least_connections": measure(registry_least_connections, duration),
+        "least_connections (linear)": measure(legacy_least_connections, duration),
+        "least_response": measure(registry_least_response, duration),
+        "least_response (linear)": measure(legacy_least_response, duration),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend selection microbenchmark")
+    parser.add_argument("--backends", type=int, nargs="+", default=[2, 10, 100, 1000])
+    parser.add_argument("--duration", type=float, default=0.5, help="seconds per measurement")
+    args = parser.parse_args()
+
+    results = {count: bench_pool(count, args.duration) for count in args.backends}
+    names = list(next(iter(results.values())))
+
+    print("Selections per second by number of backends")
+    print(f"{'algorithm':<28}" + "".join(f"{count:>12}" for count in args.backends))
+    for name in names:
+        print(f"{name:<28}" + "".join(f"{results[count][name]:>12,.0f}" for count in args.backends))
+
+if __name__ == "__main__":
+    main()
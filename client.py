@@ -4,12 +4,15 @@ import platform
 import subprocess
 import ssl
 import time
+import itertools
+from framing import PREFACE, FrameBuffer, encode_frame, recv_frame
 
 SERVER_HOST = '127.0.0.1'
 SERVER_PORT = 9000  
 USE_SSL = True
 SSL_CERT = 'ssl_certs/cert.pem'  
 VERIFY_CERT = False
+FRAMED = True  # length-prefixed requests/responses; False sends raw messages as before
 
 def open_url_in_browser(url):
     if platform.system() == "Linux":
@@ -57,64 +60,145 @@ def open_url_in_browser(url):
         print(f"Unsupported operating system for automatic browser opening. Please open '{url}' manually.")
         return False
 
-def run_client():
+def create_client_ssl_context():
+    """Build the client-side SSL context used to talk to the load balancer"""
+    ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
 
+    if VERIFY_CERT and os.path.exists(SSL_CERT):
+        ssl_context.load_verify_locations(SSL_CERT)
+        print(f"Using certificate for SSL verification: {SSL_CERT}")
+    else:
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        print("SSL certificate verification disabled")
+    return ssl_context
+
+def connect_to_load_balancer(ssl_context=None, ssl_session=None):
+    """
+    Open a connection to the load balancer. Passing the SSLSession saved from an
+    earlier connection lets the server resume it instead of doing a full handshake.
+    """
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    if ssl_context:
+        client_socket = ssl_context.wrap_socket(client_socket, server_hostname=SERVER_HOST, session=ssl_session)
+        print("SSL enabled for connection")
+
+    client_socket.connect((SERVER_HOST, SERVER_PORT))
+    print(f"Connected to load balancer at {SERVER_HOST}:{SERVER_PORT}")
+    if ssl_context:
+        print(f"TLS session {'resumed' if client_socket.session_reused else 'negotiated with a full handshake'}")
+
+    client_socket.settimeout(5.0)
+    if FRAMED:
+        client_socket.sendall(PREFACE)
+    return client_socket
+
+def send_and_receive(client_socket, message, request_id, frames):
+    """Send one message and return the response text"""
+    if FRAMED:
+        client_socket.sendall(encode_frame(request_id, message.encode()))
+        print(f"Sent message: {message}")
+        while True:
+            response_id, payload = recv_frame(client_socket, frames)
+            if response_id == request_id:
+                return payload.decode()
+            print(f"Ignoring response to earlier request {response_id}")
+
+    try:
+        client_socket.setblocking(0) 
+        while True:
+            try:
+                leftover = client_socket.recv(4096)
+                if not leftover or len(leftover) == 0:
+                    break
+                print(f"Cleared leftover data: {leftover.decode()}")
+            except (socket.error, BlockingIOError):
+                break
+    except Exception as e:
+        print(f"Error clearing buffer: {e}")
+    finally:
+        client_socket.setblocking(1)  
+
+    client_socket.sendall(message.encode())
+    print(f"Sent message: {message}")
+
+    time.sleep(0.2)
+
+    client_socket.settimeout(5.0)  
+    return client_socket.recv(4096).decode()
+
+def send_pipelined(client_socket, messages, request_ids, frames):
+    """
+    Send every message back to back without waiting, then collect the responses,
+    which may arrive in any order; returns them in the order the messages were sent.
+    """
+    ids = [next(request_ids) for _ in messages]
+    client_socket.sendall(b"".join(
+        encode_frame(request_id, message.encode()) for request_id, message in zip(ids, messages)
+    ))
+    waiting = set(ids)
+    responses = {}
+    while waiting:
+        response_id, payload = recv_frame(client_socket, frames)
+        if response_id in waiting:
+            waiting.discard(response_id)
+            responses[response_id] = payload.decode()
+    return [responses[request_id] for request_id in ids]
+
+def run_client():
+
+    client_socket = None
+    ssl_context = None
+    ssl_session = None
+    request_ids = itertools.count(1)
+    frames = FrameBuffer()
     
     try:
 
         if USE_SSL:
+            ssl_context = create_client_ssl_context()
 
-            ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
-            
-            if VERIFY_CERT and os.path.exists(SSL_CERT):
-                ssl_context.load_verify_locations(SSL_CERT)
-                print(f"Using certificate for SSL verification: {SSL_CERT}")
-            else:
-                ssl_context.check_hostname = False
-                ssl_context.verify_mode = ssl.CERT_NONE
-                print("SSL certificate verification disabled")
-            
- 
-            client_socket = ssl_context.wrap_socket(client_socket, server_hostname=SERVER_HOST)
-            print("SSL enabled for connection")
-        
-        client_socket.connect((SERVER_HOST, SERVER_PORT))
-        print(f"Connected to load balancer at {SERVER_HOST}:{SERVER_PORT}")
-
-        client_socket.settimeout(5.0)
+        client_socket = connect_to_load_balancer(ssl_context)
 
         while True:
             message = input("Enter message to send (or 'quit' to exit): ")
             if message.lower() == 'quit':
                 break
 
-            try:
-                client_socket.setblocking(0) 
-                while True:
-                    try:
-                        leftover = client_socket.recv(4096)
-                        if not leftover or len(leftover) == 0:
-                            break
-                        print(f"Cleared leftover data: {leftover.decode()}")
-                    except (socket.error, BlockingIOError):
-                        break
-            except Exception as e:
-                print(f"Error clearing buffer: {e}")
-            finally:
-                client_socket.setblocking(1)  
-                
-
-            client_socket.sendall(message.encode())
-            print(f"Sent message: {message}")
-            
-            time.sleep(0.2)
+            if message.lower() == 'reconnect':
+                client_socket.close()
+                client_socket = connect_to_load_balancer(ssl_context, ssl_session)
+                frames = FrameBuffer()
+                continue
+
+            if FRAMED and message.lower().startswith("pipeline "):
+                # pipeline GET TIME ; UPPERCASE hi ; STATUS  -> all sent in one go
+                messages = [part.strip() for part in message[len("pipeline "):].split(";") if part.strip()]
+                try:
+                    for sent, response in zip(messages, send_pipelined(client_socket, messages, request_ids, frames)):
+                        print(f"Received for '{sent}': {response}")
+                except socket.timeout:
+                    print("Timeout waiting for pipelined responses.")
+                continue
 
             try:
-                client_socket.settimeout(5.0)  
-                response = client_socket.recv(4096).decode()
+                try:
+                    response = send_and_receive(client_socket, message, next(request_ids), frames)
+                except socket.timeout:
+                    raise
+                except (ConnectionError, ssl.SSLError, OSError) as e:
+                    print(f"Connection lost ({e}), reconnecting...")
+                    client_socket.close()
+                    client_socket = connect_to_load_balancer(ssl_context, ssl_session)
+                    frames = FrameBuffer()
+                    response = send_and_receive(client_socket, message, next(request_ids), frames)
                 print(f"Received from server: {response}")
 
+                # TLS 1.3 tickets arrive after the handshake, so refresh the session once data flowed
+                if ssl_context:
+                    ssl_session = client_socket.session
+
                 if response.lower().startswith("http/1.1 302 found"):
                     lines = response.splitlines()
                     location_header = next((line for line in lines if line.lower().startswith("location:")), None)
@@ -126,8 +210,9 @@ def run_client():
                         print("Received a redirect response but no Location header found.")
             except socket.timeout:
                 print("Timeout waiting for server response.")
-            
-            time.sleep(0.5)
+
+            if not FRAMED:
+                time.sleep(0.5)
 
     except ConnectionRefusedError:
         print(f"Connection refused. Make sure the load balancer is running at {SERVER_HOST}:{SERVER_PORT}")
@@ -137,7 +222,8 @@ def run_client():
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
-        client_socket.close()
+        if client_socket:
+            client_socket.close()
         print("Connection closed.")
 
 if __name__ == "__main__":
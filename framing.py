@@ -0,0 +1,64 @@
+import struct
+import collections
+
+# Sent once by a client that wants framed mode; anything else is treated as the legacy raw protocol
+PREFACE = b"LBF1"
+HEADER = struct.Struct("!II")  # request id, payload length
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+class FrameError(ValueError):
+    """The peer sent something that is not a valid frame"""
+
+def encode_frame(request_id, payload):
+    """Frame one request or response; the response to a request carries the same id"""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError(f"frame of {len(payload)} bytes exceeds {MAX_FRAME_SIZE}")
+    return HEADER.pack(request_id, len(payload)) + payload
+
+class FrameBuffer:
+    """
+    Reassembles frames from a byte stream. feed() takes whatever recv() returned,
+    however the stream was split, and pop() hands out complete frames in order.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.ready = collections.deque()
+
+    def feed(self, data):
+        self.buffer += data
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            request_id, length = HEADER.unpack_from(self.buffer, offset)
+            if length > MAX_FRAME_SIZE:
+                raise FrameError(f"frame of {length} bytes exceeds {MAX_FRAME_SIZE}")
+            end = offset + HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            self.ready.append((request_id, bytes(self.buffer[offset + HEADER.size:end])))
+            offset = end
+        # Compact once per feed, not once per frame, so a burst of small frames stays linear
+        del self.buffer[:offset]
+
+    def pop(self):
+        """Return the next complete (request_id, payload), or None if none is buffered"""
+        return self.ready.popleft() if self.ready else None
+
+def recv_frame(sock, frames):
+    """Block until a complete frame is available, reading from sock into the FrameBuffer `frames`"""
+    while True:
+        frame = frames.pop()
+        if frame:
+            return frame
+        data = sock.recv(65536)
+        if not data:
+            raise ConnectionError("connection closed while waiting for a frame")
+        frames.feed(data)
+
+async def read_frame_async(reader):
+    """Read one frame from an asyncio StreamReader"""
+    header = await reader.readexactly(HEADER.size)
+    request_id, length = HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise FrameError(f"frame of {length} bytes exceeds {MAX_FRAME_SIZE}")
+    return request_id, await reader.readexactly(length)
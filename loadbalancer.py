@@ -4,6 +4,28 @@ import sys
 import time
 import uuid
 import ssl
+import asyncio
+import argparse
+import os
+import multiprocessing
+import collections
+import random
+import itertools
+import logging
+import signal
+import ctypes
+from concurrent.futures import ThreadPoolExecutor
+from backend_registry import BackendRegistry, SharedBackendRegistry, BackendWeights, HashRing, ConcurrencyLimits
+from backend_registry import LIMIT_INITIAL, LIMIT_MIN, LIMIT_MAX
+from metrics import LatencyHistogram, Counter, Exposition, MetricsServer
+from log_setup import start_logging, stop_logging
+from framing import PREFACE, FrameBuffer, FrameError, encode_frame, read_frame_async
+from response_cache import ResponseCache, normalize_command, is_cacheable_response, STALE
+from admin import AdminServer, read_config, parse_backend_address
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
     
 LB_HOST = '127.0.0.1'  
@@ -17,113 +39,355 @@ BACKEND_SERVERS = [
     ('127.0.0.1', 8001),
     ('127.0.0.1', 8002)
 ]
+BACKEND_WEIGHTS = {                  # relative capacity for the weighted algorithms; unlisted backends get 1
+    ('127.0.0.1', 8001): 2,          # server1 adds 0.1s of delay per connection, server2 0.2s
+    ('127.0.0.1', 8002): 1,
+}
+DYNAMIC_WEIGHTS = True               # scale weights by observed latency and connect error rate
+SLOW_START_TIME = 30.0               # seconds a new or recovered backend takes to ramp up to its full weight
 
 
-current_server = 0
-
-server_lock = threading.Lock()
-
-active_connections_per_backend = {}
-connections_lock = threading.Lock()
-
 LOAD_BALANCING_ALGORITHM = "ROUND_ROBIN"  
+LOAD_BALANCING_ALGORITHMS = ["ROUND_ROBIN", "LEAST_CONNECTIONS", "LEAST_RESPONSE", "POWER_OF_TWO", "PEAK_EWMA",
+                             "WEIGHTED_ROUND_ROBIN", "WEIGHTED_LEAST_CONNECTIONS", "CONSISTENT_HASH"]
+HASH_LOAD_FACTOR = 1.25       # CONSISTENT_HASH: a backend takes at most this multiple of its fair share
+PROXY_ENGINE = "THREADED"
+PROXY_MODE = "L4"             # L4 relays bytes; L7 balances every framed request on its own (asyncio engine)
+L7_BACKEND_CONNECTIONS = 4    # persistent framed connections per backend that L7 requests are multiplexed over
+L7_REQUEST_TIMEOUT = 30.0
+RESPONSE_CACHE_BYTES = 32 * 1024 * 1024  # L7 response cache budget per process (0 disables it)
+RESPONSE_CACHE_RULES = {                  # command: (seconds fresh, further seconds served stale while refreshed)
+    "search": (600.0, 60.0),
+    "take me to": (3600.0, 600.0),
+    "uppercase": (3600.0, 600.0),
+}
+RELAY_MODE = "SPLICE"         # COPY, BUFFERED or SPLICE (falls back to BUFFERED on TLS legs)
+RELAY_BUFFER_SIZE = 65536
+WORKER_PROCESSES = 1
+WORKER_PARENT_CHECK_INTERVAL = 1.0   # seconds between checks that the parent is alive, where prctl is unavailable
+PR_SET_PDEATHSIG = 1
+LISTEN_BACKLOG = 1024
+HANDSHAKE_TIMEOUT = 5.0
+HANDSHAKE_WORKERS = 256
+TLS_SESSION_TICKETS = 2              # tickets issued per TLS 1.3 handshake
+TLS_TICKET_ROTATION_INTERVAL = 3600  # seconds between session ticket key rotations
+BACKEND_POOL_SIZE = 0                # warm upstream connections kept per backend (0 disables the pool)
+BACKEND_POOL_IDLE_TIMEOUT = 30.0     # seconds a pooled connection may sit idle before it is replaced
+BACKEND_POOL_REFILL_INTERVAL = 1.0
+BACKEND_CONNECT_TIMEOUT = 2.0
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9090                  # Prometheus endpoint at /metrics (0 disables it)
+ADMIN_HOST = '127.0.0.1'             # admin channel for runtime reconfiguration; no authentication, keep it local
+ADMIN_PORT = 9001                    # 0 disables it
+CONFIG_FILE = None                   # JSON config re-read on SIGHUP or the admin "reload" command
+DRAIN_TIMEOUT = 300.0                # seconds a draining backend's connections may finish before they are closed (0 waits forever)
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "text"                  # text or json
+LOG_CHUNKS = False                   # log every relayed chunk at DEBUG; for debugging only
+LOG_SAMPLE_EVERY = {                 # keep one in N records of these hot-path events
+    "connection": 1,
+    "selection": 1,
+    "counter": 1,
+    "chunk": 1,
+}
+
+logger = logging.getLogger("loadbalancer")
+log_sample_counters = collections.defaultdict(itertools.count)
+server_ssl_context = None
+server_ssl_context_created = 0.0
+ssl_context_lock = threading.Lock()
+tls_handshake_counts = {"full": 0, "resumed": 0}
+tls_stats_lock = threading.Lock()
+backend_pool = None
+response_cache = None
+response_cache_fills = {}            # cache key -> task fetching that response from a backend
 connections = {}  
-backend_response_times = {}
-response_times_lock = threading.Lock()
+backend_registry = BackendRegistry(BACKEND_SERVERS)
+backend_weights = BackendWeights(BACKEND_SERVERS, BACKEND_WEIGHTS, DYNAMIC_WEIGHTS, SLOW_START_TIME)
+hash_ring = HashRing(BACKEND_SERVERS, BACKEND_WEIGHTS, load_factor=HASH_LOAD_FACTOR)
+hash_overflows = Counter()
+backend_latency_histograms = {}
+histograms_lock = threading.Lock()
+backend_selections = {}
+accepted_connections = Counter()
+client_bytes_in = Counter()
+client_bytes_out = Counter()
+tls_handshake_latency = LatencyHistogram()
+metrics_server = None
+admin_server = None
+event_loop = None                      # the asyncio engine's loop, for changes made from other threads
+draining_backends = {}                 # server -> timer closing its remaining connections at DRAIN_TIMEOUT
+draining_lock = threading.Lock()
+config_reload_requested = threading.Event()  # set by SIGHUP, served by the config reloader thread
 HEALTH_CHECK_INTERVAL = 5
+HEALTH_CHECK_UNHEALTHY_INTERVAL = 1.0  # backends out of rotation are probed faster so they recover quickly
+HEALTH_CHECK_JITTER = 0.2              # +/- fraction applied to every probe delay
+HEALTH_CHECK_TIMEOUT = 2.0
+HEALTH_CHECK_RISE = 2                  # consecutive passing probes to bring a backend back
+HEALTH_CHECK_FALL = 3                  # consecutive failing probes to take a backend out
+HEALTH_CHECK_CONCURRENCY = 32
+CIRCUIT_FAILURE_THRESHOLD = 1          # consecutive connect failures on live traffic that open a backend's breaker
+CIRCUIT_OPEN_TIME = 1.0                # seconds a breaker stays open before letting one trial connection through
+CIRCUIT_MAX_OPEN_TIME = 30.0           # open time doubles after every failed trial, up to this
+CONNECT_RETRIES = 2                    # extra backends tried when a connect fails or a breaker refuses
+CONNECT_TIMEOUT_BUDGET = 3.0           # seconds all connect attempts for one client may take together
+ADAPTIVE_CONCURRENCY = False           # cap what is in flight to each backend at an adaptive limit, queueing the rest
+CONCURRENCY_LIMIT_INITIAL = None       # limit before any latency is seen; None: LIMIT_INITIAL at L7, L4_CONCURRENCY_LIMIT_INITIAL at L4
+CONCURRENCY_LIMIT_MIN = None           # floor of the limit; None: LIMIT_MIN at L7, the initial limit at L4
+L4_CONCURRENCY_LIMIT_INITIAL = 50      # at L4 a client holds its slot for as long as its connection stays open
+ADMISSION_QUEUE_SIZE = 128             # clients (L4) or requests (L7) waiting for a backend below its limit
+ADMISSION_QUEUE_TIMEOUT = 1.0          # seconds one may wait before it is shed
+ADMISSION_RECHECK_INTERVAL = 0.05      # waiters also re-check on their own, for limits that grew or other workers' slots
 health_check_running = False
+health_check_wakeup = threading.Event()
+health_states = {}
+health_states_lock = threading.Lock()
+circuit_breakers = {}
+circuit_breakers_lock = threading.Lock()
+concurrency_limits = None
+admission_queue = None
+admission_wait_latency = LatencyHistogram()
+admission_lock = threading.Lock()
+
+def setup_logging():
+    """Send this process's log records through a queue to a background writer thread"""
+    start_logging(logger, LOG_LEVEL, LOG_FORMAT)
+
+def log_sampled(event, level, msg, *args):
+    """
+    Log a hot-path event, keeping only one in LOG_SAMPLE_EVERY[event] occurrences.
+    Occurrences are counted per message, so every kind of record in a category is sampled evenly.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    every = LOG_SAMPLE_EVERY.get(event, 1)
+    if every > 1 and next(log_sample_counters[msg]) % every:
+        return
+    logger.log(level, msg, *args, extra={"event": event})
+
+def enable_shared_backend_state():
+    """Move per-backend counters and response times into shared memory before forking workers"""
+    global backend_registry
+    backend_registry = SharedBackendRegistry(BACKEND_SERVERS)
+    logger.info("Per-backend state moved to shared memory for worker processes")
 
 def initialize_connection_counter():
     """Initialize connection counters for all backend servers"""
-    global active_connections_per_backend
-    with connections_lock:
-        for server in BACKEND_SERVERS:
-            active_connections_per_backend[server] = 0
-    print("Initialized connection counters for all backend servers")
+    backend_registry.reset_connections()
+    logger.info("Initialized connection counters for all backend servers")
 
 def initialize_response_times():
     """Initialize response times for all backend servers"""
-    global backend_response_times
-    with response_times_lock:
-        for server in BACKEND_SERVERS:
-            backend_response_times[server] = float('inf') 
-    print("Initialized response times for all backend servers")
+    backend_registry.reset_response_times()
+    logger.info("Initialized response times for all backend servers")
     
 def increment_connection_count(backend):
     """Increment the connection count for a backend server"""
-    with connections_lock:
-        active_connections_per_backend[backend] = active_connections_per_backend.get(backend, 0) + 1
-        print(f"Incremented connection count for {backend} to {active_connections_per_backend[backend]}")
+    count = backend_registry.add_connection(backend)
+    log_sampled("counter", logging.DEBUG, "Incremented connection count for %s to %d", backend, count)
 
 def decrement_connection_count(backend):
     """Decrement the connection count for a backend server"""
-    with connections_lock:
-        if backend in active_connections_per_backend and active_connections_per_backend[backend] > 0:
-            active_connections_per_backend[backend] -= 1
-            print(f"Decremented connection count for {backend} to {active_connections_per_backend[backend]}")
-
-def get_next_server():
+    count = backend_registry.remove_connection(backend)
+    if admission_queue:
+        admission_queue.notify()
+    if count is not None:
+        log_sampled("counter", logging.DEBUG, "Decremented connection count for %s to %d", backend, count)
+        if count == 0 and backend in draining_backends:
+            release_backend(backend)
 
+def get_next_server(affinity_key=None):
+    """Select a backend; affinity_key (client address or normalized command) is used by CONSISTENT_HASH"""
     if LOAD_BALANCING_ALGORITHM == "ROUND_ROBIN":
         return get_next_server_round_robin()
     elif LOAD_BALANCING_ALGORITHM == "LEAST_CONNECTIONS":
         return get_next_server_least_connections()
     elif LOAD_BALANCING_ALGORITHM == "LEAST_RESPONSE":
         return get_next_server_least_response()
+    elif LOAD_BALANCING_ALGORITHM == "POWER_OF_TWO":
+        return get_next_server_power_of_two()
+    elif LOAD_BALANCING_ALGORITHM == "PEAK_EWMA":
+        return get_next_server_peak_ewma()
+    elif LOAD_BALANCING_ALGORITHM == "WEIGHTED_ROUND_ROBIN":
+        return get_next_server_weighted_round_robin()
+    elif LOAD_BALANCING_ALGORITHM == "WEIGHTED_LEAST_CONNECTIONS":
+        return get_next_server_weighted_least_connections()
+    elif LOAD_BALANCING_ALGORITHM == "CONSISTENT_HASH":
+        return get_next_server_consistent_hash(affinity_key)
     else:
       
         return get_next_server_round_robin()
 
 def get_next_server_round_robin():
-    global current_server
-    with server_lock:  # Lock to ensure thread safety
-        server = BACKEND_SERVERS[current_server]
-        current_server = (current_server + 1) % len(BACKEND_SERVERS)
-        print(f"Round robin selected server: {server}")
-        return server
+    server = backend_registry.next_round_robin()
+    log_sampled("selection", logging.DEBUG, "Round robin selected server: %s", server)
+    return server
 
 def get_next_server_least_connections():
-    with connections_lock:
-        connections = {server: active_connections_per_backend.get(server, 0) for server in BACKEND_SERVERS}
-        
-        min_connections = float('inf')
-        selected_server = None
-        
-        for server, count in connections.items():
-            if count < min_connections:
-                min_connections = count
-                selected_server = server
-        
-        print(f"Least connections selected server: {selected_server} (connections: {min_connections})")
-        return selected_server if selected_server else BACKEND_SERVERS[0]
+    selected_server, min_connections = backend_registry.least_connections()
+    log_sampled("selection", logging.DEBUG, "Least connections selected server: %s (connections: %s)",
+                selected_server, min_connections)
+    return selected_server if selected_server else backend_registry.next_round_robin()
 
 def get_next_server_least_response():
+    selected_server, min_response_time = backend_registry.fastest()
+    if selected_server and min_response_time != float('inf'):
+        log_sampled("selection", logging.DEBUG, "Least response time selected server: %s (response time: %.4fs)",
+                    selected_server, min_response_time)
+        return selected_server
+    else:
+        return backend_registry.next_round_robin()
 
-    with response_times_lock:
-        min_response_time = float('inf')
-        selected_server = None
-        
-        for server in BACKEND_SERVERS:
-            if server in backend_response_times:
-                response_time = backend_response_times[server]
-                if response_time < min_response_time:
-                    min_response_time = response_time
-                    selected_server = server
-        
-        if selected_server:
-            print(f"Least response time selected server: {selected_server} (response time: {min_response_time:.4f}s)")
-            return selected_server
-        else:
-            return BACKEND_SERVERS[0]
+def get_next_server_power_of_two():
+    """Pick the less loaded of two random backends, so new connections never herd onto one"""
+    server = backend_registry.power_of_two_choices(backend_registry.connection_count)
+    if logger.isEnabledFor(logging.DEBUG):
+        log_sampled("selection", logging.DEBUG, "Power of two choices selected server: %s (connections: %d)",
+                    server, backend_registry.connection_count(server))
+    return server if server else backend_registry.next_round_robin()
+
+def get_next_server_peak_ewma():
+    """Pick the cheaper of two random backends, costed as peak-EWMA latency times load"""
+    server = backend_registry.power_of_two_choices(backend_registry.peak_ewma_cost)
+    if logger.isEnabledFor(logging.DEBUG):
+        log_sampled("selection", logging.DEBUG, "Peak EWMA selected server: %s (latency: %.4fs, connections: %d)",
+                    server, backend_registry.latency_estimate(server), backend_registry.connection_count(server))
+    return server if server else backend_registry.next_round_robin()
+
+def get_next_server_weighted_round_robin():
+    """Spread connections in proportion to effective weights, interleaved (smooth weighted round robin)"""
+    server = backend_weights.smooth_weighted_round_robin(backend_registry)
+    log_sampled("selection", logging.DEBUG, "Weighted round robin selected server: %s", server)
+    return server if server else backend_registry.next_round_robin()
+
+def get_next_server_weighted_least_connections():
+    """Pick the backend with the fewest active connections per unit of effective weight"""
+    server, cost = backend_weights.weighted_least_connections(backend_registry)
+    log_sampled("selection", logging.DEBUG, "Weighted least connections selected server: %s (connections per weight: %.2f)",
+                server, cost)
+    return server if server else backend_registry.next_round_robin()
+
+def get_next_server_consistent_hash(affinity_key, skip=()):
+    """Send a key to the same backend every time, unless that backend is over its load bound"""
+    if affinity_key is None:
+        return backend_registry.next_round_robin()
+    server, overflowed = hash_ring.lookup(affinity_key, backend_registry, skip)
+    if overflowed:
+        hash_overflows.inc()
+    log_sampled("selection", logging.DEBUG, "Consistent hash selected server: %s for %r%s",
+                server, affinity_key, " (overflow)" if overflowed else "")
+    return server
+
+def get_retry_server(tried, affinity_key=None):
+    """
+    Pick the next candidate after a failed connect, skipping backends already tried.
+    Only runs on the retry path, so a scan over the remaining backends is fine.
+    """
+    if LOAD_BALANCING_ALGORITHM == "CONSISTENT_HASH" and affinity_key is not None:
+        # The key's next backend clockwise, so retried keys still land together
+        server = get_next_server_consistent_hash(affinity_key, tried)
+        if server:
+            logger.info(f"Retrying on server: {server}")
+            return server
+    candidates = [server for server in backend_registry.servers if server not in tried]
+    if not candidates:
+        candidates = [server for server in backend_registry.all_servers
+                      if server not in tried and server not in draining_backends]
+    if not candidates:
+        return None
+    if LOAD_BALANCING_ALGORITHM in ("LEAST_CONNECTIONS", "POWER_OF_TWO"):
+        server = min(candidates, key=backend_registry.connection_count)
+    elif LOAD_BALANCING_ALGORITHM == "LEAST_RESPONSE":
+        server = min(candidates, key=backend_registry.get_response_time)
+    elif LOAD_BALANCING_ALGORITHM == "PEAK_EWMA":
+        server = min(candidates, key=backend_registry.peak_ewma_cost)
+    elif LOAD_BALANCING_ALGORITHM in ("WEIGHTED_ROUND_ROBIN", "WEIGHTED_LEAST_CONNECTIONS"):
+        weights = backend_weights.effective_weights(backend_registry)
+        server = max(candidates, key=lambda s: weights.get(s, 0.0) / (backend_registry.connection_count(s) + 1))
+    else:
+        server = candidates[0]
+        for _ in range(len(backend_registry.all_servers)):
+            next_server = backend_registry.next_round_robin()
+            if next_server not in tried:
+                server = next_server
+                break
+    logger.info(f"Retrying on server: {server}")
+    return server
+
+def record_backend_latency(server, sample):
+    """Feed a latency observed on real proxied traffic into the backend's peak-EWMA estimate"""
+    backend_registry.record_latency_sample(server, sample)
+
+def get_latency_histogram(server):
+    histogram = backend_latency_histograms.get(server)
+    if histogram is None:
+        with histograms_lock:
+            histogram = backend_latency_histograms.setdefault(server, LatencyHistogram())
+    return histogram
+
+def count_selection(server):
+    counter = backend_selections.get(server)
+    if counter is None:
+        with histograms_lock:
+            counter = backend_selections.setdefault(server, Counter())
+    counter.inc()
+
+def record_exchange_latency(server, sample):
+    """
+    Record the latency of one proxied request/response exchange. It feeds the
+    response-time average used by LEAST_RESPONSE, the peak-EWMA estimate and the
+    backend's latency histogram, so selection reacts to real load between health checks.
+    """
+    backend_registry.record_response_time(server, sample, alpha=0.3)
+    backend_registry.record_latency_sample(server, sample)
+    get_latency_histogram(server).record(sample)
+    if concurrency_limits:
+        concurrency_limits.record_sample(server, sample, backend_registry.connection_count(server))
+
+class ExchangeTimer:
+    """
+    Times request/response exchanges on one proxied connection, from the first
+    client->backend byte of a request to the first backend->client byte of its reply.
+    Shared by the two relay directions of the connection, which also report the size
+    of every chunk so client traffic is counted in the same place.
+    """
+
+    __slots__ = ("backend", "request_started")
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.request_started = None
+
+    def client_sent(self, size):
+        client_bytes_in.inc(size)
+        if self.request_started is None:
+            self.request_started = time.perf_counter()
+
+    def backend_replied(self, size):
+        client_bytes_out.inc(size)
+        started = self.request_started
+        if started is not None:
+            self.request_started = None
+            record_exchange_latency(self.backend, time.perf_counter() - started)
+
+def print_latency_summary():
+    """Print per-backend latency percentiles measured from proxied traffic"""
+    for server, histogram in list(backend_latency_histograms.items()):
+        if histogram.count:
+            p50, p99, p999 = histogram.percentiles([0.5, 0.99, 0.999])
+            logger.info(f"Latency for {server}: p50 {p50 * 1000:.2f}ms, p99 {p99 * 1000:.2f}ms, "
+                        f"p99.9 {p999 * 1000:.2f}ms over {histogram.count} exchanges")
 
 def health_check_ping(server):
+    """Probe one backend with a PING; returns True if it answered in time"""
     host, port = server
+    sock = None
     
     try:
 
         start_time = time.time()
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(2.0)
+        sock.settimeout(HEALTH_CHECK_TIMEOUT)
 
         sock.connect((host, port))
 
@@ -135,42 +399,410 @@ def health_check_ping(server):
             end_time = time.time()
             response_time = end_time - start_time
 
-            with response_times_lock:
-                old_time = backend_response_times.get(server, float('inf'))
-                if old_time == float('inf'):
-
-                    backend_response_times[server] = response_time
-                else:
-                    alpha = 0.3  
-                    backend_response_times[server] = alpha * response_time + (0.7) * old_time
+            average = backend_registry.record_response_time(server, response_time, alpha=0.3)
+            backend_registry.record_latency_sample(server, response_time)
                 
-            print(f"Health check: {server} response time {response_time:.4f}s, avg: {backend_response_times[server]:.4f}s")
+            logger.debug(f"Health check: {server} response time {response_time:.4f}s, avg: {average:.4f}s")
+            return True
         else:
-            print(f"Health check: {server} no response")
-            with response_times_lock:
-                backend_response_times[server] = backend_response_times.get(server, float('inf')) * 1.5
+            logger.warning(f"Health check: {server} no response")
+            backend_registry.set_response_time(server, backend_registry.get_response_time(server) * 1.5)
+            return False
     
     except (socket.timeout, ConnectionRefusedError) as e:
-        print(f"Health check: {server} failed - {str(e)}")
-        with response_times_lock:
-            backend_response_times[server] = float('inf')
+        logger.warning(f"Health check: {server} failed - {str(e)}")
+        backend_registry.set_response_time(server, float('inf'))
+        return False
     
     except Exception as e:
-        print(f"Health check error for {server}: {e}")
+        logger.error(f"Health check error for {server}: {e}")
+        return False
     
     finally:
-        try:
+        if sock:
             sock.close()
-        except:
-            pass
+
+class HealthState:
+    """Consecutive probe results for one backend, used for rise/fall decisions"""
+
+    __slots__ = ("successes", "failures", "was_available")
+
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.was_available = True
+
+def mark_backend_down(server, reason):
+    """Take a backend out of rotation for every algorithm"""
+    if backend_registry.set_available(server, False):
+        logger.warning(f"Backend {server} taken out of rotation: {reason}")
+        # Reschedule the checker so recovery probes start right away
+        health_check_wakeup.set()
+
+def mark_backend_up(server):
+    if server in draining_backends:
+        return
+    if backend_registry.set_available(server, True):
+        get_circuit_breaker(server).reset()
+        logger.info(f"Backend {server} is back in rotation")
+
+def apply_health_result(server, healthy):
+    """Apply rise/fall thresholds to one probe result; returns whether the backend is in rotation"""
+    with health_states_lock:
+        state = health_states.setdefault(server, HealthState())
+        available = backend_registry.is_available(server)
+        if state.was_available and not available:
+            # Ejected by live traffic since the last probe: it has to earn its way back
+            state.successes = 0
+
+        if healthy:
+            state.successes += 1
+            state.failures = 0
+            if state.successes >= HEALTH_CHECK_RISE:
+                backend_registry.set_health_failing(server, False)
+                if not available:
+                    mark_backend_up(server)
+                    available = True
+        else:
+            state.failures += 1
+            state.successes = 0
+            if state.failures >= HEALTH_CHECK_FALL:
+                backend_registry.set_health_failing(server, True)
+                if available:
+                    mark_backend_down(server, f"{state.failures} consecutive failed health checks")
+                    available = False
+
+        state.was_available = available
+        return available
+
+def failing_health_checks(server):
+    """
+    Whether the rise/fall health checks currently hold `server` down. The flag lives
+    in the backend registry, so pre-forked workers see the verdict of the parent's checker.
+    """
+    return backend_registry.health_failing(server)
+
+class CircuitBreaker:
+    """
+    Per-backend circuit breaker driven by connect results on live traffic.
+    CLOSED: every connection goes through; CIRCUIT_FAILURE_THRESHOLD failures in a row open it.
+    OPEN: the backend is out of rotation until the open time runs out.
+    HALF_OPEN: back in rotation unless health checks hold it down, but only one trial
+    connection at a time is allowed; success closes the breaker, failure reopens it with
+    twice the open time. Errors on connections that were already open only fail a trial.
+    """
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(self, server):
+        self.server = server
+        self.state = self.CLOSED
+        self.failures = 0
+        self.open_time = CIRCUIT_OPEN_TIME
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def allow_request(self):
+        """Whether a new connection may be sent to this backend right now"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def is_refusing(self):
+        """Whether allow_request() would refuse right now; unlike it, claims no trial"""
+        return self.state == self.OPEN or (self.state == self.HALF_OPEN and self.trial_in_flight)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                self._close()
+                logger.info(f"Circuit for {self.server} closed")
+
+    def record_failure(self, error):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.open_time = min(self.open_time * 2, CIRCUIT_MAX_OPEN_TIME)
+                self._open(f"trial connection failed ({error})")
+            elif self.state == self.CLOSED and self.failures >= CIRCUIT_FAILURE_THRESHOLD:
+                self._open(f"connect failed on live traffic ({error})")
+
+    def record_request_failure(self, error):
+        """
+        A request failed on a connection that was already open. That says nothing about
+        connecting, so a closed breaker does not count it; only a half-open trial fails.
+        """
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.open_time = min(self.open_time * 2, CIRCUIT_MAX_OPEN_TIME)
+                self._open(f"trial request failed ({error})")
+
+    def reset(self):
+        """Close the breaker because the backend proved healthy some other way (health probes)"""
+        with self.lock:
+            self.failures = 0
+            self._close()
+
+    def _close(self):
+        self.state = self.CLOSED
+        self.open_time = CIRCUIT_OPEN_TIME
+        self.trial_in_flight = False
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+
+    def _open(self, reason):
+        self.state = self.OPEN
+        self.trial_in_flight = False
+        if self.timer:
+            self.timer.cancel()
+        self.timer = threading.Timer(self.open_time, self._half_open)
+        self.timer.daemon = True
+        self.timer.start()
+        mark_backend_down(self.server, f"circuit open for {self.open_time:.1f}s: {reason}")
+
+    def _half_open(self):
+        with self.lock:
+            if self.state != self.OPEN:
+                return
+            self.state = self.HALF_OPEN
+            self.timer = None
+        if self.server in draining_backends:
+            return
+        if failing_health_checks(self.server):
+            # The health checker puts it back (and resets the breaker) once probes rise again
+            logger.info(f"Circuit for {self.server} half-open, but it stays out of rotation until health checks pass")
+            return
+        backend_registry.set_available(self.server, True)
+        logger.info(f"Circuit for {self.server} half-open, allowing a trial connection")
+
+def get_circuit_breaker(server):
+    breaker = circuit_breakers.get(server)
+    if breaker is None:
+        with circuit_breakers_lock:
+            breaker = circuit_breakers.setdefault(server, CircuitBreaker(server))
+    return breaker
+
+def record_connect_failure(server, error):
+    """Feed a failed live-traffic connect to the backend's breaker, ejecting it without waiting for a probe"""
+    backend_weights.record_outcome(server, False)
+    if concurrency_limits:
+        concurrency_limits.record_drop(server)
+    get_circuit_breaker(server).record_failure(error)
+
+def record_request_failure(server, error):
+    """Feed a request that failed on an open backend connection, without counting it as a connect failure"""
+    backend_weights.record_outcome(server, False)
+    if concurrency_limits:
+        concurrency_limits.record_drop(server)
+    get_circuit_breaker(server).record_request_failure(error)
+
+def record_connect_success(server):
+    backend_weights.record_outcome(server, True)
+    get_circuit_breaker(server).record_success()
+
+class BackendsOverloaded(ConnectionError):
+    """Every backend in rotation is at its concurrency limit and the admission queue could not help"""
+
+class AdmissionQueue:
+    """
+    Bounded queue in front of backend selection for ADAPTIVE_CONCURRENCY. A client
+    (L4) or request (L7) that finds every backend at its limit waits here for a slot,
+    woken oldest first as connections or requests finish. When the queue is full it is
+    rejected at once, and after `timeout` seconds of waiting it is shed, so under
+    overload latency is bounded by the limits plus the queue wait, instead of every
+    client piling onto the backends. Threads and event-loop tasks can wait side by side.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._waiters = collections.deque()
+        self.rejected = Counter()
+        self.shed = Counter()
+
+    def __len__(self):
+        return len(self._waiters)
+
+    def is_full(self):
+        return len(self._waiters) >= self.size
+
+    def _enter(self, waiter):
+        with self._lock:
+            if len(self._waiters) >= self.size:
+                self.rejected.inc()
+                return False
+            self._waiters.append(waiter)
+            return True
+
+    def _leave(self, waiter):
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def notify(self):
+        """A slot may have opened: wake the oldest waiter to check"""
+        with self._lock:
+            waiter = self._waiters[0] if self._waiters else None
+        if waiter:
+            waiter.set()
+
+    def wait(self, has_capacity, requeue=False):
+        """
+        Block until has_capacity() is true; False if the client was rejected or shed.
+        With `requeue` (a client that lost the race for the slot it was woken for) it
+        always waits for the next wake-up or recheck before looking again.
+        """
+        if not requeue and has_capacity():
+            return True
+        waiter = threading.Event()
+        if not self._enter(waiter):
+            return False
+        start = time.monotonic()
+        try:
+            while True:
+                remaining = start + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.shed.inc()
+                    return False
+                waiter.wait(min(remaining, ADMISSION_RECHECK_INTERVAL))
+                waiter.clear()
+                if has_capacity():
+                    admission_wait_latency.record(time.monotonic() - start)
+                    return True
+        finally:
+            self._leave(waiter)
+
+    async def wait_async(self, has_capacity, requeue=False):
+        """Event loop version of wait()"""
+        if not requeue and has_capacity():
+            return True
+        waiter = AsyncWaiter(asyncio.get_running_loop())
+        if not self._enter(waiter):
+            return False
+        start = time.monotonic()
+        try:
+            while True:
+                remaining = start + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.shed.inc()
+                    return False
+                waiter.future = waiter.loop.create_future()
+                try:
+                    await asyncio.wait_for(waiter.future, min(remaining, ADMISSION_RECHECK_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+                if has_capacity():
+                    admission_wait_latency.record(time.monotonic() - start)
+                    return True
+        finally:
+            self._leave(waiter)
+
+class AsyncWaiter:
+    """Admission queue entry for a task; set() may be called from any thread"""
+
+    __slots__ = ("loop", "future")
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = None
+
+    def set(self):
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if self.future and not self.future.done():
+            self.future.set_result(None)
+
+def backend_has_capacity(server):
+    return concurrency_limits is None or concurrency_limits.has_capacity(server, backend_registry.connection_count(server))
+
+def reserve_backend_slot(server):
+    """Count a new connection (or L7 request) to server, unless that would take it over its limit"""
+    if concurrency_limits is None:
+        increment_connection_count(server)
+        return True
+    # Check and count together, so clients racing for the last slot cannot both take it
+    with admission_lock:
+        if not backend_has_capacity(server):
+            return False
+        increment_connection_count(server)
+    return True
+
+def any_backend_has_capacity(exclude=()):
+    """Whether a backend outside `exclude` has a free slot and a breaker that would let a connection through"""
+    servers = backend_registry.servers or backend_registry.all_servers
+    return any(backend_has_capacity(server) and not get_circuit_breaker(server).is_refusing()
+               for server in servers if server not in exclude)
+
+def should_reject_early():
+    """At accept: turn a client away before its TLS handshake when it could only be rejected later"""
+    if admission_queue and admission_queue.is_full() and not any_backend_has_capacity():
+        admission_queue.rejected.inc()
+        return True
+    return False
+
+def next_probe_delay(available):
+    """Seconds until the next probe, jittered so backends are not all probed in lockstep"""
+    base = HEALTH_CHECK_INTERVAL if available else HEALTH_CHECK_UNHEALTHY_INTERVAL
+    return base * random.uniform(1 - HEALTH_CHECK_JITTER, 1 + HEALTH_CHECK_JITTER)
 
 def health_check_thread():
-    global health_check_running
-    
+    """
+    Schedule probes for every backend independently and run them concurrently on a
+    small pool, so one slow or dead backend never delays checks of the others.
+    """
+    next_probe = {}
+    in_flight = set()
+    schedule_lock = threading.Lock()
+    pool = ThreadPoolExecutor(max_workers=HEALTH_CHECK_CONCURRENCY, thread_name_prefix="health-check")
+
+    def probe(server):
+        available = backend_registry.is_available(server)
+        try:
+            available = apply_health_result(server, health_check_ping(server))
+        finally:
+            with schedule_lock:
+                next_probe[server] = time.time() + next_probe_delay(available)
+                in_flight.discard(server)
+            health_check_wakeup.set()
+
     while health_check_running:
-        for server in BACKEND_SERVERS:
-            health_check_ping(server)
-        time.sleep(HEALTH_CHECK_INTERVAL)
+        now = time.time()
+        with schedule_lock:
+            for server in backend_registry.all_servers:
+                if server in draining_backends:
+                    # Leaving for good: its state is only kept until the last connection closes
+                    next_probe.pop(server, None)
+                    continue
+                if server in in_flight:
+                    continue
+                due = next_probe.get(server, now)
+                if not backend_registry.is_available(server):
+                    # Possibly ejected by live traffic in the meantime: pull its probe forward
+                    due = min(due, now + next_probe_delay(False))
+                    next_probe[server] = due
+                if due <= now:
+                    in_flight.add(server)
+                    pool.submit(probe, server)
+            pending = [next_probe[server] for server in backend_registry.all_servers
+                       if server in next_probe and server not in in_flight]
+
+        wait = min(pending, default=now + HEALTH_CHECK_UNHEALTHY_INTERVAL) - now
+        health_check_wakeup.wait(min(max(wait, 0.01), HEALTH_CHECK_UNHEALTHY_INTERVAL))
+        health_check_wakeup.clear()
+
+    pool.shutdown(wait=False)
 
 def start_health_check():
     """Start the health check thread"""
@@ -186,52 +818,643 @@ def start_health_check():
         health_thread.daemon = True
         health_thread.start()
         
-        print(f"Started health check thread (interval: {HEALTH_CHECK_INTERVAL}s)")
+        logger.info(f"Started health check thread (interval: {HEALTH_CHECK_INTERVAL}s, "
+                    f"rise: {HEALTH_CHECK_RISE}, fall: {HEALTH_CHECK_FALL})")
 
 def stop_health_check():
     """Stop the health check thread"""
     global health_check_running
     health_check_running = False
-    print("Stopped health check thread")
+    health_check_wakeup.set()
+    logger.info("Stopped health check thread")
+
+def is_socket_alive(sock):
+    """Check without blocking that an idle upstream socket was not closed or reset by the backend"""
+    try:
+        sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    # EOF means the backend closed it; unsolicited bytes mean it is out of sync
+    return False
+
+class BackendConnectionPool:
+    """
+    Per-backend pool of pre-connected upstream sockets. A maintenance thread keeps
+    `size` warm connections to every backend and replaces idle or broken ones, so an
+    accepted client can be paired with a backend without paying the connect latency.
+    """
+
+    def __init__(self, size, idle_timeout=BACKEND_POOL_IDLE_TIMEOUT, refill_interval=BACKEND_POOL_REFILL_INTERVAL):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.refill_interval = refill_interval
+        self._idle = {server: collections.deque() for server in BACKEND_SERVERS}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
 
-def forward_data(connection_id, source_socket, dest_socket, direction):
+    def acquire(self, server):
+        """Return a warm, live socket to server, or None if the pool has none ready"""
+        while True:
+            with self._lock:
+                idle = self._idle.get(server)
+                if not idle:
+                    self._wakeup.set()
+                    return None
+                sock, idle_since = idle.pop()
+
+            self._wakeup.set()
+            if time.time() - idle_since <= self.idle_timeout and is_socket_alive(sock):
+                return sock
+            sock.close()
+
+    def release(self, server, sock):
+        """Return a still-usable socket to the pool, closing it if the pool is already full"""
+        with self._lock:
+            idle = self._idle.setdefault(server, collections.deque())
+            if self._running and len(idle) < self.size:
+                idle.append((sock, time.time()))
+                return
+        sock.close()
+
+    def discard(self, server):
+        """Close the idle sockets to a backend that was removed"""
+        with self._lock:
+            idle = self._idle.pop(server, ())
+        for sock, _ in idle:
+            sock.close()
+
+    def idle_count(self, server):
+        with self._lock:
+            return len(self._idle.get(server, ()))
+
+    def _evict(self, server):
+        """Drop idle sockets that expired or were closed by the backend"""
+        now = time.time()
+        with self._lock:
+            idle = self._idle.setdefault(server, collections.deque())
+            entries = list(idle)
+            idle.clear()
+        keep = []
+        for sock, idle_since in entries:
+            if now - idle_since <= self.idle_timeout and is_socket_alive(sock):
+                keep.append((sock, idle_since))
+            else:
+                sock.close()
+        with self._lock:
+            idle.extendleft(reversed(keep))
+            return len(idle)
+
+    def _refill(self):
+        for server in backend_registry.servers:
+            missing = self.size - self._evict(server)
+            for _ in range(missing):
+                try:
+                    sock = socket.create_connection(server, timeout=BACKEND_CONNECT_TIMEOUT)
+                    sock.settimeout(None)
+                except OSError as e:
+                    logger.warning(f"Connection pool: could not connect to {server}: {e}")
+                    break
+                self.release(server, sock)
+
+    def _maintenance_loop(self):
+        while self._running:
+            self._refill()
+            self._wakeup.wait(self.refill_interval)
+            self._wakeup.clear()
 
+    def start(self):
+        self._running = True
+        thread = threading.Thread(target=self._maintenance_loop, daemon=True)
+        thread.start()
+        logger.info(f"Started backend connection pool ({self.size} warm connections per backend)")
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        with self._lock:
+            for idle in self._idle.values():
+                while idle:
+                    idle.pop()[0].close()
+
+def start_backend_pool():
+    """Create the upstream connection pool for this process if it is enabled"""
+    global backend_pool
+    if BACKEND_POOL_SIZE > 0 and backend_pool is None:
+        backend_pool = BackendConnectionPool(BACKEND_POOL_SIZE)
+        backend_pool.start()
+
+def run_on_event_loop(function, *args):
+    """Run function on the asyncio engine's loop if it is running (streams are not thread-safe), else here"""
+    if event_loop and event_loop.is_running():
+        event_loop.call_soon_threadsafe(function, *args)
+    else:
+        function(*args)
+
+def close_backend_connections(server):
+    """Close every client connection proxied to server, and its L7 channels"""
+    for connection_id, (_, _, backend_server) in list(connections.items()):
+        if backend_server == server:
+            close_connection(connection_id)
+    for channel in backend_channels.pop(server, []):
+        channel.close(ConnectionError(f"backend {server} was removed"))
+
+def release_backend(server):
+    """Forget a backend for good, closing whatever connections to it are still open"""
+    with draining_lock:
+        timer = draining_backends.pop(server, None)
+        if server not in backend_registry.all_servers:
+            return
+        backend_registry.remove_backend(server)
+    if timer:
+        timer.cancel()
+    hash_ring.remove(server)
+    backend_weights.remove(server)
+    if concurrency_limits:
+        concurrency_limits.remove(server)
+    with health_states_lock:
+        health_states.pop(server, None)
+    with circuit_breakers_lock:
+        breaker = circuit_breakers.pop(server, None)
+    if breaker:
+        breaker.reset()
+    if backend_pool:
+        backend_pool.discard(server)
+    run_on_event_loop(close_backend_connections, server)
+    logger.info(f"Backend {server} released")
+
+def drain_timed_out(server):
+    logger.warning(f"Backend {server} still has {backend_registry.connection_count(server)} connections "
+                   f"after draining for {DRAIN_TIMEOUT:g}s; closing them")
+    release_backend(server)
+
+def drain_backend(server):
+    """
+    Stop sending new connections to a backend and release it once its last connection
+    closes. Connections still open after DRAIN_TIMEOUT seconds are closed.
+    """
+    with draining_lock:
+        if server not in backend_registry.all_servers:
+            raise ValueError(f"unknown backend {server[0]}:{server[1]}")
+        if server in draining_backends:
+            return
+        timer = None
+        if DRAIN_TIMEOUT > 0:
+            timer = threading.Timer(DRAIN_TIMEOUT, drain_timed_out, args=(server,))
+            timer.daemon = True
+        draining_backends[server] = timer
+    backend_registry.set_available(server, False)
+    hash_ring.remove(server)
+    count = backend_registry.connection_count(server)
+    logger.info(f"Draining backend {server} ({count} connections in flight)")
+    if timer:
+        timer.start()
+    if count == 0:
+        release_backend(server)
+
+def add_backend(server, weight=1):
+    """Add a backend to rotation, or put a draining one back; for a backend already in use, set its weight"""
+    with draining_lock:
+        was_draining = server in draining_backends
+        timer = draining_backends.pop(server, None)
+        known = server in backend_registry.all_servers
+        if not known:
+            backend_registry.add_backend(server)
+    if timer:
+        timer.cancel()
+    if was_draining:
+        backend_registry.set_available(server, True)
+        logger.info(f"Backend {server} is no longer draining (weight {weight:g})")
+    elif not known:
+        logger.info(f"Backend {server} added with weight {weight:g}")
+    elif backend_weights.weight(server) != weight:
+        logger.info(f"Weight of backend {server} set to {weight:g}")
+    else:
+        return
+    backend_weights.set_weight(server, weight)
+    hash_ring.add(server, weight)
+    health_check_wakeup.set()
+
+def set_algorithm(name):
+    """Switch the balancing algorithm; connections already proxied are not affected"""
+    global LOAD_BALANCING_ALGORITHM
+    name = name.upper()
+    if name not in LOAD_BALANCING_ALGORITHMS:
+        raise ValueError(f"unknown algorithm {name.lower()!r}; choose from "
+                         f"{', '.join(algorithm.lower() for algorithm in LOAD_BALANCING_ALGORITHMS)}")
+    if name != LOAD_BALANCING_ALGORITHM:
+        logger.info(f"Switching from {LOAD_BALANCING_ALGORITHM} to {name}")
+        LOAD_BALANCING_ALGORITHM = name
+
+def require_dynamic_backends(action):
+    """Shared worker state has a fixed set of backends: turn membership changes away before they start"""
+    if isinstance(backend_registry, SharedBackendRegistry):
+        raise ValueError(f"cannot {action} with --workers; the backend set is fixed at startup")
+
+def apply_config(config):
+    """
+    Bring the running load balancer in line with a config file read by read_config():
+    new backends are added, missing ones drained, and weights, the algorithm and the
+    health check interval updated. Open connections and per-backend counters are kept.
+    """
+    global HEALTH_CHECK_INTERVAL
+    backends = config["backends"]
+    if backends is not None and set(backends) != set(backend_registry.all_servers):
+        require_dynamic_backends("change backends")
+    if config["algorithm"]:
+        set_algorithm(config["algorithm"])
+    if config["health_check_interval"] and config["health_check_interval"] != HEALTH_CHECK_INTERVAL:
+        HEALTH_CHECK_INTERVAL = config["health_check_interval"]
+        logger.info(f"Health check interval set to {HEALTH_CHECK_INTERVAL:g}s")
+        health_check_wakeup.set()
+    if backends is not None:
+        for server, weight in backends.items():
+            add_backend(server, weight)
+        for server in backend_registry.all_servers:
+            if server not in backends and server not in draining_backends:
+                drain_backend(server)
+
+def reload_config():
+    if not CONFIG_FILE:
+        raise ValueError("no config file to reload (start with --config)")
+    config = read_config(CONFIG_FILE)
+    if config["algorithm"] and config["algorithm"] not in LOAD_BALANCING_ALGORITHMS:
+        raise ValueError(f"{CONFIG_FILE}: unknown algorithm {config['algorithm'].lower()!r}")
+    apply_config(config)
+    logger.info(f"Reloaded {CONFIG_FILE}")
+
+def reload_config_on_signal(signum, frame):
+    # Only flag the reload: the handler interrupts the main thread, which may hold the registry lock add_backend needs
+    config_reload_requested.set()
+
+def run_config_reloader():
+    while True:
+        config_reload_requested.wait()
+        config_reload_requested.clear()
+        try:
+            reload_config()
+        except ValueError as e:
+            logger.error(f"Config not reloaded: {e}")
+
+def start_config_reloader():
+    """Reload CONFIG_FILE on SIGHUP, from a thread of its own"""
+    if not hasattr(signal, "SIGHUP"):
+        return
+    threading.Thread(target=run_config_reloader, daemon=True).start()
+    signal.signal(signal.SIGHUP, reload_config_on_signal)
+
+def describe_backends():
+    """One line per backend: address, state, connections in flight and weight"""
+    effective = backend_weights.effective_weights(backend_registry)
+    lines = []
+    for server in backend_registry.all_servers:
+        if server in draining_backends:
+            state = "draining"
+        elif backend_registry.is_available(server):
+            state = "up"
+        else:
+            state = "down"
+        line = (f"{server[0]}:{server[1]} {state} connections={backend_registry.connection_count(server)} "
+                f"weight={backend_weights.weight(server):g} effective_weight={effective.get(server, 0.0):.2f}")
+        if concurrency_limits:
+            line += f" limit={concurrency_limits.limit(server)}"
+        lines.append(line)
+    return "\n".join(lines) or "(no backends)"
+
+ADMIN_HELP = """backends                   list backends with their state, connections in flight and weight
+add HOST:PORT [WEIGHT]     add a backend, or put a draining one back into rotation
+drain HOST:PORT            stop new connections and release the backend when the last one closes
+remove HOST:PORT           release a backend now, closing its connections
+weight HOST:PORT WEIGHT    change a backend's weight
+algorithm [NAME]           show or switch the load balancing algorithm
+reload                     re-read the config file"""
+
+def parse_weight(value):
     try:
+        weight = float(value)
+    except ValueError:
+        weight = 0
+    if weight <= 0:
+        raise ValueError(f"weight must be a number > 0, got {value!r}")
+    return weight
+
+def handle_admin_command(words):
+    """Run one admin channel command; raises ValueError for the client to see"""
+    command, args = words[0].lower(), words[1:]
+    if command == "help":
+        return ADMIN_HELP
+    if command == "backends":
+        return describe_backends()
+    if command == "algorithm":
+        if args:
+            set_algorithm(args[0])
+        return LOAD_BALANCING_ALGORITHM.lower()
+    if command == "reload":
+        reload_config()
+        return describe_backends()
+    if command in ("add", "drain", "remove", "weight") and args:
+        server = parse_backend_address(args[0])
+        if command in ("drain", "remove") or (command == "add" and server not in backend_registry.all_servers):
+            require_dynamic_backends(f"{command} backends")
+        if command == "add":
+            add_backend(server, parse_weight(args[1]) if len(args) > 1 else backend_weights.weight(server))
+        elif server not in backend_registry.all_servers:
+            raise ValueError(f"unknown backend {args[0]}")
+        elif command == "drain":
+            drain_backend(server)
+        elif command == "remove":
+            logger.info(f"Removing backend {server} with {backend_registry.connection_count(server)} connections")
+            release_backend(server)
+        elif len(args) > 1:
+            add_backend(server, parse_weight(args[1]))
+        else:
+            raise ValueError("usage: weight HOST:PORT WEIGHT")
+        return describe_backends()
+    raise ValueError(f"unknown command {' '.join(words)!r}; try 'help'")
+
+def start_admin_server():
+    """Accept reconfiguration commands on the admin channel, if enabled"""
+    global admin_server
+    if not ADMIN_PORT or admin_server:
+        return
+    try:
+        admin_server = AdminServer(ADMIN_HOST, ADMIN_PORT, handle_admin_command)
+        admin_server.start()
+    except OSError as e:
+        admin_server = None
+        logger.warning(f"Admin channel disabled: cannot listen on {ADMIN_HOST}:{ADMIN_PORT} ({e})")
+        return
+    logger.info(f"Admin channel on {ADMIN_HOST}:{ADMIN_PORT} (python admin.py help)")
+
+def backend_label(server):
+    host, port = server
+    return {"backend": f"{host}:{port}"}
+
+def render_metrics():
+    """Render this process's counters and latency histograms in Prometheus text format"""
+    page = Exposition()
+    page.add("lb_accepted_connections_total", "counter", "Client connections accepted",
+             [({}, accepted_connections.value)])
+    page.add("lb_active_connections", "gauge", "Client connections currently proxied",
+             [({}, len(connections))])
+    page.add("lb_client_bytes_total", "counter", "Bytes relayed from (in) and to (out) clients",
+             [({"direction": "in"}, client_bytes_in.value), ({"direction": "out"}, client_bytes_out.value)])
+    with tls_stats_lock:
+        handshakes = dict(tls_handshake_counts)
+    page.add("lb_tls_handshakes_total", "counter", "Completed TLS handshakes by kind",
+             [({"kind": kind}, count) for kind, count in handshakes.items()])
+    page.add_summary("lb_tls_handshake_seconds", "Time to complete the server-side TLS handshake",
+                     [({}, tls_handshake_latency)])
+    page.add("lb_backend_selections_total", "counter",
+             "Connections the balancing algorithm sent to each backend, including failed connects",
+             [(backend_label(server), counter.value) for server, counter in list(backend_selections.items())])
+    page.add("lb_backend_up", "gauge", "Whether the backend is in rotation",
+             [(backend_label(server), int(backend_registry.is_available(server)))
+              for server in backend_registry.all_servers])
+    page.add("lb_backend_draining", "gauge", "Whether the backend is draining before it is removed",
+             [(backend_label(server), int(server in draining_backends)) for server in backend_registry.all_servers])
+    page.add("lb_hash_overflows_total", "counter",
+             "Consistent hash selections passed on from an overloaded backend to its ring neighbour",
+             [({}, hash_overflows.value)])
+    weights = backend_weights.effective_weights(backend_registry)
+    page.add("lb_backend_weight", "gauge",
+             "Effective weight of each backend in rotation after dynamic adjustment and slow start",
+             [(backend_label(server), round(weight, 4)) for server, weight in weights.items()])
+    if concurrency_limits:
+        page.add("lb_backend_concurrency_limit", "gauge",
+                 "Adaptive limit on connections (L4) or requests (L7) in flight to the backend",
+                 [(backend_label(server), concurrency_limits.limit(server)) for server in backend_registry.all_servers])
+        page.add("lb_backend_in_flight", "gauge", "Connections (L4) or requests (L7) in flight to the backend",
+                 [(backend_label(server), backend_registry.connection_count(server))
+                  for server in backend_registry.all_servers])
+        page.add("lb_admission_queue_length", "gauge", "Clients or requests waiting for a backend below its limit",
+                 [({}, len(admission_queue))])
+        page.add("lb_admission_rejected_total", "counter",
+                 "Clients or requests turned away because the admission queue was full",
+                 [({}, admission_queue.rejected.value)])
+        page.add("lb_admission_shed_total", "counter",
+                 "Clients or requests dropped after waiting the whole admission timeout",
+                 [({}, admission_queue.shed.value)])
+        page.add_summary("lb_admission_wait_seconds", "Time admitted clients or requests spent in the admission queue",
+                         [({}, admission_wait_latency)])
+    page.add_summary("lb_backend_exchange_seconds",
+                     "Request/response latency measured from proxied traffic",
+                     [(backend_label(server), histogram) for server, histogram in list(backend_latency_histograms.items())])
+    if response_cache:
+        stats = response_cache.stats
+        page.add("lb_response_cache_lookups_total", "counter", "L7 response cache lookups by result",
+                 [({"result": result}, stats[key]) for result, key in
+                  (("hit", "hits"), ("stale", "stale_hits"), ("miss", "misses"))])
+        page.add("lb_response_cache_evictions_total", "counter", "Responses evicted to make room",
+                 [({}, stats["evictions"])])
+        page.add("lb_response_cache_rejections_total", "counter",
+                 "Responses not admitted because they were larger or colder than what they would evict",
+                 [({}, stats["rejected"])])
+        page.add("lb_response_cache_bytes", "gauge", "Approximate memory held by cached responses",
+                 [({}, response_cache.bytes)])
+        page.add("lb_response_cache_entries", "gauge", "Cached responses", [({}, len(response_cache.entries))])
+    return page.render()
+
+def start_metrics_server():
+    """Serve render_metrics() over HTTP for Prometheus to scrape, if enabled"""
+    global metrics_server
+    if not METRICS_PORT or metrics_server:
+        return
+    try:
+        metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT, render_metrics)
+        metrics_server.start()
+    except OSError as e:
+        metrics_server = None
+        logger.warning(f"Metrics endpoint disabled: cannot listen on {METRICS_HOST}:{METRICS_PORT} ({e})")
+        return
+    logger.info(f"Metrics available at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+def connect_to_backend(backend_server, timeout=None):
+    """Get a connected upstream socket, from the warm pool when possible"""
+    if backend_pool:
+        backend_socket = backend_pool.acquire(backend_server)
+        if backend_socket:
+            record_connect_success(backend_server)
+            return backend_socket
+    backend_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        start_time = time.time()
+        backend_socket.settimeout(timeout)
+        backend_socket.connect(backend_server)
+        backend_socket.settimeout(None)
+        record_backend_latency(backend_server, time.time() - start_time)
+    except OSError as e:
+        backend_socket.close()
+        record_connect_failure(backend_server, e)
+        raise
+    record_connect_success(backend_server)
+    return backend_socket
+
+def open_backend_connection(connection_id, affinity_key=None):
+    """
+    Select a backend and connect to it, moving on to the
+    next candidate from the active algorithm when the connect fails or the backend's
+    circuit breaker refuses. At most CONNECT_RETRIES extra attempts are made, all within
+    CONNECT_TIMEOUT_BUDGET seconds; connection counts follow the backend finally used.
+    Returns (backend_server, backend_socket) or raises the last connect error.
+    With ADAPTIVE_CONCURRENCY, backends at their limit are passed over, and when all of
+    them are, the client waits in the admission queue or is turned away.
+    """
+    if admission_queue and not admission_queue.wait(any_backend_has_capacity):
+        raise BackendsOverloaded("all backends are at their concurrency limit")
+    tried = set()
+    full = set()
+    attempts = 0
+    last_error = None
+    deadline = time.time() + CONNECT_TIMEOUT_BUDGET
+    while attempts <= CONNECT_RETRIES:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        backend_server = get_retry_server(tried, affinity_key) if tried else get_next_server(affinity_key)
+        if backend_server is None:
+            # Other clients took the free slots first: wait for one of the full backends (or an
+            # untried one) to have room. The wait counts as an attempt, so the loop is bounded.
+            if not full or attempts >= CONNECT_RETRIES or not admission_queue.wait(
+                    lambda: any_backend_has_capacity(tried - full), requeue=True):
+                break
+            attempts += 1
+            tried -= full
+            full.clear()
+            continue
+        tried.add(backend_server)
+        if not reserve_backend_slot(backend_server):
+            full.add(backend_server)
+            last_error = BackendsOverloaded(f"{backend_server} is at its concurrency limit")
+            continue
+        if not get_circuit_breaker(backend_server).allow_request():
+            decrement_connection_count(backend_server)
+            last_error = ConnectionRefusedError(f"circuit open for {backend_server}")
+            continue
+
+        attempts += 1
+        count_selection(backend_server)
+        try:
+            return backend_server, connect_to_backend(backend_server, min(BACKEND_CONNECT_TIMEOUT, remaining))
+        except OSError as e:
+            last_error = e
+            decrement_connection_count(backend_server)
+            logger.warning(f"Connection {connection_id}: connect to {backend_server} failed ({e})")
+    raise last_error or ConnectionError("no backend available")
+
+def relay_copy(connection_id, source_socket, dest_socket, direction, on_data):
+    """Relay by allocating a new bytes object for every 1KB chunk (the original path)"""
+    while True:
+        data = source_socket.recv(1024)
+        if not data:
+            log_sampled("connection", logging.DEBUG, "%s: Connection closed", direction)
+            return
+        on_data(len(data))
 
         if connection_id not in connections:
-            print(f"{direction}: Connection {connection_id} no longer exists")
+            log_sampled("connection", logging.DEBUG, "%s: Connection %s was closed while receiving", direction, connection_id)
             return
-            
-        while True:
+
+        dest_socket.sendall(data)
+        if LOG_CHUNKS:
+            log_sampled("chunk", logging.DEBUG, "%s: %d bytes", direction, len(data))
+
+def relay_buffered(connection_id, source_socket, dest_socket, direction, on_data):
+    """Relay through one reusable buffer with recv_into, without per-chunk allocations"""
+    buffer = bytearray(RELAY_BUFFER_SIZE)
+    view = memoryview(buffer)
+    while True:
+        received = source_socket.recv_into(buffer)
+        if not received:
+            log_sampled("connection", logging.DEBUG, "%s: Connection closed", direction)
+            return
+        on_data(received)
+
+        if connection_id not in connections:
+            log_sampled("connection", logging.DEBUG, "%s: Connection %s was closed while receiving", direction, connection_id)
+            return
+
+        # sendall() loops over partial sends for both plain and SSL sockets
+        dest_socket.sendall(view[:received])
+        if LOG_CHUNKS:
+            log_sampled("chunk", logging.DEBUG, "%s: %d bytes", direction, received)
+
+def relay_splice(connection_id, source_socket, dest_socket, direction, on_data):
+    """Relay inside the kernel by splicing socket -> pipe -> socket, never copying into Python"""
+    pipe_read, pipe_write = os.pipe()
+    try:
+        if hasattr(fcntl, "F_SETPIPE_SZ"):
             try:
-                source_socket.settimeout(0.5)
-                
-                data = source_socket.recv(1024)
-                if not data:  
-                    print(f"{direction}: Connection closed")
-                    break
-                
-                if connection_id not in connections:
-                    print(f"{direction}: Connection {connection_id} was closed while receiving")
-                    break
-                
-                dest_socket.send(data)
-                print(f"{direction}: {len(data)} bytes")
-                
-            except socket.timeout:
-                if connection_id not in connections:
-                    print(f"{direction}: Connection {connection_id} no longer exists (timeout check)")
-                    break
-                continue
-                
-            except Exception as e:
-                print(f"Error in {direction}: {e}")
-                break
-                
+                fcntl.fcntl(pipe_write, fcntl.F_SETPIPE_SZ, RELAY_BUFFER_SIZE)
+            except OSError:
+                pass
+
+        source_fd = source_socket.fileno()
+        dest_fd = dest_socket.fileno()
+        while True:
+            received = os.splice(source_fd, pipe_write, RELAY_BUFFER_SIZE, flags=os.SPLICE_F_MOVE)
+            if not received:
+                log_sampled("connection", logging.DEBUG, "%s: Connection closed", direction)
+                return
+            on_data(received)
+
+            if connection_id not in connections:
+                log_sampled("connection", logging.DEBUG, "%s: Connection %s was closed while receiving", direction, connection_id)
+                return
+
+            # splice() out of the pipe may also be partial; drain everything we pulled in
+            remaining = received
+            while remaining:
+                remaining -= os.splice(pipe_read, dest_fd, remaining, flags=os.SPLICE_F_MOVE)
+            if LOG_CHUNKS:
+                log_sampled("chunk", logging.DEBUG, "%s: %d bytes", direction, received)
+    finally:
+        os.close(pipe_read)
+        os.close(pipe_write)
+
+def select_relay(source_socket, dest_socket):
+    """Pick the relay implementation for one direction of a connection"""
+    if RELAY_MODE == "COPY":
+        return relay_copy
+    if RELAY_MODE == "SPLICE" and hasattr(os, "splice"):
+        # TLS legs have to be decrypted in user space, so only plaintext pairs can splice
+        if not isinstance(source_socket, ssl.SSLSocket) and not isinstance(dest_socket, ssl.SSLSocket):
+            return relay_splice
+    return relay_buffered
+
+def forward_data(connection_id, source_socket, dest_socket, direction, on_data=None):
+    """
+    Relay data from source_socket to dest_socket until either side closes,
+    calling on_data(size) (if given) each time a chunk arrives from source_socket.
+    The sockets stay fully blocking: teardown of the peer relay is driven by
+    close_connection() shutting both sockets down, which wakes a blocked recv()
+    immediately, so idle connections cost no wakeups at all.
+    """
+    try:
+
+        if connection_id not in connections:
+            log_sampled("connection", logging.DEBUG, "%s: Connection %s no longer exists", direction, connection_id)
+            return
+
+        relay = select_relay(source_socket, dest_socket)
+        relay(connection_id, source_socket, dest_socket, direction, on_data or (lambda size: None))
+
     except Exception as e:
-        print(f"Outer error in {direction}: {e}")
+        if connection_id in connections:
+            logger.warning(f"Error in {direction}: {e}")
     finally:
         close_connection(connection_id)
+
+def shutdown_socket(sock):
+    """Shut down both directions of a socket so a relay blocked in recv() on it wakes up"""
+    try:
+        # Call the plain socket implementation so an SSLSocket being read by the
+        # peer relay thread does not have its SSL object torn down underneath it.
+        socket.socket.shutdown(sock, socket.SHUT_RDWR)
+    except (OSError, ValueError):
+        pass
             
 def close_connection(connection_id):
     """Safely close a connection and clean up resources"""
@@ -243,25 +1466,28 @@ def close_connection(connection_id):
         
     client_socket, backend_socket, backend_server = conn_info
     
-    print(f"Closing connection {connection_id}")
+    log_sampled("connection", logging.DEBUG, "Closing connection %s", connection_id)
 
-    if LOAD_BALANCING_ALGORITHM == "LEAST_CONNECTIONS" and backend_server:
+    if backend_server:
         decrement_connection_count(backend_server)
     
+    for sock in (client_socket, backend_socket):
+        if isinstance(sock, socket.socket):
+            shutdown_socket(sock)
  
     try:
         if client_socket:
             client_socket.close()
     except Exception as e:
-        print(f"Error closing client socket: {e}")
+        logger.warning(f"Error closing client socket: {e}")
         
     try:
         if backend_socket:
             backend_socket.close()
     except Exception as e:
-        print(f"Error closing backend socket: {e}")
+        logger.warning(f"Error closing backend socket: {e}")
         
-    print(f"Connection {connection_id} closed")
+    log_sampled("connection", logging.INFO, "Connection %s closed", connection_id)
 
 def handle_client(client_socket, client_address):
     """
@@ -277,39 +1503,41 @@ def handle_client(client_socket, client_address):
     backend_server = None
     
     try:
-        backend_server = get_next_server()
+        backend_server, backend_socket = open_backend_connection(connection_id, client_address[0])
         backend_host, backend_port = backend_server
-        print(f"Connection {connection_id}: Forwarding from {client_address} to {backend_host}:{backend_port}")
-
-        if LOAD_BALANCING_ALGORITHM == "LEAST_CONNECTIONS":
-            increment_connection_count(backend_server)
-
-        backend_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        backend_socket.connect((backend_host, backend_port))
+        log_sampled("connection", logging.INFO, "Connection %s: Forwarding from %s to %s:%s",
+                    connection_id, client_address, backend_host, backend_port)
 
         connections[connection_id] = (client_socket, backend_socket, backend_server)
+        exchange_timer = ExchangeTimer(backend_server)
 
         client_to_backend = threading.Thread(
             target=forward_data,
             args=(connection_id, client_socket, backend_socket, 
-                  f"Connection {connection_id}: client {client_address} -> backend {backend_host}:{backend_port}")
+                  f"Connection {connection_id}: client {client_address} -> backend {backend_host}:{backend_port}",
+                  exchange_timer.client_sent)
         )
         client_to_backend.daemon = True
         
         backend_to_client = threading.Thread(
             target=forward_data,
             args=(connection_id, backend_socket, client_socket, 
-                  f"Connection {connection_id}: backend {backend_host}:{backend_port} -> client {client_address}")
+                  f"Connection {connection_id}: backend {backend_host}:{backend_port} -> client {client_address}",
+                  exchange_timer.backend_replied)
         )
         backend_to_client.daemon = True
         
         client_to_backend.start()
         backend_to_client.start()
         
+    except BackendsOverloaded as e:
+        log_sampled("connection", logging.WARNING, "Connection %s from %s turned away: %s", connection_id, client_address, e)
+        client_socket.close()
+
     except Exception as e:
-        print(f"Error setting up connection {connection_id}: {e}")
+        logger.error(f"Error setting up connection {connection_id}: {e}")
         
-        if LOAD_BALANCING_ALGORITHM == "LEAST_CONNECTIONS" and backend_server:
+        if backend_server:
             decrement_connection_count(backend_server)
         
         try:
@@ -325,36 +1553,101 @@ def handle_client(client_socket, client_address):
             pass
         connections.pop(connection_id, None)
 
+def create_server_ssl_context():
+    """Build the server-side SSL context used for client connections"""
+    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ssl_context.load_cert_chain(certfile=SSL_CERT, keyfile=SSL_KEY)
+    # Stateless resumption through session tickets, on top of OpenSSL's
+    # built-in server session cache for stateful (session id) resumption
+    ssl_context.options &= ~ssl.OP_NO_TICKET
+    ssl_context.num_tickets = TLS_SESSION_TICKETS
+    logger.info(f"SSL enabled with certificate: {SSL_CERT}")
+    return ssl_context
+
+def get_server_ssl_context():
+    """
+    Return the current server SSL context, replacing it every TLS_TICKET_ROTATION_INTERVAL.
+    The ssl module does not expose session ticket keys, but every new context starts
+    with freshly generated ones, so swapping the context is how the keys are rotated.
+    Sessions issued under the previous keys fall back to one full handshake.
+    """
+    global server_ssl_context, server_ssl_context_created
+    with ssl_context_lock:
+        now = time.time()
+        if server_ssl_context is None or now - server_ssl_context_created >= TLS_TICKET_ROTATION_INTERVAL:
+            if server_ssl_context is not None:
+                logger.info("Rotating TLS session ticket keys")
+            server_ssl_context = create_server_ssl_context()
+            server_ssl_context_created = now
+        return server_ssl_context
+
+def record_tls_handshake(client_address, ssl_object):
+    """Count a completed handshake as full or resumed and report the resumption rate"""
+    resumed = ssl_object.session_reused
+    with tls_stats_lock:
+        tls_handshake_counts["resumed" if resumed else "full"] += 1
+        total = tls_handshake_counts["full"] + tls_handshake_counts["resumed"]
+        resumption_rate = tls_handshake_counts["resumed"] / total
+    log_sampled("connection", logging.INFO, "SSL handshake successful with %s (%s, resumption rate %.1f%%)",
+                client_address, "resumed" if resumed else "full", resumption_rate * 100)
+
+def get_tls_handshake_stats():
+    """Return a snapshot of full vs resumed handshake counts"""
+    with tls_stats_lock:
+        return dict(tls_handshake_counts)
+
+def complete_handshake(client_socket, client_address):
+    """
+    Run the server-side TLS handshake on a handshake pool thread, then hand the
+    connection to handle_client. A slow or stalled client only holds this worker,
+    and only for up to HANDSHAKE_TIMEOUT seconds.
+    """
+    try:
+        start_time = time.perf_counter()
+        client_socket.settimeout(HANDSHAKE_TIMEOUT)
+        client_socket = get_server_ssl_context().wrap_socket(client_socket, server_side=True)
+        client_socket.settimeout(None)
+        tls_handshake_latency.record(time.perf_counter() - start_time)
+        record_tls_handshake(client_address, client_socket)
+    except (ssl.SSLError, OSError) as e:
+        logger.warning(f"SSL handshake failed with {client_address}: {e}")
+        client_socket.close()
+        return
+
+    handle_client(client_socket, client_address)
+
 def start_load_balancer():
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if WORKER_PROCESSES > 1:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     
-    ssl_context = None
+    handshake_pool = None
+    start_backend_pool()
+    start_metrics_server()
     if USE_SSL:
-        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-        ssl_context.load_cert_chain(certfile=SSL_CERT, keyfile=SSL_KEY)
-        print(f"SSL enabled with certificate: {SSL_CERT}")
+        get_server_ssl_context()
+        handshake_pool = ThreadPoolExecutor(max_workers=HANDSHAKE_WORKERS, thread_name_prefix="tls-handshake")
     
     try:
         server_socket.bind((LB_HOST, LB_PORT))
-        server_socket.listen(5)
-        print(f"Load balancer listening on {LB_HOST}:{LB_PORT}")
-        print(f"Backend servers: {BACKEND_SERVERS}")
-        print(f"Using {LOAD_BALANCING_ALGORITHM} algorithm")
+        server_socket.listen(LISTEN_BACKLOG)
+        logger.info(f"Load balancer listening on {LB_HOST}:{LB_PORT}")
+        logger.info(f"Backend servers: {list(backend_registry.all_servers)}")
+        logger.info(f"Using {LOAD_BALANCING_ALGORITHM} algorithm")
         
         while True:
 
             client_socket, client_address = server_socket.accept()
-            print(f"Accepted connection from {client_address}")
+            accepted_connections.inc()
+            if should_reject_early():
+                client_socket.close()
+                continue
+            log_sampled("connection", logging.INFO, "Accepted connection from %s", client_address)
             
             if USE_SSL:
-                try:
-                    client_socket = ssl_context.wrap_socket(client_socket, server_side=True)
-                    print(f"SSL handshake successful with {client_address}")
-                except ssl.SSLError as e:
-                    print(f"SSL handshake failed with {client_address}: {e}")
-                    client_socket.close()
-                    continue
+                handshake_pool.submit(complete_handshake, client_socket, client_address)
+                continue
             
             client_thread = threading.Thread(
                 target=handle_client,
@@ -364,13 +1657,660 @@ def start_load_balancer():
             client_thread.start()
             
     except KeyboardInterrupt:
-        print("\nShutting down load balancer...")
+        logger.info("Shutting down load balancer...")
         for connection_id in list(connections.keys()):
             close_connection(connection_id)
-        if LOAD_BALANCING_ALGORITHM == "LEAST_RESPONSE":
-            stop_health_check()
+        if backend_pool:
+            backend_pool.stop()
+        print_latency_summary()
+        stop_health_check()
     finally:
         server_socket.close()
+        stop_logging()
+        if handshake_pool:
+            handshake_pool.shutdown(wait=False, cancel_futures=True)
+
+async def forward_data_async(connection_id, reader, writer, direction, on_data):
+    """Relay data from reader to writer on the event loop until either side closes"""
+    try:
+
+        if connection_id not in connections:
+            log_sampled("connection", logging.DEBUG, "%s: Connection %s no longer exists", direction, connection_id)
+            return
+
+        while True:
+            data = await reader.read(RELAY_BUFFER_SIZE)
+            if not data:
+                log_sampled("connection", logging.DEBUG, "%s: Connection closed", direction)
+                break
+            on_data(len(data))
+
+            if connection_id not in connections:
+                log_sampled("connection", logging.DEBUG, "%s: Connection %s was closed while receiving", direction, connection_id)
+                break
+
+            writer.write(data)
+            await writer.drain()
+            if LOG_CHUNKS:
+                log_sampled("chunk", logging.DEBUG, "%s: %d bytes", direction, len(data))
+
+    except Exception as e:
+        logger.warning(f"Error in {direction}: {e}")
+    finally:
+        close_connection(connection_id)
+
+async def connect_to_backend_async(backend_server, timeout):
+    """Open a stream pair to a backend, from the warm pool when possible"""
+    pooled_socket = backend_pool.acquire(backend_server) if backend_pool else None
+    if pooled_socket:
+        pooled_socket.setblocking(False)
+        record_connect_success(backend_server)
+        return await asyncio.open_connection(sock=pooled_socket)
+    start_time = time.time()
+    try:
+        streams = await asyncio.wait_for(asyncio.open_connection(*backend_server), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        record_connect_failure(backend_server, e)
+        raise
+    record_backend_latency(backend_server, time.time() - start_time)
+    record_connect_success(backend_server)
+    return streams
+
+async def open_backend_connection_async(connection_id, connect=connect_to_backend_async, affinity_key=None):
+    """
+    Event loop version of open_backend_connection. `connect(server, timeout)` is awaited
+    for each candidate; returns (backend_server, whatever connect returned).
+    """
+    if admission_queue and not await admission_queue.wait_async(any_backend_has_capacity):
+        raise BackendsOverloaded("all backends are at their concurrency limit")
+    tried = set()
+    full = set()
+    attempts = 0
+    last_error = None
+    deadline = time.time() + CONNECT_TIMEOUT_BUDGET
+    while attempts <= CONNECT_RETRIES:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        backend_server = get_retry_server(tried, affinity_key) if tried else get_next_server(affinity_key)
+        if backend_server is None:
+            # See open_backend_connection; the requeued wait always awaits, so the loop yields
+            if not full or attempts >= CONNECT_RETRIES or not await admission_queue.wait_async(
+                    lambda: any_backend_has_capacity(tried - full), requeue=True):
+                break
+            attempts += 1
+            tried -= full
+            full.clear()
+            continue
+        tried.add(backend_server)
+        if not reserve_backend_slot(backend_server):
+            full.add(backend_server)
+            last_error = BackendsOverloaded(f"{backend_server} is at its concurrency limit")
+            continue
+        if not get_circuit_breaker(backend_server).allow_request():
+            decrement_connection_count(backend_server)
+            last_error = ConnectionRefusedError(f"circuit open for {backend_server}")
+            continue
+
+        attempts += 1
+        count_selection(backend_server)
+        try:
+            return backend_server, await connect(backend_server, min(BACKEND_CONNECT_TIMEOUT, remaining))
+        except (OSError, asyncio.TimeoutError) as e:
+            last_error = e
+            decrement_connection_count(backend_server)
+            logger.warning(f"Connection {connection_id}: connect to {backend_server} failed ({e!r})")
+    raise last_error or ConnectionError("no backend available")
+
+class BackendChannel:
+    """
+    One persistent framed connection to a backend in L7 mode. Requests from any number
+    of clients are written to it with channel-local ids, and a reader task hands each
+    response to the request waiting on that id, so one connection carries many clients.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.reader = None
+        self.writer = None
+        self.pending = {}
+        self.request_ids = itertools.count(1)
+        self.closed = False
+
+    async def open(self, timeout):
+        start_time = time.time()
+        try:
+            self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(*self.server), timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            record_connect_failure(self.server, e)
+            raise
+        record_backend_latency(self.server, time.time() - start_time)
+        record_connect_success(self.server)
+        self.writer.write(PREFACE)
+        asyncio.ensure_future(self._read_responses())
+
+    async def _read_responses(self):
+        error = None
+        try:
+            while True:
+                request_id, payload = await read_frame_async(self.reader)
+                future = self.pending.pop(request_id, None)
+                if future and not future.done():
+                    future.set_result(payload)
+        except (asyncio.IncompleteReadError, OSError, FrameError) as e:
+            error = e
+        finally:
+            self.close(ConnectionError(f"connection to backend {self.server} lost ({error!r})"))
+
+    def close(self, error):
+        self.closed = True
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self.pending.clear()
+        if self.writer:
+            self.writer.close()
+
+    async def request(self, payload):
+        """Send one request and wait for the backend's response payload"""
+        if self.closed:
+            raise ConnectionError(f"connection to backend {self.server} is closed")
+        request_id = next(self.request_ids) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            self.writer.write(encode_frame(request_id, payload))
+            await self.writer.drain()
+            return await future
+        finally:
+            self.pending.pop(request_id, None)
+
+backend_channels = collections.defaultdict(list)
+backend_channel_locks = collections.defaultdict(asyncio.Lock)
+
+async def get_backend_channel(server, timeout):
+    """
+    Return the least busy open channel to `server`, opening another one while every
+    channel has requests in flight and there are fewer than L7_BACKEND_CONNECTIONS.
+    """
+    async with backend_channel_locks[server]:
+        channels = backend_channels[server]
+        channels[:] = [channel for channel in channels if not channel.closed]
+        least_busy = min(channels, key=lambda channel: len(channel.pending), default=None)
+        if least_busy and (not least_busy.pending or len(channels) >= L7_BACKEND_CONNECTIONS):
+            return least_busy
+        channel = BackendChannel(server)
+        await channel.open(timeout)
+        channels.append(channel)
+        return channel
+
+async def forward_framed_request(connection_id, payload, affinity_key=None):
+    """
+    Balance one framed request on its own and forward it over a backend channel.
+    Returns (response, True), or (an error message for the client, False).
+    """
+    try:
+        backend_server, channel = await open_backend_connection_async(connection_id, get_backend_channel,
+                                                                      affinity_key)
+    except Exception as e:
+        return f"[Load Balancer] No backend available: {e}".encode(), False
+
+    start_time = time.perf_counter()
+    try:
+        response = await asyncio.wait_for(channel.request(payload), L7_REQUEST_TIMEOUT)
+        record_exchange_latency(backend_server, time.perf_counter() - start_time)
+        # Also settles a half-open breaker whose trial reused an existing channel
+        record_connect_success(backend_server)
+        return response, True
+    except asyncio.TimeoutError:
+        if concurrency_limits:
+            concurrency_limits.record_drop(backend_server)
+        return f"[Load Balancer] Backend {backend_server[0]}:{backend_server[1]} timed out".encode(), False
+    except (ConnectionError, OSError) as e:
+        record_request_failure(backend_server, e)
+        return f"[Load Balancer] Backend error: {e}".encode(), False
+    finally:
+        decrement_connection_count(backend_server)
+
+def start_response_fill(connection_id, payload, command, key):
+    """Fetch a response for the cache in a task of its own, so every request waiting on the key shares it"""
+    async def fill():
+        try:
+            response, ok = await forward_framed_request(connection_id, payload, key)
+            if ok and is_cacheable_response(command, response):
+                fresh, stale = RESPONSE_CACHE_RULES[command]
+                response_cache.put(key, response, fresh, stale)
+            return response
+        finally:
+            response_cache_fills.pop(key, None)
+
+    task = asyncio.ensure_future(fill())
+    response_cache_fills[key] = task
+    return task
+
+async def cached_framed_response(connection_id, payload, command, key):
+    """
+    Answer a cacheable request from the response cache. A stale entry is served at
+    once while a single refresh runs in the background; a miss waits for the backend
+    fetch already in flight for the key, or starts one.
+    """
+    response, state = response_cache.get(key)
+    if state == STALE and key not in response_cache_fills:
+        start_response_fill(connection_id, payload, command, key)
+    if response is not None:
+        return response
+    fill = response_cache_fills.get(key) or start_response_fill(connection_id, payload, command, key)
+    # shield() so a client going away does not cancel a fetch other requests are waiting on
+    return await asyncio.shield(fill)
+
+async def proxy_framed_request(connection_id, request_id, payload, client_address, client_writer):
+    """Answer one framed request from the response cache or a backend and frame the reply"""
+    # Identical searches (and other cacheable commands) hash to the same backend; the rest by client
+    command = normalize_command(payload)
+    if command and response_cache and RESPONSE_CACHE_RULES.get(command[0], (0, 0))[0] > 0:
+        response = await cached_framed_response(connection_id, payload, *command)
+    else:
+        affinity_key = command[1] if command else client_address[0]
+        response, _ = await forward_framed_request(connection_id, payload, affinity_key)
+
+    if connection_id not in connections or client_writer.is_closing():
+        return
+    try:
+        frame = encode_frame(request_id, response)
+        client_writer.write(frame)
+        client_bytes_out.inc(len(frame))
+        await client_writer.drain()
+    except (OSError, FrameError) as e:
+        logger.warning(f"Connection {connection_id}: could not send response {request_id}: {e}")
+
+async def serve_framed_client(connection_id, client_address, client_reader, client_writer, buffered):
+    """
+    Serve a client speaking the framed protocol in L7 mode. Every request is balanced
+    on its own, so a single long-lived client is spread over all backends.
+    """
+    log_sampled("connection", logging.INFO, "Connection %s: framed client %s, balancing per request",
+                connection_id, client_address)
+    connections[connection_id] = (client_writer, None, None)
+    frames = FrameBuffer()
+    in_flight = set()
+    try:
+        data = buffered
+        while True:
+            frames.feed(data)
+            while (frame := frames.pop()) is not None:
+                task = asyncio.ensure_future(proxy_framed_request(connection_id, *frame, client_address, client_writer))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            data = await client_reader.read(RELAY_BUFFER_SIZE)
+            if not data:
+                break
+            client_bytes_in.inc(len(data))
+    except (OSError, FrameError) as e:
+        logger.warning(f"Connection {connection_id}: framed client {client_address} failed: {e}")
+    finally:
+        # Let responses already on their way reach a client that only half-closed
+        if in_flight:
+            await asyncio.wait(in_flight, timeout=L7_REQUEST_TIMEOUT)
+        close_connection(connection_id)
+
+async def handle_client_async(client_reader, client_writer):
+    """
+    Handle a new client connection on the event loop
+    client_reader, client_writer: stream pair for the client, upgraded to TLS here when enabled
+    """
+    connection_id = str(uuid.uuid4())
+    client_address = client_writer.get_extra_info('peername')
+    accepted_connections.inc()
+    if PROXY_MODE == "L4" and should_reject_early():
+        # In L7 mode requests, not connections, are admitted, so clients are always accepted
+        client_writer.close()
+        return
+
+    if USE_SSL:
+        try:
+            start_time = time.perf_counter()
+            await client_writer.start_tls(get_server_ssl_context(), ssl_handshake_timeout=HANDSHAKE_TIMEOUT)
+            tls_handshake_latency.record(time.perf_counter() - start_time)
+        except (ssl.SSLError, OSError, asyncio.TimeoutError) as e:
+            logger.warning(f"SSL handshake failed with {client_address}: {e}")
+            client_writer.close()
+            return
+        record_tls_handshake(client_address, client_writer.get_extra_info('ssl_object'))
+
+    initial_data = b""
+    if PROXY_MODE == "L7":
+        # Framed clients announce themselves with a preface; anyone else is relayed as plain L4
+        try:
+            initial_data = await client_reader.read(RELAY_BUFFER_SIZE)
+        except OSError as e:
+            logger.warning(f"Connection {connection_id}: read from {client_address} failed: {e}")
+            initial_data = b""
+        if not initial_data:
+            client_writer.close()
+            return
+        if initial_data.startswith(PREFACE):
+            client_bytes_in.inc(len(initial_data))
+            await serve_framed_client(connection_id, client_address, client_reader, client_writer,
+                                      initial_data[len(PREFACE):])
+            return
+
+    backend_writer = None
+    backend_server = None
+
+    try:
+        backend_server, (backend_reader, backend_writer) = await open_backend_connection_async(
+            connection_id, affinity_key=client_address[0])
+        backend_host, backend_port = backend_server
+        log_sampled("connection", logging.INFO, "Connection %s: Forwarding from %s to %s:%s",
+                    connection_id, client_address, backend_host, backend_port)
+
+        connections[connection_id] = (client_writer, backend_writer, backend_server)
+
+    except BackendsOverloaded as e:
+        log_sampled("connection", logging.WARNING, "Connection %s from %s turned away: %s", connection_id, client_address, e)
+        client_writer.close()
+        return
+
+    except Exception as e:
+        logger.error(f"Error setting up connection {connection_id}: {e}")
+
+        if backend_server:
+            decrement_connection_count(backend_server)
+
+        client_writer.close()
+        if backend_writer:
+            backend_writer.close()
+        connections.pop(connection_id, None)
+        return
+
+    exchange_timer = ExchangeTimer(backend_server)
+    if initial_data:
+        exchange_timer.client_sent(len(initial_data))
+        backend_writer.write(initial_data)
+    await asyncio.gather(
+        forward_data_async(connection_id, client_reader, backend_writer,
+                           f"Connection {connection_id}: client {client_address} -> backend {backend_host}:{backend_port}",
+                           exchange_timer.client_sent),
+        forward_data_async(connection_id, backend_reader, client_writer,
+                           f"Connection {connection_id}: backend {backend_host}:{backend_port} -> client {client_address}",
+                           exchange_timer.backend_replied)
+    )
+
+async def run_event_loop_load_balancer():
+    """Serve all client connections from a single asyncio event loop"""
+    global response_cache, event_loop
+    event_loop = asyncio.get_running_loop()
+    start_backend_pool()
+    if PROXY_MODE == "L7" and RESPONSE_CACHE_BYTES:
+        response_cache = ResponseCache(RESPONSE_CACHE_BYTES)
+    start_metrics_server()
+    if USE_SSL:
+        # TLS is started per connection in handle_client_async so rotated contexts take effect
+        get_server_ssl_context()
+
+    server = await asyncio.start_server(
+        handle_client_async, LB_HOST, LB_PORT,
+        backlog=LISTEN_BACKLOG, reuse_address=True, reuse_port=WORKER_PROCESSES > 1
+    )
+    logger.info(f"Load balancer (asyncio engine) listening on {LB_HOST}:{LB_PORT}")
+    logger.info(f"Backend servers: {list(backend_registry.all_servers)}")
+    logger.info(f"Using {LOAD_BALANCING_ALGORITHM} algorithm")
+
+    async with server:
+        await server.serve_forever()
+
+def start_load_balancer_async():
+    """Run the event-loop proxy engine until interrupted"""
+    try:
+        asyncio.run(run_event_loop_load_balancer())
+    except KeyboardInterrupt:
+        logger.info("Shutting down load balancer...")
+        for connection_id in list(connections.keys()):
+            close_connection(connection_id)
+        if backend_pool:
+            backend_pool.stop()
+        print_latency_summary()
+        stop_health_check()
+    finally:
+        stop_logging()
+
+def exit_with_parent(parent_pid):
+    """
+    Make this worker exit when the parent dies, however it dies, so no orphan keeps
+    accepting on LB_PORT through SO_REUSEPORT. Linux sends us SIGTERM via prctl();
+    elsewhere a thread polls the parent pid.
+    """
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        armed = libc.prctl(PR_SET_PDEATHSIG, signal.SIGTERM) == 0
+    except (OSError, AttributeError):
+        armed = False
+    if armed:
+        # The parent may have died before prctl() took effect
+        if os.getppid() != parent_pid:
+            os.kill(os.getpid(), signal.SIGTERM)
+        return
+
+    def watch_parent():
+        while os.getppid() == parent_pid:
+            time.sleep(WORKER_PARENT_CHECK_INTERVAL)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    threading.Thread(target=watch_parent, daemon=True).start()
+
+def run_worker(worker_id, parent_pid=None):
+    """Entry point of one pre-forked worker: run the selected engine on the shared port"""
+    global METRICS_PORT
+    if parent_pid is not None:
+        exit_with_parent(parent_pid)
+    # The parent's log writer thread does not survive fork(); give this worker its own
+    setup_logging()
+    if METRICS_PORT:
+        # Counters live in each worker's memory, so every worker serves its own endpoint
+        METRICS_PORT += worker_id
+    logger.info(f"Worker {worker_id} started (pid {os.getpid()})")
+    try:
+        if PROXY_ENGINE == "ASYNCIO":
+            start_load_balancer_async()
+        else:
+            start_load_balancer()
+    finally:
+        stop_logging()
+
+def start_prefork_load_balancer():
+    """
+    Fork WORKER_PROCESSES workers that each bind LB_PORT with SO_REUSEPORT, so the
+    kernel spreads accepts across them. Health checks run in this parent process and
+    publish response times and availability into shared memory.
+    """
+    if not hasattr(socket, "SO_REUSEPORT") or "fork" not in multiprocessing.get_all_start_methods():
+        logger.warning("Worker processes need SO_REUSEPORT and fork(); running a single process instead")
+        start_health_check()
+        run_worker(0)
+        return
+
+    context = multiprocessing.get_context("fork")
+    stop_logging()
+    workers = []
+    for worker_id in range(WORKER_PROCESSES):
+        worker = context.Process(target=run_worker, args=(worker_id, os.getpid()), daemon=True)
+        worker.start()
+        workers.append(worker)
+
+    def stop_on_signal(signum, frame):
+        raise SystemExit(0)
+
+    # Installed after forking: workers keep the default action, so terminate() ends them
+    signal.signal(signal.SIGTERM, stop_on_signal)
+    # Start threads only after forking so no child inherits a lock held mid-write
+    setup_logging()
+    start_health_check()
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("Shutting down worker processes...")
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+        stop_health_check()
+        stop_logging()
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="TCP Load Balancer")
+    parser.add_argument(
+        "--algorithm", choices=[name.lower() for name in LOAD_BALANCING_ALGORITHMS],
+        help="load balancing algorithm (from --config, or prompted for, when omitted)"
+    )
+    parser.add_argument(
+        "--config", metavar="FILE",
+        help="JSON file with backends, weights, algorithm and health check interval; re-read on SIGHUP or 'reload'"
+    )
+    parser.add_argument(
+        "--admin-port", type=int, default=ADMIN_PORT,
+        help=f"port of the admin channel on {ADMIN_HOST} for changing backends and algorithm at runtime (0 disables it)"
+    )
+    parser.add_argument(
+        "--drain-timeout", type=float, default=DRAIN_TIMEOUT,
+        help="seconds a draining backend's connections may take to finish before they are closed (0 waits forever)"
+    )
+    parser.add_argument(
+        "--engine", choices=["threaded", "asyncio"], default="threaded",
+        help="proxy engine: one thread pair per connection, or a single asyncio event loop"
+    )
+    parser.add_argument(
+        "--mode", choices=["l4", "l7"], default=PROXY_MODE.lower(),
+        help="l4 relays bytes per connection; l7 balances each framed request on its own (asyncio engine only)"
+    )
+    parser.add_argument(
+        "--response-cache-mb", type=float, default=RESPONSE_CACHE_BYTES / (1024 * 1024),
+        help="memory for the L7 response cache in MiB; 0 disables it"
+    )
+    parser.add_argument(
+        "--response-cache-rule", action="append", default=[], metavar="COMMAND=FRESH[:STALE]",
+        help=f"seconds a response to COMMAND ({', '.join(RESPONSE_CACHE_RULES)}) stays fresh, "
+             f"and then may be served stale while it is refreshed; FRESH 0 stops caching it; repeatable"
+    )
+    parser.add_argument(
+        "--relay-mode", choices=["copy", "buffered", "splice"], default=RELAY_MODE.lower(),
+        help="threaded engine relay: 1KB copies, a reusable recv_into buffer, or kernel splice() for plaintext legs"
+    )
+    parser.add_argument(
+        "--buffer-size", type=int, default=RELAY_BUFFER_SIZE,
+        help="relay buffer / pipe size in bytes"
+    )
+    parser.add_argument(
+        "--backlog", type=int, default=LISTEN_BACKLOG,
+        help="listen() backlog for the load balancer socket"
+    )
+    parser.add_argument(
+        "--handshake-timeout", type=float, default=HANDSHAKE_TIMEOUT,
+        help="seconds a client gets to finish the TLS handshake"
+    )
+    parser.add_argument(
+        "--handshake-workers", type=int, default=HANDSHAKE_WORKERS,
+        help="threads performing TLS handshakes for the threaded engine"
+    )
+    parser.add_argument(
+        "--tls-ticket-rotation", type=float, default=TLS_TICKET_ROTATION_INTERVAL,
+        help="seconds between TLS session ticket key rotations"
+    )
+    parser.add_argument(
+        "--backend-pool", type=int, default=BACKEND_POOL_SIZE,
+        help="warm upstream connections to keep open per backend (0 disables pooling)"
+    )
+    parser.add_argument(
+        "--health-interval", type=float,
+        help=f"seconds between health probes of a backend in rotation, jittered (default {HEALTH_CHECK_INTERVAL})"
+    )
+    parser.add_argument(
+        "--health-rise", type=int, default=HEALTH_CHECK_RISE,
+        help="consecutive passing probes before a backend returns to rotation"
+    )
+    parser.add_argument(
+        "--health-fall", type=int, default=HEALTH_CHECK_FALL,
+        help="consecutive failing probes before a backend leaves rotation"
+    )
+    parser.add_argument(
+        "--weight", action="append", default=[], metavar="HOST:PORT=W",
+        help="weight of a backend for the weighted algorithms; repeatable"
+    )
+    parser.add_argument(
+        "--static-weights", action="store_true",
+        help="do not adjust weights by observed latency and error rate"
+    )
+    parser.add_argument(
+        "--slow-start", type=float, default=SLOW_START_TIME,
+        help="seconds a new or recovered backend takes to ramp up to its full weight (0 disables)"
+    )
+    parser.add_argument(
+        "--hash-load-factor", type=float, default=HASH_LOAD_FACTOR,
+        help="consistent_hash: most connections a backend takes, as a multiple of its fair share (> 1)"
+    )
+    parser.add_argument(
+        "--adaptive-concurrency", action="store_true",
+        help="limit connections (L4) or requests (L7) in flight to each backend by a latency-driven adaptive limit"
+    )
+    parser.add_argument(
+        "--concurrency-initial", type=int, default=CONCURRENCY_LIMIT_INITIAL,
+        help=f"adaptive concurrency: limit per backend before any latency is observed "
+             f"(default {LIMIT_INITIAL} requests at L7, {L4_CONCURRENCY_LIMIT_INITIAL} connections at L4)"
+    )
+    parser.add_argument(
+        "--concurrency-min", type=int, default=CONCURRENCY_LIMIT_MIN,
+        help=f"adaptive concurrency: the limit never drops below this (default {LIMIT_MIN} at L7; at L4 the initial "
+             f"limit, because client connections are long-lived and a low floor would shed most of them)"
+    )
+    parser.add_argument(
+        "--admission-queue", type=int, default=ADMISSION_QUEUE_SIZE,
+        help="adaptive concurrency: clients or requests that may wait for a free backend; beyond that they are rejected"
+    )
+    parser.add_argument(
+        "--admission-timeout", type=float, default=ADMISSION_QUEUE_TIMEOUT,
+        help="adaptive concurrency: seconds a client or request may wait for a free backend before it is shed"
+    )
+    parser.add_argument(
+        "--connect-retries", type=int, default=CONNECT_RETRIES,
+        help="other backends to try when connecting to the selected one fails"
+    )
+    parser.add_argument(
+        "--connect-budget", type=float, default=CONNECT_TIMEOUT_BUDGET,
+        help="seconds all backend connect attempts for one client may take together"
+    )
+    parser.add_argument(
+        "--circuit-open-time", type=float, default=CIRCUIT_OPEN_TIME,
+        help="seconds a backend's circuit breaker stays open before a trial connection"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, default=METRICS_PORT,
+        help="port of the Prometheus /metrics endpoint (0 disables it; worker N uses port + N)"
+    )
+    parser.add_argument(
+        "--log-level", choices=["debug", "info", "warning", "error"], default=LOG_LEVEL.lower(),
+        help="minimum level written to the log"
+    )
+    parser.add_argument(
+        "--log-format", choices=["text", "json"], default=LOG_FORMAT,
+        help="plain text lines or one JSON object per record"
+    )
+    parser.add_argument(
+        "--log-chunks", action="store_true",
+        help="log every relayed chunk at debug level (expensive)"
+    )
+    parser.add_argument(
+        "--log-sample", action="append", default=[], metavar="EVENT=N",
+        help=f"keep one in N records of a hot-path event ({', '.join(LOG_SAMPLE_EVERY)}); repeatable"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=WORKER_PROCESSES,
+        help="number of pre-forked worker processes sharing the port via SO_REUSEPORT"
+    )
+    return parser.parse_args()
 
 def show_algorithm_menu():
     """Show menu for algorithm selection"""
@@ -379,26 +2319,143 @@ def show_algorithm_menu():
     print("1. Round Robin")
     print("2. Least Connections")
     print("3. Least Response Time")
+    print("4. Power of Two Choices")
+    print("5. Peak EWMA")
+    print("6. Weighted Round Robin")
+    print("7. Weighted Least Connections")
+    print("8. Consistent Hash")
     
     while True:
-        choice = input("Enter your choice (1/2/3): ")
+        choice = input("Enter your choice (1-8): ")
         if choice == "1":
             return "ROUND_ROBIN"
         elif choice == "2":
             return "LEAST_CONNECTIONS"
         elif choice == "3":
             return "LEAST_RESPONSE"
+        elif choice == "4":
+            return "POWER_OF_TWO"
+        elif choice == "5":
+            return "PEAK_EWMA"
+        elif choice == "6":
+            return "WEIGHTED_ROUND_ROBIN"
+        elif choice == "7":
+            return "WEIGHTED_LEAST_CONNECTIONS"
+        elif choice == "8":
+            return "CONSISTENT_HASH"
         else:
-            print("Invalid choice. Please enter 1, 2, or 3.")
+            print("Invalid choice. Please enter a number from 1 to 8.")
 
 if __name__ == "__main__":
 
-    LOAD_BALANCING_ALGORITHM = show_algorithm_menu()
+    args = parse_args()
+    config = {"backends": None, "algorithm": None, "health_check_interval": None}
+    if args.config:
+        CONFIG_FILE = args.config
+        try:
+            config = read_config(CONFIG_FILE)
+        except ValueError as e:
+            sys.exit(f"Invalid --config: {e}")
+        if config["algorithm"] and config["algorithm"] not in LOAD_BALANCING_ALGORITHMS:
+            sys.exit(f"Invalid --config: unknown algorithm {config['algorithm'].lower()!r}")
+        if config["backends"]:
+            BACKEND_SERVERS = list(config["backends"])
+            BACKEND_WEIGHTS = dict(config["backends"])
+            backend_registry = BackendRegistry(BACKEND_SERVERS)
+    ADMIN_PORT = args.admin_port
+    DRAIN_TIMEOUT = args.drain_timeout
+    PROXY_ENGINE = args.engine.upper()
+    PROXY_MODE = args.mode.upper()
+    RESPONSE_CACHE_BYTES = int(args.response_cache_mb * 1024 * 1024)
+    for rule in args.response_cache_rule:
+        command, _, ttls = rule.partition("=")
+        fresh, _, stale = ttls.partition(":")
+        try:
+            if command not in RESPONSE_CACHE_RULES:
+                raise ValueError(command)
+            RESPONSE_CACHE_RULES[command] = (float(fresh), float(stale or 0))
+        except ValueError:
+            sys.exit(f"Invalid --response-cache-rule {rule!r}: expected COMMAND=FRESH[:STALE] in seconds "
+                     f"with COMMAND one of {', '.join(RESPONSE_CACHE_RULES)}")
+    RELAY_MODE = args.relay_mode.upper()
+    RELAY_BUFFER_SIZE = args.buffer_size
+    WORKER_PROCESSES = args.workers
+    LISTEN_BACKLOG = args.backlog
+    HANDSHAKE_TIMEOUT = args.handshake_timeout
+    HANDSHAKE_WORKERS = args.handshake_workers
+    TLS_TICKET_ROTATION_INTERVAL = args.tls_ticket_rotation
+    BACKEND_POOL_SIZE = args.backend_pool
+    HEALTH_CHECK_INTERVAL = args.health_interval or config["health_check_interval"] or HEALTH_CHECK_INTERVAL
+    HEALTH_CHECK_RISE = args.health_rise
+    HEALTH_CHECK_FALL = args.health_fall
+    CONNECT_RETRIES = args.connect_retries
+    for weight in args.weight:
+        address, _, value = weight.partition("=")
+        host, _, port = address.rpartition(":")
+        try:
+            if float(value) <= 0:
+                raise ValueError(value)
+            BACKEND_WEIGHTS[(host, int(port))] = float(value)
+        except ValueError:
+            sys.exit(f"Invalid --weight {weight!r}: expected HOST:PORT=W with W > 0")
+    DYNAMIC_WEIGHTS = not args.static_weights
+    SLOW_START_TIME = args.slow_start
+    backend_weights = BackendWeights(BACKEND_SERVERS, BACKEND_WEIGHTS, DYNAMIC_WEIGHTS, SLOW_START_TIME)
+    if args.hash_load_factor <= 1:
+        sys.exit("--hash-load-factor must be greater than 1")
+    HASH_LOAD_FACTOR = args.hash_load_factor
+    hash_ring = HashRing(BACKEND_SERVERS, BACKEND_WEIGHTS, load_factor=HASH_LOAD_FACTOR)
+    CONNECT_TIMEOUT_BUDGET = args.connect_budget
+    ADAPTIVE_CONCURRENCY = args.adaptive_concurrency
+    ADMISSION_QUEUE_SIZE = args.admission_queue
+    ADMISSION_QUEUE_TIMEOUT = args.admission_timeout
+    if ADAPTIVE_CONCURRENCY:
+        l4_mode = PROXY_MODE == "L4"
+        CONCURRENCY_LIMIT_INITIAL = args.concurrency_initial or (L4_CONCURRENCY_LIMIT_INITIAL if l4_mode else LIMIT_INITIAL)
+        CONCURRENCY_LIMIT_MIN = args.concurrency_min or (CONCURRENCY_LIMIT_INITIAL if l4_mode else LIMIT_MIN)
+        if not 1 <= CONCURRENCY_LIMIT_MIN <= CONCURRENCY_LIMIT_INITIAL <= LIMIT_MAX:
+            sys.exit(f"Need 1 <= --concurrency-min <= --concurrency-initial <= {LIMIT_MAX}")
+        concurrency_limits = ConcurrencyLimits(initial=CONCURRENCY_LIMIT_INITIAL, min_limit=CONCURRENCY_LIMIT_MIN)
+        admission_queue = AdmissionQueue(ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT)
+    CIRCUIT_OPEN_TIME = args.circuit_open_time
+    METRICS_PORT = args.metrics_port
+    LOG_LEVEL = args.log_level.upper()
+    LOG_FORMAT = args.log_format
+    LOG_CHUNKS = args.log_chunks
+    for sample in args.log_sample:
+        event, _, every = sample.partition("=")
+        if event not in LOG_SAMPLE_EVERY or not every.isdigit() or int(every) < 1:
+            sys.exit(f"Invalid --log-sample {sample!r}: expected EVENT=N with EVENT one of {', '.join(LOG_SAMPLE_EVERY)}")
+        LOG_SAMPLE_EVERY[event] = int(every)
 
-    if LOAD_BALANCING_ALGORITHM == "LEAST_CONNECTIONS":
-        initialize_connection_counter()
+    if args.algorithm:
+        LOAD_BALANCING_ALGORITHM = args.algorithm.upper()
+    elif config["algorithm"]:
+        LOAD_BALANCING_ALGORITHM = config["algorithm"]
+    else:
+        LOAD_BALANCING_ALGORITHM = show_algorithm_menu()
 
-    if LOAD_BALANCING_ALGORITHM == "LEAST_RESPONSE":
+    setup_logging()
+    if PROXY_MODE == "L7" and PROXY_ENGINE != "ASYNCIO":
+        logger.warning("L7 mode runs on the asyncio engine; switching engines")
+        PROXY_ENGINE = "ASYNCIO"
+
+    if WORKER_PROCESSES > 1:
+        enable_shared_backend_state()
+
+    initialize_connection_counter()
+
+    if WORKER_PROCESSES > 1:
+        # Every worker has its own algorithm and selection state, and shared state has a fixed backend set
+        logger.warning("The admin channel and config reloads need a single process; disabled with --workers")
+        start_prefork_load_balancer()
+    else:
+        start_admin_server()
+        if CONFIG_FILE:
+            start_config_reloader()
         start_health_check()
 
-    start_load_balancer()
\ No newline at end of file
+        if PROXY_ENGINE == "ASYNCIO":
+            start_load_balancer_async()
+        else:
+            start_load_balancer()
@@ -0,0 +1,58 @@
+import logging
+import logging.handlers
+import queue
+import json
+import sys
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s [%(process)d] %(message)s"
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, event name, message and any structured fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "pid": record.process,
+            "event": getattr(record, "event", None),
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+listener = None
+
+def start_logging(logger, level="INFO", fmt="text", stream=None, background=True):
+    """
+    Route `logger` to `stream` (stdout by default). With `background` the calling thread
+    only appends the record to an in-memory queue and a listener thread does the
+    formatting and the write, so a slow terminal or pipe never stalls the data plane.
+    Safe to call again, e.g. in a freshly forked worker whose listener thread did not survive.
+    """
+    global listener
+    stop_logging()
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    for old_handler in list(logger.handlers):
+        logger.removeHandler(old_handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+    if background:
+        log_queue = queue.SimpleQueue()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        listener = logging.handlers.QueueListener(log_queue, handler)
+        listener.start()
+    else:
+        logger.addHandler(handler)
+
+def stop_logging():
+    """Flush queued records and stop the background writer"""
+    global listener
+    if listener:
+        listener.stop()
+        listener = None
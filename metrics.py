@@ -0,0 +1,199 @@
+import threading
+import weakref
+import math
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class ShardedCells:
+    """
+    A fixed number of numeric cells with one shard per recording thread, so writers never
+    take a lock; readers merge the shards. A thread's shard is folded into a retired shard
+    as soon as the thread exits, so registering costs the same however many connection
+    threads are alive, and readers only merge the shards of live threads.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._shards = {}  # id of the thread's owner token -> cells
+        self._retired = [0] * size
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        cells = getattr(self._local, "cells", None)
+        if cells is None:
+            cells = [0] * self._size
+            # The token lives only in this thread's local storage, so it is freed when the thread exits
+            owner = _ShardOwner()
+            key = id(owner)
+            with self._shards_lock:
+                self._shards[key] = cells
+            weakref.finalize(owner, self._retire, key)
+            self._local.owner = owner
+            self._local.cells = cells
+        return cells
+
+    def _retire(self, key):
+        with self._shards_lock:
+            cells = self._shards.pop(key, None)
+            if cells is not None:
+                self._retired = [total + value for total, value in zip(self._retired, cells)]
+
+    def merged(self):
+        with self._shards_lock:
+            retired = self._retired
+            shards = list(self._shards.values())
+        return [sum(column) for column in zip(retired, *shards)]
+
+class _ShardOwner:
+    """Marks a thread's ownership of its shard; see ShardedCells._shard"""
+
+class Counter(ShardedCells):
+    """Monotonic counter; inc() takes no lock"""
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount=1):
+        self._shard()[0] += amount
+
+    @property
+    def value(self):
+        return self.merged()[0]
+
+class LatencyHistogram(ShardedCells):
+    """
+    HDR-style latency histogram with log-linear buckets: every power of two between
+    `lowest` and `highest` seconds is split into `sub_buckets` equal slices, which
+    bounds the relative error of any reported percentile to about 1/sub_buckets.
+
+    record() takes no lock: each recording thread gets its own shard of counters
+    and readers merge the shards, so instrumentation never serialises the data plane.
+    """
+
+    def __init__(self, lowest=1e-6, highest=60.0, sub_buckets=32):
+        self.lowest = lowest
+        self.sub_buckets = sub_buckets
+        self._max_exponent = math.frexp(highest / lowest)[1]
+        self._bucket_count = (self._max_exponent + 1) * sub_buckets
+        # counts per bucket, then total count and sum of recorded values
+        super().__init__(self._bucket_count + 2)
+
+    def _index(self, value):
+        scaled = value / self.lowest
+        if scaled < 1:
+            return 0
+        mantissa, exponent = math.frexp(scaled)
+        if exponent > self._max_exponent:
+            return self._bucket_count - 1
+        return exponent * self.sub_buckets + int((mantissa - 0.5) * 2 * self.sub_buckets)
+
+    def _bucket_upper_bound(self, index):
+        exponent, slot = divmod(index, self.sub_buckets)
+        return (0.5 + (slot + 1) / (2 * self.sub_buckets)) * (2 ** exponent) * self.lowest
+
+    def record(self, value):
+        shard = self._shard()
+        shard[self._index(value)] += 1
+        shard[-2] += 1
+        shard[-1] += value
+
+    def snapshot(self):
+        """Return (bucket counts, total count, sum) merged across all recording threads"""
+        cells = self.merged()
+        return cells[:self._bucket_count], cells[-2], cells[-1]
+
+    @property
+    def count(self):
+        return self.snapshot()[1]
+
+    def percentiles(self, quantiles, snapshot=None):
+        """Return the upper bucket bound for each quantile in `quantiles` (0..1)"""
+        counts, total, _ = snapshot or self.snapshot()
+        if not total:
+            return [0.0 for _ in quantiles]
+        results = []
+        for q in quantiles:
+            target = max(1, math.ceil(q * total))
+            running = 0
+            for index, count in enumerate(counts):
+                running += count
+                if running >= target:
+                    results.append(self._bucket_upper_bound(index))
+                    break
+        return results
+
+    def percentile(self, q):
+        return self.percentiles([q])[0]
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+class Exposition:
+    """Builds one page of the Prometheus text exposition format"""
+
+    def __init__(self):
+        self.lines = []
+
+    def add(self, name, kind, help_text, samples):
+        """Add a counter or gauge; samples is an iterable of (labels dict, value)"""
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{format_labels(labels)} {value}")
+
+    def add_summary(self, name, help_text, histograms, quantiles=(0.5, 0.99, 0.999)):
+        """Add HDR histograms as a summary with quantiles; histograms is an iterable of (labels, LatencyHistogram)"""
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} summary")
+        for labels, histogram in histograms:
+            snapshot = histogram.snapshot()
+            for q, value in zip(quantiles, histogram.percentiles(quantiles, snapshot)):
+                self.lines.append(f"{name}{format_labels({**labels, 'quantile': q})} {value:.6g}")
+            self.lines.append(f"{name}_sum{format_labels(labels)} {snapshot[2]:.6g}")
+            self.lines.append(f"{name}_count{format_labels(labels)} {snapshot[1]}")
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
+
+class MetricsServer:
+    """Serve the page returned by render() at /metrics from a background HTTP thread"""
+
+    def __init__(self, host, port, render):
+        self.host = host
+        self.port = port
+        self.render = render
+        self._httpd = None
+
+    def start(self):
+        render = self.render
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
@@ -0,0 +1,149 @@
+import collections
+import random
+import time
+
+FRESH, STALE, MISS = "fresh", "stale", "miss"
+
+# Responses containing these bytes report a failure and must not be cached, by command
+FAILURE_MARKERS = {
+    "search": b"Search error:",
+}
+
+# Halves every byte of a sketch row in one translate() call
+HALVE = bytes(i >> 1 for i in range(256))
+
+def normalize_command(payload):
+    """
+    Return (command, cache key) for a request whose response may be cached, or None.
+    Requests share a key only when the backend cannot tell them apart: it ignores
+    surrounding whitespace and the case of the command keyword, but echoes the
+    argument back, so the argument is kept exactly as sent.
+    """
+    try:
+        text = payload.decode().strip()
+    except UnicodeDecodeError:
+        return None
+    lowered = text.lower()
+    if lowered.startswith("search "):
+        query = text[len("search "):].strip()
+        return ("search", f"search {query}") if query else None
+    if lowered.startswith("take me to "):
+        site = text[len("take me to "):].strip()
+        return ("take me to", f"take me to {site}") if site else None
+    if lowered.startswith("uppercase "):
+        return "uppercase", f"UPPERCASE {text[len('UPPERCASE '):]}"
+    return None
+
+def is_cacheable_response(command, response):
+    marker = FAILURE_MARKERS.get(command)
+    return not (marker and marker in response)
+
+class FrequencySketch:
+    """
+    Count-min sketch of how often keys were requested recently, the TinyLFU admission
+    filter. Counters saturate at 15 and are all halved every `sample_size` increments,
+    so popularity fades and a once-hot key cannot squat in the cache forever.
+    """
+
+    def __init__(self, width=4096, depth=4):
+        self.mask = width - 1  # width must be a power of two
+        self.rows = [bytearray(width) for _ in range(depth)]
+        self.seeds = [random.getrandbits(64) for _ in range(depth)]
+        self.sample_size = 10 * width
+        self.additions = 0
+
+    def increment(self, key):
+        for row, seed in zip(self.rows, self.seeds):
+            index = hash((seed, key)) & self.mask
+            if row[index] < 15:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            for row in self.rows:
+                row[:] = row.translate(HALVE)
+            self.additions //= 2
+
+    def estimate(self, key):
+        return min(row[hash((seed, key)) & self.mask] for row, seed in zip(self.rows, self.seeds))
+
+class CachedResponse:
+    __slots__ = ("value", "size", "fresh_until", "stale_until")
+
+    def __init__(self, value, size, fresh_until, stale_until):
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+class ResponseCache:
+    """
+    Memory-bounded LRU of responses with TinyLFU admission: when storing a new
+    response would evict others, it is only admitted if it has been requested more
+    often recently than the entries it would push out, so a scan of one-off queries
+    cannot flush the hot ones. An entry is fresh for its TTL, then may still be
+    served as stale for a grace period while the caller refreshes it.
+    Not thread-safe; the L7 proxy only uses it from its event loop.
+    """
+
+    ENTRY_OVERHEAD = 200  # rough bytes of bookkeeping per entry on top of key and value
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()  # least recently used first
+        self.bytes = 0
+        self.sketch = FrequencySketch()
+        self.stats = collections.Counter()
+
+    def get(self, key):
+        """Return (response, FRESH | STALE | MISS) and record the request for admission"""
+        self.sketch.increment(key)
+        entry = self.entries.get(key)
+        now = time.monotonic()
+        if entry is None or now >= entry.stale_until:
+            if entry is not None:
+                self._remove(key)
+                self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None, MISS
+        self.entries.move_to_end(key)
+        if now < entry.fresh_until:
+            self.stats["hits"] += 1
+            return entry.value, FRESH
+        self.stats["stale_hits"] += 1
+        return entry.value, STALE
+
+    def put(self, key, value, ttl, stale_ttl):
+        """Store a response; returns False if it was too big or not admitted"""
+        size = len(key) + len(value) + self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            self.stats["rejected"] += 1
+            return False
+
+        # A replaced entry frees its own bytes first; the rest must come from eviction as for a new key
+        replaced = self.entries[key].size if key in self.entries else 0
+        victims = []
+        freed = replaced
+        for victim in self.entries:
+            if self.bytes - freed + size <= self.max_bytes:
+                break
+            if victim != key:
+                victims.append(victim)
+                freed += self.entries[victim].size
+        if victims:
+            frequency = self.sketch.estimate(key)
+            if any(self.sketch.estimate(victim) >= frequency for victim in victims):
+                self.stats["rejected"] += 1
+                return False
+            for victim in victims:
+                self._remove(victim)
+                self.stats["evictions"] += 1
+        if replaced:
+            self._remove(key)
+
+        now = time.monotonic()
+        self.entries[key] = CachedResponse(value, size, now + ttl, now + ttl + stale_ttl)
+        self.bytes += size
+        return True
+
+    def _remove(self, key):
+        self.bytes -= self.entries.pop(key).size
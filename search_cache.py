@@ -0,0 +1,312 @@
+import socket
+import threading
+import asyncio
+import itertools
+import collections
+import argparse
+import json
+import time
+
+import cachetools
+
+from framing import PREFACE, FrameBuffer, encode_frame, recv_frame, read_frame_async
+from metrics import Exposition, MetricsServer
+
+CACHE_HOST = '127.0.0.1'
+CACHE_PORT = 8500
+CACHE_METRICS_PORT = 8501
+CACHE_CAPACITY = 10000        # entries kept before the eviction policy kicks in
+CACHE_POLICY = "lru"
+CACHE_TTL = 600.0             # seconds a search result stays fresh
+LEASE_TIMEOUT = 10.0          # seconds a backend may take to fill a miss before another one is asked to
+ASYNC_IDLE_CONNECTIONS = 32   # connections an event loop keeps open to the daemon between lookups
+
+POLICIES = {
+    "lru": cachetools.LRUCache,
+    "lfu": cachetools.LFUCache,
+    "fifo": cachetools.FIFOCache,
+    "rr": cachetools.RRCache,
+}
+
+class SearchCacheStore:
+    """
+    Search results shared by every backend, with single-flight misses: the first
+    backend to miss a query gets a lease and fetches it, and every other backend
+    asking for the same query meanwhile waits for that fill instead of calling the
+    search API too. If the leaseholder gives up or its lease runs out, the next
+    waiter takes the lease over.
+    """
+
+    def __init__(self, capacity=CACHE_CAPACITY, policy=CACHE_POLICY, ttl=CACHE_TTL, lease_timeout=LEASE_TIMEOUT):
+        store = self
+
+        class CountingCache(POLICIES[policy]):
+            def popitem(self):
+                item = super().popitem()
+                store.stats["evictions"] += 1
+                return item
+
+        self.policy = policy
+        self.ttl = ttl
+        self.lease_timeout = lease_timeout
+        self.entries = CountingCache(maxsize=capacity)  # key -> (expires_at, value)
+        self.leases = {}                                 # key -> (token, expires_at)
+        self.lease_tokens = itertools.count(1)
+        self.stats = collections.Counter()
+        self.cond = threading.Condition()
+
+    def get(self, key):
+        """Return {"hit": True, "value": ...} or {"hit": False, "lease": token} for the caller to fill"""
+        with self.cond:
+            waited = False
+            while True:
+                now = time.time()
+                entry = self.entries.get(key)
+                if entry and entry[0] > now:
+                    self.stats["hits"] += 1
+                    return {"hit": True, "value": entry[1]}
+                if entry:
+                    del self.entries[key]
+                    self.stats["expired"] += 1
+
+                lease = self.leases.get(key)
+                if lease is None or lease[1] <= now:
+                    token = next(self.lease_tokens)
+                    self.leases[key] = (token, now + self.lease_timeout)
+                    self.stats["misses"] += 1
+                    return {"hit": False, "lease": token}
+
+                if not waited:
+                    self.stats["coalesced"] += 1
+                    waited = True
+                self.cond.wait(lease[1] - now)
+
+    def set(self, key, value, token):
+        with self.cond:
+            self.entries[key] = (time.time() + self.ttl, value)
+            if self.leases.get(key, (None,))[0] == token:
+                del self.leases[key]
+            self.stats["fills"] += 1
+            self.cond.notify_all()
+
+    def release(self, key, token):
+        """Give a lease back without a value (the fetch failed) so a waiter can try"""
+        with self.cond:
+            if self.leases.get(key, (None,))[0] == token:
+                del self.leases[key]
+            self.cond.notify_all()
+
+    def snapshot(self):
+        with self.cond:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        stats["hit_ratio"] = stats.get("hits", 0) / lookups if lookups else 0.0
+        return stats
+
+    def render_metrics(self):
+        stats = self.snapshot()
+        page = Exposition()
+        for name, help_text in (
+            ("hits", "Lookups answered from the cache, including coalesced waiters"),
+            ("misses", "Lookups that were handed a lease to fetch from the search API"),
+            ("coalesced", "Lookups that waited for another backend's in-flight fetch"),
+            ("fills", "Results stored by backends"),
+            ("evictions", f"Entries evicted by the {self.policy} policy"),
+            ("expired", "Entries dropped after their TTL"),
+        ):
+            page.add(f"search_cache_{name}_total", "counter", help_text, [({}, stats.get(name, 0))])
+        page.add("search_cache_entries", "gauge", "Entries currently cached", [({}, stats["entries"])])
+        page.add("search_cache_hit_ratio", "gauge", "hits / (hits + misses) since start", [({}, stats["hit_ratio"])])
+        return page.render()
+
+def handle_cache_client(client_socket, store):
+    """Answer framed JSON requests from one backend connection until it closes"""
+    frames = FrameBuffer()
+    try:
+        preface = client_socket.recv(len(PREFACE), socket.MSG_WAITALL)
+        if preface != PREFACE:
+            return
+        while True:
+            try:
+                request_id, payload = recv_frame(client_socket, frames)
+            except ConnectionError:
+                return
+            request = json.loads(payload)
+            op = request.get("op")
+            if op == "get":
+                reply = store.get(request["key"])
+            elif op == "set":
+                store.set(request["key"], request["value"], request.get("lease"))
+                reply = {"ok": True}
+            elif op == "release":
+                store.release(request["key"], request.get("lease"))
+                reply = {"ok": True}
+            elif op == "stats":
+                reply = store.snapshot()
+            else:
+                reply = {"error": f"unknown op {op!r}"}
+            client_socket.sendall(encode_frame(request_id, json.dumps(reply).encode()))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Search cache: client error: {e}")
+    finally:
+        client_socket.close()
+
+def start_search_cache(port=CACHE_PORT, metrics_port=CACHE_METRICS_PORT, **store_options):
+    store = SearchCacheStore(**store_options)
+    if metrics_port:
+        MetricsServer(CACHE_HOST, metrics_port, store.render_metrics).start()
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((CACHE_HOST, port))
+    server.listen(128)
+    print(f"Search cache listening on {CACHE_HOST}:{port} "
+          f"({store.policy}, {store.entries.maxsize} entries, ttl {store.ttl:.0f}s)")
+    if metrics_port:
+        print(f"Search cache metrics at http://{CACHE_HOST}:{metrics_port}/metrics")
+
+    try:
+        while True:
+            client_socket, _ = server.accept()
+            threading.Thread(target=handle_cache_client, args=(client_socket, store), daemon=True).start()
+    except KeyboardInterrupt:
+        stats = store.snapshot()
+        print(f"Search cache: shutting down, hit ratio {stats['hit_ratio']:.1%} "
+              f"({stats.get('hits', 0)} hits, {stats.get('misses', 0)} misses, "
+              f"{stats.get('coalesced', 0)} coalesced)")
+    finally:
+        server.close()
+
+class SearchCacheClient:
+    """
+    Backend side of the shared cache. Each calling thread keeps its own connection,
+    because a lookup may block in the daemon while another backend fills the entry.
+    Event-loop code uses the *_async methods instead, which give every lookup in
+    flight a connection of its own from a per-loop pool.
+    """
+
+    def __init__(self, host=CACHE_HOST, port=CACHE_PORT, timeout=LEASE_TIMEOUT + 5,
+                 idle_connections=ASYNC_IDLE_CONNECTIONS):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.idle_connections = idle_connections
+        self._local = threading.local()
+        self._request_ids = itertools.count(1)
+        self._async_idle = {}  # event loop -> [(reader, writer)], which cannot be shared across loops
+
+    def _call(self, request):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.create_connection(self.address, timeout=self.timeout)
+            sock.sendall(PREFACE)
+            self._local.sock = sock
+            self._local.frames = FrameBuffer()
+        try:
+            sock.sendall(encode_frame(next(self._request_ids), json.dumps(request).encode()))
+            _, payload = recv_frame(sock, self._local.frames)
+            return json.loads(payload)
+        except (OSError, ValueError):
+            sock.close()
+            self._local.sock = None
+            raise
+
+    def get_or_compute(self, key, compute):
+        """
+        Return (value, hit) for `key`. On a miss, compute() -> (value, cacheable) runs
+        here and, if cacheable, the value is published to every backend. When the
+        daemon is unreachable the value is simply computed without caching.
+        """
+        try:
+            reply = self._call({"op": "get", "key": key})
+        except (OSError, ValueError) as e:
+            print(f"Search cache unavailable ({e}), fetching directly")
+            return compute()[0], False
+        if reply.get("hit"):
+            return reply["value"], True
+
+        lease = reply.get("lease")
+        value, cacheable = None, False
+        try:
+            value, cacheable = compute()
+        finally:
+            try:
+                if cacheable:
+                    self._call({"op": "set", "key": key, "value": value, "lease": lease})
+                else:
+                    self._call({"op": "release", "key": key, "lease": lease})
+            except (OSError, ValueError) as e:
+                print(f"Search cache unavailable ({e}), result not shared")
+        return value, False
+
+    async def _call_async(self, request):
+        idle = self._async_idle.setdefault(asyncio.get_running_loop(), [])
+        if idle:
+            reader, writer = idle.pop()
+        else:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(*self.address), self.timeout)
+            writer.write(PREFACE)
+        try:
+            writer.write(encode_frame(next(self._request_ids), json.dumps(request).encode()))
+            _, payload = await asyncio.wait_for(read_frame_async(reader), self.timeout)
+            reply = json.loads(payload)
+        except BaseException:
+            writer.close()
+            # The daemon probably went away, so the other pooled connections are dead too
+            for _, idle_writer in idle:
+                idle_writer.close()
+            idle.clear()
+            raise
+        if len(idle) < self.idle_connections:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+        return reply
+
+    async def get_or_compute_async(self, key, compute):
+        """get_or_compute for the event loop; compute() is a coroutine function"""
+        try:
+            reply = await self._call_async({"op": "get", "key": key})
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            print(f"Search cache unavailable ({e!r}), fetching directly")
+            return (await compute())[0], False
+        if reply.get("hit"):
+            return reply["value"], True
+
+        lease = reply.get("lease")
+        value, cacheable = None, False
+        try:
+            value, cacheable = await compute()
+        finally:
+            try:
+                if cacheable:
+                    await self._call_async({"op": "set", "key": key, "value": value, "lease": lease})
+                else:
+                    await self._call_async({"op": "release", "key": key, "lease": lease})
+            except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                print(f"Search cache unavailable ({e!r}), result not shared")
+        return value, False
+
+    def close_async(self):
+        """Close the running loop's pooled connections"""
+        for _, writer in self._async_idle.pop(asyncio.get_running_loop(), []):
+            writer.close()
+
+    def stats(self):
+        return self._call({"op": "stats"})
+
+def main():
+    parser = argparse.ArgumentParser(description="Search result cache shared by the backend servers")
+    parser.add_argument("--port", type=int, default=CACHE_PORT)
+    parser.add_argument("--metrics-port", type=int, default=CACHE_METRICS_PORT, help="0 disables /metrics")
+    parser.add_argument("--capacity", type=int, default=CACHE_CAPACITY, help="maximum cached queries")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default=CACHE_POLICY, help="eviction policy")
+    parser.add_argument("--ttl", type=float, default=CACHE_TTL, help="seconds a result stays fresh")
+    parser.add_argument("--lease-timeout", type=float, default=LEASE_TIMEOUT,
+                        help="seconds a backend may take to fill a miss before waiters take over")
+    args = parser.parse_args()
+    start_search_cache(args.port, args.metrics_port, capacity=args.capacity, policy=args.policy,
+                       ttl=args.ttl, lease_timeout=args.lease_timeout)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Point at stub_search_api.py to run without the real API
+SEARCH_API_URL = os.environ.get("SEARCH_API_URL", "https://www.googleapis.com/customsearch/v1")
+SEARCH_ENGINE_ID = "YOUR_SEARCH_ENGINE_ID"
+SEARCH_POOL_SIZE = 16          # keep-alive connections to the search API kept per backend
+SEARCH_CONNECT_TIMEOUT = 3.0
+SEARCH_READ_TIMEOUT = 10.0
+SEARCH_MAX_RESULTS = 5
+
+def format_results(data):
+    results = []
+    if "items" in data:
+        for item in data["items"][:SEARCH_MAX_RESULTS]:
+            results.append(f"Title: {item['title']}\nLink: {item['link']}\nSnippet: {item.get('snippet', 'No snippet')}\n")
+    return "\n".join(results) if results else "No results found."
+
+class SearchClient:
+    """
+    Keep-alive client for the search API. fetch() shares a pool of persistent
+    connections between all backend threads, so a cache miss no longer pays a new
+    TCP and TLS handshake. fetch_async() does the same for event-loop code without
+    holding a thread for the round trip; it needs aiohttp, and without it runs
+    fetch() in the loop's default executor instead.
+
+    Both return (formatted results, whether they may be cached).
+    """
+
+    def __init__(self, api_key, url=SEARCH_API_URL, engine_id=SEARCH_ENGINE_ID, pool_size=SEARCH_POOL_SIZE,
+                 connect_timeout=SEARCH_CONNECT_TIMEOUT, read_timeout=SEARCH_READ_TIMEOUT, verify=True):
+        self.api_key = api_key
+        self.url = url
+        self.engine_id = engine_id
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.verify = verify
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._async_sessions = {}  # event loop -> aiohttp.ClientSession, which cannot be shared across loops
+        self._async_lock = threading.Lock()
+
+    def params(self, query):
+        return {"key": self.api_key, "cx": self.engine_id, "q": query}
+
+    def fetch(self, query):
+        try:
+            # verify per call: requests lets REQUESTS_CA_BUNDLE/CURL_CA_BUNDLE override session.verify
+            response = self.session.get(self.url, params=self.params(query), verify=self.verify,
+                                        timeout=(self.connect_timeout, self.read_timeout))
+            if response.status_code == 200:
+                return format_results(response.json()), True
+            return f"Search error: {response.status_code}", False
+        except Exception as e:
+            print(f"Search error: {e}")
+            return f"Search error: {str(e)}", False
+
+    def _get_async_session(self):
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            session = self._async_sessions.get(loop)
+            if session is None or session.closed:
+                connector = aiohttp.TCPConnector(limit=self.pool_size, ssl=self.verify)
+                timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+                session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+                self._async_sessions[loop] = session
+        return session
+
+    async def fetch_async(self, query):
+        if aiohttp is None:
+            return await asyncio.get_running_loop().run_in_executor(None, self.fetch, query)
+        try:
+            async with self._get_async_session().get(self.url, params=self.params(query)) as response:
+                if response.status == 200:
+                    return format_results(await response.json()), True
+                return f"Search error: {response.status}", False
+        except Exception as e:
+            print(f"Search error: {e}")
+            return f"Search error: {str(e)}", False
+
+    async def close_async(self):
+        """Close the aiohttp session of the running loop, if one was opened"""
+        with self._async_lock:
+            session = self._async_sessions.pop(asyncio.get_running_loop(), None)
+        if session:
+            await session.close()
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,129 @@
+import threading
+import argparse
+import ssl
+import json
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+STUB_HOST = '127.0.0.1'
+STUB_PORT = 8600
+STUB_LATENCY = 0.2  # seconds each search takes, standing in for the real API's round trip
+STUB_CERT = 'ssl_certs/cert.pem'
+STUB_KEY = 'ssl_certs/key.pem'
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default of 5 drops SYNs under a burst of new connections
+
+class StubSearchAPI:
+    """
+    Offline stand-in for the Custom Search JSON API. GET /customsearch/v1?q=... returns
+    a few made-up items after a fixed latency; GET /stats reports how many searches and
+    connections it served, which is how cache hit ratios, request coalescing and
+    connection reuse can be checked. With tls=True it serves HTTPS with the load
+    balancer's self-signed certificate, so handshake costs show up as they would upstream.
+    """
+
+    def __init__(self, host=STUB_HOST, port=STUB_PORT, latency=STUB_LATENCY, tls=False):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.tls = tls
+        self.searches = 0
+        self.connections = 0
+        self.queries = {}
+        self.lock = threading.Lock()
+        self._httpd = None
+
+    def search(self, query):
+        with self.lock:
+            self.searches += 1
+            self.queries[query] = self.queries.get(query, 0) + 1
+        time.sleep(self.latency)
+        return {"items": [
+            {"title": f"Result {i} for {query}",
+             "link": f"https://example.com/{i}?q={query}",
+             "snippet": f"Stub snippet {i} about {query}"}
+            for i in range(1, 4)
+        ]}
+
+    def stats(self):
+        with self.lock:
+            return {"searches": self.searches, "distinct_queries": len(self.queries),
+                    "connections": self.connections}
+
+    @property
+    def url(self):
+        scheme = "https" if self.tls else "http"
+        return f"{scheme}://{self.host}:{self.port}/customsearch/v1"
+
+    def start(self):
+        api = self
+
+        class SearchHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                with api.lock:
+                    api.connections += 1
+                if api.tls:
+                    # In the connection's own thread, so handshakes do not queue behind each other
+                    self.request.do_handshake()
+                super().setup()
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/customsearch/v1":
+                    query = parse_qs(url.query).get("q", [""])[0]
+                    self.reply(200, api.search(query))
+                elif url.path == "/stats":
+                    self.reply(200, api.stats())
+                else:
+                    self.reply(404, {"error": {"code": 404, "message": "not found"}})
+
+            def reply(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = StubHTTPServer((self.host, self.port), SearchHandler)
+        if self.tls:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile=STUB_CERT, keyfile=STUB_KEY)
+            self._httpd.socket = context.wrap_socket(self._httpd.socket, server_side=True,
+                                                     do_handshake_on_connect=False)
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the search API")
+    parser.add_argument("--port", type=int, default=STUB_PORT)
+    parser.add_argument("--latency", type=float, default=STUB_LATENCY, help="seconds per search")
+    parser.add_argument("--tls", action="store_true", help="serve HTTPS with the self-signed certificate")
+    args = parser.parse_args()
+
+    api = StubSearchAPI(port=args.port, latency=args.latency, tls=args.tls)
+    api.start()
+    print(f"Stub search API on {api.url} ({args.latency * 1000:.0f}ms per search)")
+    print(f"Run the backends with SEARCH_API_URL={api.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"Stub search API: served {api.stats()['searches']} searches")
+        api.stop()
+
+if __name__ == "__main__":
+    main()